@@ -12,6 +12,7 @@ from qgis.PyQt.QtCore import Qt
 from qgis.PyQt.QtGui import QIcon, QImageReader, QPixmap
 from qgis.PyQt.QtWidgets import (
     QDialog,
+    QDialogButtonBox,
     QLabel,
     QMessageBox,
     QPushButton,
@@ -27,6 +28,7 @@ except ModuleNotFoundError:
     WEBKIT_AVAILABLE = False
 
 from lizmap.definitions.definitions import LwcVersions, ServerComboData
+from lizmap.layer_tree_model import LayerTreeModel
 from lizmap.qgis_plugin_tools.tools.i18n import tr
 from lizmap.qgis_plugin_tools.tools.resources import load_ui, resources_path
 from lizmap.qt_style_sheets import COMPLETE_STYLE_SHEET
@@ -70,7 +72,12 @@ class LizmapDialog(QDialog, FORM_CLASS):
         self.inGoogleKey.textChanged.connect(self.check_api_key_address)
 
         # Layer tree
-        self.layer_tree.headerItem().setText(0, tr('List of layers'))
+        self.layer_tree_model = LayerTreeModel(self)
+        self.layer_tree_model.header = tr('List of layers')
+        self.layer_tree.setModel(self.layer_tree_model)
+
+        # Progress of the save running in a background task
+        self.show_save_progress(False)
 
         self.check_project_thumbnail()
         self.setup_icons()
@@ -98,6 +105,14 @@ class LizmapDialog(QDialog, FORM_CLASS):
                     QMessageBox.Ok
                 )
 
+    def show_save_progress(self, flag: bool):
+        """ Show the progress of the save, the OK and Apply buttons are disabled meanwhile. """
+        self.save_progress.setVisible(flag)
+        self.save_progress.setValue(0)
+        self.button_cancel_save.setVisible(flag)
+        self.buttonBox.button(QDialogButtonBox.Apply).setEnabled(not flag)
+        self.buttonBox.button(QDialogButtonBox.Ok).setEnabled(not flag)
+
     def block_signals_address(self, flag: bool):
         """Block or not signals when reading the CFG to avoid the message box."""
         # https://github.com/3liz/lizmap-plugin/issues/477
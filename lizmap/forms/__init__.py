@@ -1,3 +1,19 @@
 __copyright__ = 'Copyright 2020, 3Liz'
 __license__ = 'GPL version 3'
 __email__ = 'info@3liz.org'
+
+import importlib
+
+from typing import Callable
+
+
+def edition_dialog(module: str, name: str) -> Callable:
+    """ The class of an edition dialog, its module is imported only when the dialog is opened.
+
+    :param module: The module in the "forms" package, for instance "atlas_edition".
+    :param name: The name of the dialog class in this module.
+    """
+    def open_dialog(*args, **kwargs):
+        form = importlib.import_module('lizmap.forms.{}'.format(module))
+        return getattr(form, name)(*args, **kwargs)
+    return open_dialog
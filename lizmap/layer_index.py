@@ -0,0 +1,207 @@
+__copyright__ = 'Copyright 2023, 3Liz'
+__license__ = 'GPL version 3'
+__email__ = 'info@3liz.org'
+
+from functools import partial
+from typing import Callable, Dict, Iterable, List, Optional
+
+from qgis.core import (
+    QgsMapLayer,
+    QgsMapLayerModel,
+    QgsProject,
+    QgsVectorLayer,
+    QgsWkbTypes,
+)
+from qgis.PyQt.QtGui import QIcon
+
+
+class LayerMetadata:
+
+    """ Values of a layer displayed in the panels : name, CRS, geometry type and icons.
+
+    Icons are computed the first time they are displayed.
+    """
+
+    __slots__ = ('layer', 'name', 'crs', 'geometry_type', '_icon', '_field_icons')
+
+    def __init__(self, layer: QgsMapLayer):
+        """ Constructor. """
+        self.layer = layer
+        self.name = layer.name()
+        self.crs = layer.crs().authid()
+        if isinstance(layer, QgsVectorLayer):
+            self.geometry_type = layer.geometryType()
+        else:
+            self.geometry_type = QgsWkbTypes.UnknownGeometry
+        self._icon = None
+        self._field_icons = None
+
+    @property
+    def icon(self) -> QIcon:
+        """ The icon of the layer. """
+        if self._icon is None:
+            # noinspection PyArgumentList
+            self._icon = QgsMapLayerModel.iconForLayer(self.layer)
+        return self._icon
+
+    def field_icon(self, field_name: str) -> Optional[QIcon]:
+        """ The icon of a field, None if the field does not exist. """
+        if self._field_icons is None:
+            self._field_icons = {}
+            if isinstance(self.layer, QgsVectorLayer):
+                fields = self.layer.fields()
+                for i, field in enumerate(fields):
+                    self._field_icons[field.name()] = fields.iconForField(i)
+        return self._field_icons.get(field_name)
+
+
+class LayerIndex:
+
+    """ Index of the project layers by ID, kept up to date with the project signals.
+
+    Listeners are notified with the layer ID when a layer is renamed, when its CRS, data source, data, fields or
+    styles change. The metadata of the layer is computed again after these changes. Listeners are not notified when
+    a layer is removed, all layers removed together are handled at once with the signal layersWillBeRemoved.
+    """
+
+    def __init__(self, project: QgsProject):
+        """ Constructor. """
+        self.project = project
+        self._layers: Dict[str, QgsMapLayer] = {}
+        self._slots: Dict[str, Callable] = {}
+        self._listeners: List[Callable[[str], None]] = []
+        self._metadata: Dict[str, LayerMetadata] = {}
+        self.rebuild()
+
+        # noinspection PyUnresolvedReferences
+        self.project.layersAdded.connect(self._layers_added)
+        # noinspection PyUnresolvedReferences
+        self.project.layerWillBeRemoved[str].connect(self._layer_will_be_removed)
+        # noinspection PyUnresolvedReferences
+        self.project.layersRemoved.connect(self._layers_removed)
+
+    def rebuild(self):
+        """ Build the index from scratch. """
+        for layer_id in list(self._slots.keys()):
+            self._disconnect_layer(layer_id)
+        self._layers = dict(self.project.mapLayers())
+        self._metadata = {}
+        for layer in self._layers.values():
+            self._connect_layer(layer)
+
+    def add_listener(self, callback: Callable[[str], None]):
+        """ Call the function with the layer ID when a layer changes. """
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[str], None]):
+        """ Remove a function added with add_listener. """
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _notify(self, layer_id: str, *args):
+        _ = args
+        self._metadata.pop(layer_id, None)
+        for callback in self._listeners:
+            callback(layer_id)
+
+    @staticmethod
+    def _layer_signals(layer: QgsMapLayer) -> list:
+        style_manager = layer.styleManager()
+        signals = [
+            layer.nameChanged,
+            layer.crsChanged,
+            layer.dataSourceChanged,
+            layer.dataChanged,
+            style_manager.styleAdded,
+            style_manager.styleRemoved,
+            style_manager.styleRenamed,
+        ]
+        if isinstance(layer, QgsVectorLayer):
+            signals.append(layer.updatedFields)
+        return signals
+
+    def _connect_layer(self, layer: QgsMapLayer):
+        if layer.id() in self._slots:
+            return
+        slot = partial(self._notify, layer.id())
+        self._slots[layer.id()] = slot
+        for signal in self._layer_signals(layer):
+            signal.connect(slot)
+
+    def _disconnect_layer(self, layer_id: str):
+        slot = self._slots.pop(layer_id, None)
+        layer = self._layers.get(layer_id)
+        if slot is None or layer is None:
+            return
+        for signal in self._layer_signals(layer):
+            try:
+                signal.disconnect(slot)
+            except TypeError:
+                # Not connected anymore
+                pass
+
+    def disconnect(self):
+        """ Stop following the project. """
+        for layer_id in list(self._slots.keys()):
+            self._disconnect_layer(layer_id)
+        # noinspection PyUnresolvedReferences
+        self.project.layersAdded.disconnect(self._layers_added)
+        # noinspection PyUnresolvedReferences
+        self.project.layerWillBeRemoved[str].disconnect(self._layer_will_be_removed)
+        # noinspection PyUnresolvedReferences
+        self.project.layersRemoved.disconnect(self._layers_removed)
+
+    def _layers_added(self, layers: List[QgsMapLayer]):
+        for layer in layers:
+            self._layers[layer.id()] = layer
+            self._connect_layer(layer)
+
+    def _layer_will_be_removed(self, layer_id: str):
+        # The layer is still alive, but it must not be returned anymore
+        self._disconnect_layer(layer_id)
+        self._layers.pop(layer_id, None)
+        self._metadata.pop(layer_id, None)
+
+    def _layers_removed(self, layer_ids: Iterable[str]):
+        for layer_id in layer_ids:
+            self._slots.pop(layer_id, None)
+            self._layers.pop(layer_id, None)
+            self._metadata.pop(layer_id, None)
+
+    def layer(self, layer_id: str) -> Optional[QgsMapLayer]:
+        """ The layer with this ID, or None. """
+        if not layer_id:
+            return None
+        layer = self._layers.get(layer_id)
+        if layer is None:
+            # The layer might be added, and its signal not received yet
+            layer = self.project.mapLayer(layer_id)
+            if layer is not None:
+                self._layers[layer_id] = layer
+                self._connect_layer(layer)
+        return layer
+
+    def metadata(self, layer_id: str) -> Optional[LayerMetadata]:
+        """ The metadata of the layer with this ID, or None. """
+        metadata = self._metadata.get(layer_id)
+        if metadata is None:
+            layer = self.layer(layer_id)
+            if layer is None:
+                return None
+            metadata = LayerMetadata(layer)
+            self._metadata[layer_id] = metadata
+        return metadata
+
+    def layer_ids(self) -> List[str]:
+        """ All layer IDs. """
+        return list(self._layers.keys())
+
+    def layers(self) -> List[QgsMapLayer]:
+        """ All layers. """
+        return list(self._layers.values())
+
+    def __contains__(self, layer_id: str) -> bool:
+        return layer_id in self._layers
+
+    def __len__(self) -> int:
+        return len(self._layers)
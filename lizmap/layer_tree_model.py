@@ -0,0 +1,218 @@
+__copyright__ = 'Copyright 2023, 3Liz'
+__license__ = 'GPL version 3'
+__email__ = 'info@3liz.org'
+
+from typing import Any, Dict, List, Optional
+
+from qgis.core import QgsApplication, QgsMapLayerModel, QgsProject
+from qgis.PyQt.QtCore import QAbstractItemModel, QModelIndex, Qt
+from qgis.PyQt.QtGui import QIcon
+
+from lizmap.layer_index import LayerIndex
+
+
+class LayerTreeNode:
+
+    """ A layer or a group in the Lizmap layer tree.
+
+    Only the values which are different from the shared defaults are stored in the node. The node can be used like
+    the dictionary of its options : node['title'], node.get('link'), 'popupTemplate' in node…
+    """
+
+    __slots__ = ('id', 'type', 'parent', 'children', 'row', 'icon', 'config', '_defaults', '_values')
+
+    def __init__(self, node_id: Optional[str], node_type: Optional[str], defaults: Dict[str, Any]):
+        """ Constructor. """
+        self.id = node_id
+        self.type = node_type
+        self.parent = None
+        self.children: List[LayerTreeNode] = []
+        # Position in the parent, kept up to date by the model
+        self.row = 0
+        # Resolved on first display
+        self.icon = None
+        # Last serialisation in the CFG file, cleared when an option is set
+        self.config = None
+        self._defaults = defaults
+        self._values = {}
+
+    def __getitem__(self, key: str) -> Any:
+        if key == 'id':
+            return self.id
+        if key == 'type':
+            return self.type
+        if key in self._values:
+            return self._values[key]
+        value = self._defaults[key]
+        if isinstance(value, (list, dict)):
+            # The default is shared between all nodes
+            return value.copy()
+        return value
+
+    def __setitem__(self, key: str, value: Any):
+        self.config = None
+        if key == 'id':
+            self.id = value
+        elif key == 'type':
+            self.type = value
+        elif key in self._defaults and type(self._defaults[key]) is type(value) and self._defaults[key] == value:
+            self._values.pop(key, None)
+        else:
+            self._values[key] = value
+
+    def __contains__(self, key: str) -> bool:
+        return key in ('id', 'type') or key in self._values or key in self._defaults
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in self:
+            return self[key]
+        return default
+
+    def keys(self) -> List[str]:
+        return ['id', 'type'] + list(self._defaults.keys()) + [k for k in self._values if k not in self._defaults]
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+
+class LayerTreeModel(QAbstractItemModel):
+
+    """ Model of the Lizmap layer tree, a single column with the name of layers and groups. """
+
+    def __init__(self, parent=None):
+        """ Constructor. """
+        super().__init__(parent)
+        self.root = LayerTreeNode(None, None, {})
+        self.header = ''
+        # Shared cache of the layer icons, if set
+        self.layer_index: Optional[LayerIndex] = None
+
+    def clear(self):
+        """ Remove all nodes. """
+        self.beginResetModel()
+        self.root.children = []
+        self.endResetModel()
+
+    def node(self, index: QModelIndex) -> Optional[LayerTreeNode]:
+        """ The node of an index, None for an invalid index. """
+        if not index.isValid():
+            return None
+        return index.internalPointer()
+
+    def node_index(self, node: LayerTreeNode) -> QModelIndex:
+        """ The index of a node. """
+        if node is None or node is self.root or node.parent is None:
+            return QModelIndex()
+        return self.createIndex(node.row, 0, node)
+
+    def is_attached(self, node: LayerTreeNode) -> bool:
+        """ If the node is in the tree, and not in a branch being built. """
+        while node.parent is not None:
+            node = node.parent
+        return node is self.root
+
+    def insert_node(self, parent: Optional[LayerTreeNode], row: int, node: LayerTreeNode):
+        """ Insert a node, which must not have a parent. """
+        if parent is None:
+            parent = self.root
+        row = min(row, len(parent.children))
+        attached = self.is_attached(parent)
+        if attached:
+            self.beginInsertRows(self.node_index(parent), row, row)
+        parent.children.insert(row, node)
+        node.parent = parent
+        self._update_rows(parent, row)
+        if attached:
+            self.endInsertRows()
+
+    def append_node(self, parent: Optional[LayerTreeNode], node: LayerTreeNode):
+        """ Add a node at the end of its parent. """
+        if parent is None:
+            parent = self.root
+        self.insert_node(parent, len(parent.children), node)
+
+    def take_node(self, node: LayerTreeNode):
+        """ Detach a node and its children from the tree. """
+        parent = node.parent
+        if parent is None:
+            return
+        attached = self.is_attached(parent)
+        if attached:
+            self.beginRemoveRows(self.node_index(parent), node.row, node.row)
+        del parent.children[node.row]
+        node.parent = None
+        self._update_rows(parent, node.row)
+        if attached:
+            self.endRemoveRows()
+
+    def node_changed(self, node: LayerTreeNode):
+        """ The name of the node has changed. """
+        index = self.node_index(node)
+        if index.isValid():
+            self.dataChanged.emit(index, index)
+
+    @staticmethod
+    def _update_rows(parent: LayerTreeNode, start: int):
+        for row in range(start, len(parent.children)):
+            parent.children[row].row = row
+
+    def _node_icon(self, node: LayerTreeNode) -> QIcon:
+        if node.type == 'group':
+            # noinspection PyCallByClass,PyArgumentList
+            return QIcon(QgsApplication.iconPath('mActionFolder.svg'))
+        if self.layer_index is not None:
+            metadata = self.layer_index.metadata(node.id)
+            return metadata.icon if metadata else QIcon()
+        # noinspection PyArgumentList
+        layer = QgsProject.instance().mapLayer(node.id)
+        if not layer:
+            return QIcon()
+        # noinspection PyArgumentList
+        return QgsMapLayerModel.iconForLayer(layer)
+
+    # QAbstractItemModel
+
+    def index(self, row: int, column: int, parent: QModelIndex = QModelIndex()) -> QModelIndex:
+        parent_node = self.node(parent) or self.root
+        if column != 0 or row < 0 or row >= len(parent_node.children):
+            return QModelIndex()
+        return self.createIndex(row, column, parent_node.children[row])
+
+    def parent(self, index: QModelIndex) -> QModelIndex:
+        node = self.node(index)
+        if node is None or node.parent is None:
+            return QModelIndex()
+        return self.node_index(node.parent)
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        if parent.column() > 0:
+            return 0
+        node = self.node(parent) or self.root
+        return len(node.children)
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        _ = parent
+        return 1
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole) -> Any:
+        node = self.node(index)
+        if node is None:
+            return None
+
+        if role in (Qt.DisplayRole, Qt.ToolTipRole):
+            return node['name']
+
+        if role == Qt.DecorationRole:
+            if node.icon is None:
+                node.icon = self._node_icon(node)
+            return node.icon
+
+        if role == Qt.UserRole:
+            return node.id
+
+        return None
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.DisplayRole) -> Any:
+        if section == 0 and orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.header
+        return None
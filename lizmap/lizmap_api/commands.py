@@ -3,12 +3,21 @@ __license__ = 'GPL version 3'
 __email__ = 'info@3liz.org'
 
 import atexit
+import glob
+import json
+import multiprocessing
 import os
 import sys
+import time
+
+from pathlib import Path
 
 import pkg_resources
 
-from .config import LizmapConfig
+from .config import LizmapConfig, LizmapConfigError
+from .extent import ExtentStrategy
+from .manifest import Manifest, project_digest
+from .profiler import Profiler
 
 # We need to keep a reference instance of the qgis_application object
 # And not make this object garbage collected
@@ -80,9 +89,131 @@ __version__="1.0"
 def api_version():
     try:
         return pkg_resources.get_distribution("lizmap-api").version
-    except DistributionNotFound:
+    except pkg_resources.DistributionNotFound:
         return "0.0.0"
 
+# Compiled templates, by absolute path, with the modification time of the file
+_TEMPLATES = {}
+
+
+def load_template(path):
+    """ Return the compiled jinja2 template of a file
+
+        Templates are compiled once per process, they are compiled again only
+        if the file has been modified.
+    """
+    try:
+        from jinja2 import Template
+    except ImportError:
+        raise LizmapConfigError("Templates requires Jinja2 package")
+
+    path = os.path.abspath(path)
+    mtime = os.stat(path).st_mtime_ns
+    cached = _TEMPLATES.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    with open(path) as fp:
+        template = Template(fp.read())
+    _TEMPLATES[path] = (mtime, template)
+    return template
+
+
+def build_config(project, template=None, server=False, title=None, description=None,
+                 fix_json=False, fast_load=False, extent_strategy=None, extent_cache=None, profiler=None):
+    """ Build the lizmap configuration of a single project, in memory
+
+        :return: the LizmapConfig and the JSON configuration
+    """
+    if extent_strategy:
+        extent_strategy = ExtentStrategy.find(extent_strategy)
+    config = LizmapConfig(
+        project,
+        fix_json=fix_json,
+        fast_load=fast_load,
+        extent_strategy=extent_strategy,
+        extent_cache=extent_cache,
+        profiler=profiler,
+    )
+
+    if title:
+        config.set_title(title)
+
+    if description:
+        config.set_description(description)
+
+    if template:
+        json_config = config.from_template(load_template(template))
+    else:
+        json_config = config.to_json()
+
+    if server:
+        config.configure_server_options()
+
+    return config, json_config
+
+
+def generate_config(project, output=None, unload=False, profiler=None, **kwargs):
+    """ Generate the lizmap configuration file for a single project
+
+        :param project: path of the Qgis project
+        :param output: path of the output project, the configuration is written
+            to `<output>.cfg`. Default to the project path.
+        :param unload: clear the project once the configuration is written
+        :param kwargs: the `build_config` options, `template` the path of a jinja2
+            template, `fast_load` to read the project without resolving layer data
+            sources, the project is then never written, `extent_strategy` 'project',
+            'estimated' or 'exact' layer extents, `extent_cache` path of the on disk
+            layer extent cache...
+        :param profiler: optional Profiler measuring the generation phases
+        :return: path of the written configuration file
+    """
+    if profiler is None:
+        profiler = Profiler(enabled=False)
+
+    config, json_config = build_config(project, profiler=profiler, **kwargs)
+
+    if not output:
+        output = project
+
+    write_project = config.project.isDirty() or output != project
+    if write_project and kwargs.get('fast_load'):
+        # Layers are not resolved, the project must not be saved
+        raise LizmapConfigError(
+            "The project can not be written in fast mode, do not use --fast with --server, --title, --description "
+            "or --output")
+
+    with profiler.phase('project_write'):
+        with open(output+'.cfg','w') as fp:
+            print("Writing lizmap config", file=sys.stderr)
+            fp.write(json_config)
+
+        if write_project:
+            print("Writing project to", output, file=sys.stderr)
+            config.project.write(output)
+
+    if unload:
+        config.project.clear()
+
+    return output + '.cfg'
+
+
+def check_config(project, output=None, unload=False, **kwargs):
+    """ Compare the lizmap configuration of a project with the existing file
+
+        Nothing is written, neither the configuration nor the project.
+
+        :return: the list of changes, empty if the configuration is up to date
+    """
+    config, json_config = build_config(project, **kwargs)
+    diff = config.diff((output or project) + '.cfg', json_config)
+
+    if unload:
+        config.project.clear()
+
+    return diff
+
+
 def create_config(argv=None):
     """ Create a lizmap configuration file
     """
@@ -99,44 +230,344 @@ def create_config(argv=None):
     parser.add_argument('-o', '--output'  , default=None, metavar="PATH", help="Output file")
     parser.add_argument('--verbose'       , action='store_true', help="Verbose mode")
     parser.add_argument('--fix-json'      , action='store_true', help="Fix json syntax")
+    parser.add_argument('--fast'          , action='store_true', help="Do not open layer data sources, use the project metadata")
+    parser.add_argument('--extent'        , dest='extent_strategy', default=None, choices=[e.value for e in ExtentStrategy],
+                        help="How layer extents are computed (default: project with --fast, exact otherwise)")
+    parser.add_argument('--extent-cache'  , default=None, metavar="PATH", help="On disk cache of layer extents")
+    parser.add_argument('--incremental'   , action='store_true', help="Skip the project if its inputs did not change")
+    parser.add_argument('--manifest'      , default=None, metavar="PATH", help="Manifest used by the incremental mode")
+    parser.add_argument('--check'         , action='store_true',
+                        help="Do not write anything, exit with 1 and print the JSON diff if the config is not up to date")
+    parser.add_argument('--profile'       , default=None, metavar="PATH",
+                        help="Write the time and memory of each phase as JSON, '-' for stderr")
+    parser.add_argument('--cprofile'      , default=None, metavar="PATH", help="Write a cProfile dump of the generation")
 
     args = parser.parse_args(argv)
 
-    init_qgis(verbose=args.verbose)
+    if args.check and args.incremental:
+        parser.error("--check and --incremental can not be used together")
+
+    job = {
+        'project': args.project,
+        'output': args.output,
+        'template': args.template,
+        'server': args.server,
+        'title': args.title,
+        'description': args.description,
+        'fix_json': args.fix_json,
+        'fast_load': args.fast,
+        'extent_strategy': args.extent_strategy,
+        'extent_cache': args.extent_cache,
+    }
+
+    manifest = None
+    if args.incremental:
+        manifest = Manifest(args.manifest)
+        jobs, _ = outdated_jobs([job], manifest)
+        if not jobs:
+            print("Lizmap config is up to date", file=sys.stderr)
+            return
+
+    profiler = Profiler(enabled=bool(args.profile))
+    with profiler.phase('qgis_init'):
+        init_qgis(verbose=args.verbose)
+
+    if args.check:
+        try:
+            diff = check_config(**job)
+        except LizmapConfigError as e:
+            print(e, file=sys.stderr)
+            sys.exit(1)
+        if diff:
+            json.dump(diff, sys.stdout, indent=4)
+            print()
+            sys.exit(1)
+        print("Lizmap config is up to date", file=sys.stderr)
+        return
 
-    config = LizmapConfig(args.project, fix_json=args.fix_json)
+    cprofile = None
+    if args.cprofile:
+        import cProfile
+        cprofile = cProfile.Profile()
+        cprofile.enable()
 
-    output = args.project
-    if args.output:
-        output = args.output
+    try:
+        output = generate_config(profiler=profiler, **job)
+    except LizmapConfigError as e:
+        if manifest:
+            manifest.remove(args.project)
+            manifest.save()
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if cprofile:
+            cprofile.disable()
+            cprofile.dump_stats(args.cprofile)
+        if args.profile:
+            write_profile(profiler, args.profile)
+
+    if manifest:
+        manifest.update(args.project, job_digest(job), output)
+        manifest.save()
+
+
+def write_profile(profiler, path):
+    """ Write the profiling report as JSON, to stderr if path is '-'
+    """
+    report = profiler.report()
+    profiler.stop()
+    if path == '-':
+        json.dump(report, sys.stderr, indent=4)
+        print(file=sys.stderr)
+    else:
+        with open(path, 'w') as fp:
+            json.dump(report, fp, indent=4)
 
-    if args.title:
-        config.set_title(args.title)
 
-    if args.description:
-        config.set_description(args.description)
+# Incremental mode
 
-    if args.template:
-        try:
-            from jinja2 import Template
-        except ImportError:
-            print("Templates requires Jinja2 package", file=sys.stderr)
-            sys.exit(1)
+def job_output(job):
+    """ Return the path of the configuration file written by a job
+    """
+    return (job.get('output') or job['project']) + '.cfg'
 
-        with open(args.template) as fp:
-            tpl = Template(fp.read())
 
-        json_config = config.from_template(tpl)
-    else:
-       json_config = config.to_json()
+def job_digest(job):
+    """ Return the digest of the inputs of a job
+    """
+    options = {k: v for k, v in job.items() if k not in ('project', 'template', 'check')}
+    options['output'] = os.path.abspath(job_output(job))
+    return project_digest(job['project'], job.get('template'), options)
 
-    if args.server:
-        config.configure_server_options()
 
-    with open(output+'.cfg','w') as fp:
-        print("Writing lizmap config")
-        fp.write(json_config)
+def outdated_jobs(jobs, manifest):
+    """ Split jobs into the ones to run and the summaries of the up to date ones
+    """
+    outdated = []
+    skipped = []
+    for job in jobs:
+        if manifest.is_up_to_date(job['project'], job_digest(job), job_output(job)):
+            skipped.append({
+                'project': job['project'],
+                'status': 'skipped',
+                'output': job_output(job),
+                'elapsed': 0,
+                'error': None,
+            })
+        else:
+            outdated.append(job)
+    return outdated, skipped
+
+
+def update_manifest(manifest, jobs, results):
+    """ Record the results of jobs in the manifest
+
+        The digest is computed after the generation, as the project
+        may have been rewritten by the job.
+    """
+    jobs = {job['project']: job for job in jobs}
+    for result in results:
+        job = jobs.get(result['project'])
+        if job is None:
+            continue
+        if result['status'] == 'ok':
+            manifest.update(job['project'], job_digest(job), result['output'])
+        elif result['status'] == 'error':
+            manifest.remove(job['project'])
+    manifest.save()
+
+
+# Batch mode
+
+def find_projects(paths, pattern='*.qgs'):
+    """ Return the list of projects found from directories, globs or files
+
+        Directories are walked recursively, files matching `pattern` are kept.
+    """
+    projects = []
+    for path in paths:
+        if os.path.isdir(path):
+            found = sorted(str(p) for p in Path(path).rglob(pattern))
+        elif glob.has_magic(path):
+            found = sorted(glob.glob(path, recursive=True))
+        else:
+            found = [path]
+
+        for project in found:
+            if project not in projects:
+                projects.append(project)
+
+    return projects
+
+
+def _init_worker(verbose=False):
+    """ Initialize a warm Qgis application in a pool worker
+    """
+    init_qgis(verbose=verbose)
+
+
+def run_job(job):
+    """ Run a single generation job and return its summary
+
+        The job is a dict of `generate_config` keyword arguments. With a true
+        `check` key, the configuration is compared with the existing file
+        instead, the status is then `changed` with the `diff` if it differs.
+    """
+    start = time.time()
+    job = dict(job)
+    check = job.pop('check', False)
+    result = {
+        'project': job['project'],
+        'status': 'ok',
+        'output': None,
+        'elapsed': None,
+        'error': None,
+    }
+    try:
+        if check:
+            result['output'] = job_output(job)
+            diff = check_config(**job)
+            if diff:
+                result['status'] = 'changed'
+                result['diff'] = diff
+        else:
+            result['output'] = generate_config(**job)
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = '{}: {}'.format(type(e).__name__, e)
+    result['elapsed'] = round(time.time() - start, 3)
+    return result
+
+
+def run_jobs(jobs, processes=None, verbose=False):
+    """ Run generation jobs on a process pool
+
+        Each worker initializes Qgis once and processes several projects.
+        Yield the job summaries in completion order.
+    """
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = max(1, min(processes, len(jobs)))
+
+    if processes == 1:
+        _init_worker(verbose)
+        for job in jobs:
+            yield run_job(job)
+        return
+
+    with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(verbose,)) as pool:
+        for result in pool.imap_unordered(run_job, jobs):
+            yield result
+
+
+def create_config_batch(argv=None):
+    """ Create lizmap configuration files for a whole project tree
+    """
+    import argparse
+
+    version = "version %s (api %s)" % (__version__,api_version())
+    parser = argparse.ArgumentParser(description="Generate Lizmap configuration files for many Qgis projects")
+    parser.add_argument('paths'           , metavar="PATH", nargs='+', help="Qgis project files, directories or globs")
+    parser.add_argument('--version'       , action='version', version=version, help="show version and exit")
+    parser.add_argument('--pattern'       , default='*.qgs', help="Project file pattern in directories (default: %(default)s)")
+    parser.add_argument('--template'      , default=None, metavar="PATH", help="Use template")
+    parser.add_argument('--server'        , action='store_true', help="Publish attributes table")
+    parser.add_argument('-j', '--jobs'    , type=int, default=None, metavar="N", help="Number of worker processes (default: number of CPU)")
+    parser.add_argument('--summary'       , default=None, metavar="PATH", help="Write the JSON summary to file instead of stdout")
+    parser.add_argument('--verbose'       , action='store_true', help="Verbose mode")
+    parser.add_argument('--fix-json'      , action='store_true', help="Fix json syntax")
+    parser.add_argument('--fast'          , action='store_true', help="Do not open layer data sources, use the project metadata")
+    parser.add_argument('--extent'        , dest='extent_strategy', default=None, choices=[e.value for e in ExtentStrategy],
+                        help="How layer extents are computed (default: project with --fast, exact otherwise)")
+    parser.add_argument('--extent-cache'  , default=None, metavar="PATH", help="On disk cache of layer extents")
+    parser.add_argument('--incremental'   , action='store_true', help="Skip projects whose inputs did not change")
+    parser.add_argument('--manifest'      , default=None, metavar="PATH", help="Manifest used by the incremental mode")
+    parser.add_argument('--check'         , action='store_true',
+                        help="Do not write anything, report the projects whose config is not up to date")
+    parser.add_argument('--watch'         , action='store_true', help="Regenerate configs when projects are modified")
+    parser.add_argument('--debounce'      , type=float, default=2.0, metavar="SECONDS",
+                        help="Wait for this delay without any change before regenerating (default: %(default)s)")
+    parser.add_argument('--interval'      , type=float, default=1.0, metavar="SECONDS",
+                        help="Polling interval without inotify (default: %(default)s)")
+
+    args = parser.parse_args(argv)
+
+    if args.check and args.incremental:
+        parser.error("--check and --incremental can not be used together")
+
+    if args.watch:
+        if args.check:
+            parser.error("--check and --watch can not be used together")
+        from .watch import watch_projects
+        options = {
+            'template': args.template,
+            'server': args.server,
+            'fix_json': args.fix_json,
+            'fast_load': args.fast,
+            'extent_strategy': args.extent_strategy,
+            'extent_cache': args.extent_cache,
+            # Do not keep old projects in the warm workers
+            'unload': True,
+        }
+        watch_projects(
+            options, args.paths, args.pattern, debounce=args.debounce, interval=args.interval,
+            processes=args.jobs, verbose=args.verbose)
+        return
+
+    projects = find_projects(args.paths, args.pattern)
+    if not projects:
+        print("No project found", file=sys.stderr)
+        sys.exit(1)
+
+    jobs = [
+        {
+            'project': project,
+            'template': args.template,
+            'server': args.server,
+            'fix_json': args.fix_json,
+            'fast_load': args.fast,
+            'extent_strategy': args.extent_strategy,
+            'extent_cache': args.extent_cache,
+            'check': args.check,
+        }
+        for project in projects
+    ]
+
+    start = time.time()
+    results = []
+
+    manifest = None
+    if args.incremental:
+        manifest = Manifest(args.manifest)
+        jobs, results = outdated_jobs(jobs, manifest)
+        print("{} project(s) up to date, {} to generate".format(len(results), len(jobs)), file=sys.stderr)
+
+    if jobs:
+        for result in run_jobs(jobs, processes=args.jobs, verbose=args.verbose):
+            print("[{}/{}] {} {} ({}s)".format(
+                len(results) + 1, len(projects), result['status'], result['project'], result['elapsed']),
+                file=sys.stderr)
+            results.append(result)
+
+    if manifest:
+        update_manifest(manifest, jobs, results)
+
+    results.sort(key=lambda r: r['project'])
+    summary = {
+        'total': len(results),
+        'failed': len([r for r in results if r['status'] == 'error']),
+        'skipped': len([r for r in results if r['status'] == 'skipped']),
+        'changed': len([r for r in results if r['status'] == 'changed']),
+        'elapsed': round(time.time() - start, 3),
+        'projects': results,
+    }
+
+    if args.summary:
+        with open(args.summary, 'w') as fp:
+            json.dump(summary, fp, indent=4)
+    else:
+        json.dump(summary, sys.stdout, indent=4)
+        print()
 
-    if config.project.isDirty() or args.output:
-        print("Writing project to", args.output)
-        config.project.write(output)
+    if summary['failed'] or summary['changed']:
+        sys.exit(1)
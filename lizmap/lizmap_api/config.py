@@ -3,6 +3,7 @@ __license__ = 'GPL version 3'
 __email__ = 'info@3liz.org'
 
 import collections
+import collections.abc
 import json
 import os
 
@@ -10,6 +11,14 @@ from qgis.core import QgsMapLayer, QgsProject
 
 from lizmap import DEFAULT_LWC_VERSION
 from lizmap.definitions.definitions import LwcVersions
+from lizmap.lizmap_api.diff import cfg_file_diff
+from lizmap.lizmap_api.extent import (
+    ExtentCache,
+    ExtentStrategy,
+    LayerExtentResolver,
+)
+from lizmap.lizmap_api.profiler import Profiler
+from lizmap.lizmap_api.project_xml import read_layers_metadata
 from lizmap.qgis_plugin_tools.tools.i18n import tr
 from lizmap.qgis_plugin_tools.tools.version import (
     format_version_integer,
@@ -31,12 +40,21 @@ class LizmapConfig:
         4: 'none'
     }
 
-    def __init__(self, project, fix_json=False):
+    def __init__(self, project, fix_json=False, fast_load=False, extent_strategy=None, extent_cache=None,
+                 profiler=None):
         """ Configuration setup
 
             :param fix_json: fix the json parsing,
                 see https://github.com/3liz/lizmap-web-client/issues/925
+            :param fast_load: when project is a path, read it without resolving
+                layer data sources. Extents and geometry types are taken from
+                the project XML.
+            :param extent_strategy: the ExtentStrategy for layer extents, default
+                to the project XML in fast load mode, exact otherwise
+            :param extent_cache: optional path of the on disk layer extent cache
+            :param profiler: optional Profiler measuring the generation phases
         """
+        self._profiler = profiler or Profiler(enabled=False)
 
         metadata = dict()
         metadata['lizmap_plugin_version'] = {
@@ -432,34 +450,96 @@ class LizmapConfig:
             }
         }
 
+        # Layer metadata read from the project XML, only in fast load mode
+        self._xml_layers = None
+
         if not isinstance(project, QgsProject):
-            self.project = self._load_project(project)
+            with self._profiler.phase('project_read'):
+                self.project = self._load_project(project, fast_load)
+                if fast_load:
+                    self._xml_layers = read_layers_metadata(project)
         else:
             self.project = project
 
-        self._WFSLayers = self.project.readListEntry('WFSLayers', '')[0]
+        if extent_strategy is None:
+            extent_strategy = ExtentStrategy.Project if fast_load else ExtentStrategy.Exact
+        xml_layers = self._xml_layers
+        if xml_layers is None and extent_strategy != ExtentStrategy.Exact and self.project.fileName():
+            xml_layers = read_layers_metadata(self.project.fileName())
+        self._extent_resolver = LayerExtentResolver(
+            extent_strategy,
+            ExtentCache(extent_cache) if extent_cache else None,
+            xml_layers,
+        )
+
+        self._layers_by_id = {}
+        self._layers_by_name = {}
+        self._WFSLayers = set()
+        self.refresh_layer_index()
         self._layer_attributes = {}
         self._global_options = {}
         self._layer_options = {}
         self._fix_json = fix_json
 
     @staticmethod
-    def _load_project(path):
+    def _fast_read_flags():
+        """ Read flags to load a project without opening any layer data source
+        """
+        flags = None
+        for name in ('FlagDontResolveLayers', 'FlagTrustLayerMetadata'):
+            flag = getattr(QgsProject, name, None)
+            if flag is None:
+                # Not available in this Qgis version
+                continue
+            flags = flag if flags is None else flags | flag
+        return flags
+
+    @classmethod
+    def _load_project(cls, path, fast_load=False):
         """ Read a qgis project from path
         """
         if not os.path.exists(path):
             raise FileNotFoundError(path)
         project = QgsProject()
-        if not project.read(path):
+        flags = cls._fast_read_flags() if fast_load else None
+        if flags is not None:
+            result = project.read(path, flags)
+        else:
+            result = project.read(path)
+        if not result:
             raise LizmapConfigError("Error reading qgis project")
         return project
 
+    def _layer_geometry_type(self, layer):
+        """ Geometry type of a vector layer, from the project XML in fast load mode
+        """
+        if self._xml_layers is not None:
+            geometry_type = self._xml_layers.get(layer.id(), {}).get('geometryType')
+            if geometry_type:
+                return geometry_type
+        return self.mapQgisGeometryType[layer.geometryType()]
+
+    def refresh_layer_index(self):
+        """ Build the indexes of the project layers, by id and by name, and the set of WFS layers
+
+            It must be called again if layers are added or removed from the project.
+        """
+        self._layers_by_id = dict(self.project.mapLayers())
+        self._layers_by_name = {}
+        for layer in self._layers_by_id.values():
+            # Like mapLayersByName, the first layer wins
+            self._layers_by_name.setdefault(layer.name(), layer)
+        self._WFSLayers = set(self.project.readListEntry('WFSLayers', '')[0])
+
     def get_layer_by_name(self, name):
         """ Return a unique layer by its name
         """
-        matches = self.project.mapLayersByName(name)
-        if len(matches) > 0:
-            return matches[0]
+        return self._layers_by_name.get(name)
+
+    def get_layer_by_id(self, layer_id):
+        """ Return a layer by its id
+        """
+        return self._layers_by_id.get(layer_id)
 
     def to_json(self, p_global_options=None, p_layer_options=None, p_attributes_options=None,
                 sort_keys=False, indent=4, **kwargs):
@@ -467,13 +547,16 @@ class LizmapConfig:
         """
         # Set the options from the default only if overridden or not defined
         if p_global_options is not None or len(self._global_options) == 0:
-            self.set_global_options(p_global_options)
+            with self._profiler.phase('global_options'):
+                self.set_global_options(p_global_options)
 
         if p_layer_options is not None or len(self._layer_options) == 0:
-            self.set_layer_options(p_layer_options)
+            with self._profiler.phase('layer_options'):
+                self.set_layer_options(p_layer_options)
 
         if p_attributes_options:
-            self.set_layer_attributes(p_attributes_options)
+            with self._profiler.phase('attribute_options'):
+                self.set_layer_attributes(p_attributes_options)
 
         config = {
             'options': self._global_options,
@@ -497,9 +580,21 @@ class LizmapConfig:
             config = map_dict(config)
 
         # Write json to the cfg file
-        json_file_content = json.dumps(config, sort_keys=sort_keys, indent=indent, **kwargs)
+        with self._profiler.phase('json_serialisation'):
+            json_file_content = json.dumps(config, sort_keys=sort_keys, indent=indent, **kwargs)
         return json_file_content
 
+    def diff(self, path, json_config=None):
+        """ Compare the configuration with an existing CFG file, nothing is written
+
+            :param path: path of the CFG file
+            :param json_config: the generated JSON configuration, default to `to_json()`
+            :return: the list of changes, empty if the file is up to date
+        """
+        if json_config is None:
+            json_config = self.to_json()
+        return cfg_file_diff(path, json_config)
+
     def set_global_options(self, options):
         """ Set the global lizmap configuration options
         """
@@ -540,15 +635,11 @@ class LizmapConfig:
         lo['type'] = 'layer'
         geometry_type = '-1'
         if layer.type() == 0:  # if it is a vector layer
-            geometry_type = self.mapQgisGeometryType[layer.geometryType()]
+            geometry_type = self._layer_geometry_type(layer)
         if geometry_type != -1:
             lo["geometryType"] = geometry_type
 
-        l_extent = layer.extent()
-        lo["extent"] = [l_extent.xMinimum(),
-                        l_extent.yMinimum(),
-                        l_extent.xMaximum(),
-                        l_extent.yMaximum()]
+        lo["extent"] = self._extent_resolver.extent(layer)
 
         lo['crs'] = layer.crs().authid()
 
@@ -591,13 +682,18 @@ class LizmapConfig:
         self._layer_options = {}
 
         if p_layer_options is None:
-            for layer in self.project.mapLayers().values():
-                self.add_layer(layer)
+            for layer in self._layers_by_id.values():
+                with self._profiler.layer(layer.name()):
+                    self.add_layer(layer)
         else:
             for lname, options in p_layer_options.items():
                 layer = self.get_layer_by_name(lname)
                 if layer:
-                    self.add_layer(layer, **options)
+                    with self._profiler.layer(lname):
+                        self.add_layer(layer, **options)
+
+        if self._extent_resolver.cache:
+            self._extent_resolver.cache.save()
 
         return self._layer_options
 
@@ -669,31 +765,60 @@ class LizmapConfig:
 
         prj = self.project
 
-        prj.writeEntry("WFSLayers", "/", [lid for lid, lyr in prj.mapLayers().items() if lyr.type() == QgsMapLayer.VectorLayer])
-        for lid, lyr in prj.mapLayers().items():
+        layers = prj.mapLayers()
+        prj.writeEntry("WFSLayers", "/", [lid for lid, lyr in layers.items() if lyr.type() == QgsMapLayer.VectorLayer])
+        for lid, lyr in layers.items():
             if lyr.type() == QgsMapLayer.VectorLayer:
                 prj.writeEntry("WFSLayersPrecision", "/"+lid, WFSLayersPrecision)
-        prj.writeEntry("WCSLayers", "/", [lid for lid, lyr in prj.mapLayers().items() if lyr.type() == QgsMapLayer.RasterLayer])
+        prj.writeEntry("WCSLayers", "/", [lid for lid, lyr in layers.items() if lyr.type() == QgsMapLayer.RasterLayer])
         prj.setDirty()
 
         # Update WFS layer list
-        self._WFSLayers = prj.readListEntry('WFSLayers', '')[0]
+        self.refresh_layer_index()
 
     def from_template(self, template, context=None, **kwargs):
         """ Read a configuration from a jinja2 template
+
+            The template is rendered once. The layer lists of the context are
+            only computed if the template uses them.
         """
-        if not context:
-            context = dict()
-        # set context
-        ctx = dict(context)
-        layers = self.project.mapLayers().values()
+        ctx = dict(context) if context else dict()
+        layers = LayerList(self.project)
         ctx['project'] = self.project
         ctx['layers'] = layers
-        ctx['vectorlayers'] = [l for l in layers if l.type() == QgsMapLayer.VectorLayer]
-        ctx['rasterlayers'] = [l for l in layers if l.type() == QgsMapLayer.RasterLayer]
-        rendered = template.render(ctx)
-        with open("/srv/projects/test_lizmap_api/api_output.json", "w") as fp:
-            fp.write(rendered)
-        options = json.loads(template.render(ctx))
+        ctx['vectorlayers'] = LayerList(self.project, QgsMapLayer.VectorLayer, layers)
+        ctx['rasterlayers'] = LayerList(self.project, QgsMapLayer.RasterLayer, layers)
+        with self._profiler.phase('template_rendering'):
+            options = json.loads(template.render(ctx))
 
         return self.to_json(options.get('options'), options.get('layers'), options.get('attributeLayers'), **kwargs)
+
+
+class LayerList(collections.abc.Sequence):
+    """ List of the project layers, read on first access
+
+        :param layer_type: keep only layers of this QgsMapLayer type
+        :param source: another LayerList to filter instead of the project
+    """
+
+    def __init__(self, project, layer_type=None, source=None):
+        self._project = project
+        self._layer_type = layer_type
+        self._source = source
+        self._layers = None
+
+    @property
+    def layers(self):
+        if self._layers is None:
+            layers = self._source if self._source is not None else self._project.mapLayers().values()
+            if self._layer_type is None:
+                self._layers = list(layers)
+            else:
+                self._layers = [layer for layer in layers if layer.type() == self._layer_type]
+        return self._layers
+
+    def __getitem__(self, index):
+        return self.layers[index]
+
+    def __len__(self):
+        return len(self.layers)
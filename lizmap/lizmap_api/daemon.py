@@ -0,0 +1,159 @@
+"""Long running generator keeping a warm Qgis application
+
+    Jobs are JSON objects, one per line, read either from stdin or from
+    a local UNIX socket. Each job holds the `generate_config` arguments:
+
+        {"id": 1, "project": "/srv/projects/a.qgs", "template": null, "server": false, "unload": true}
+
+    The daemon answers one JSON line per job with the job summary. The
+    special jobs `{"command": "ping"}` and `{"command": "shutdown"}` are
+    also accepted.
+"""
+
+__copyright__ = 'Copyright 2023, 3Liz'
+__license__ = 'GPL version 3'
+__email__ = 'info@3liz.org'
+
+import gc
+import json
+import os
+import socketserver
+import stat
+import sys
+
+from .commands import __version__, api_version, init_qgis, run_job
+
+JOB_KEYS = (
+    'project', 'output', 'template', 'server', 'title', 'description', 'fix_json', 'unload', 'fast_load',
+    'extent_strategy', 'extent_cache', 'check',
+)
+
+
+class Shutdown(Exception):
+    pass
+
+
+def flush_deleted_objects():
+    """ Process the Qt objects scheduled for deletion
+
+        There is no Qt event loop running in the daemon, so `deleteLater`
+        would never be honored without it.
+    """
+    from qgis.PyQt.QtCore import QCoreApplication, QEvent
+    gc.collect()
+    QCoreApplication.sendPostedEvents(None, QEvent.DeferredDelete)
+
+
+def process_request(line, unload=False):
+    """ Process a single JSON line and return the JSON response
+    """
+    try:
+        request = json.loads(line)
+    except ValueError as e:
+        return {'status': 'error', 'error': 'Invalid JSON: {}'.format(e)}
+
+    if not isinstance(request, dict):
+        return {'status': 'error', 'error': 'A job must be a JSON object'}
+
+    job_id = request.pop('id', None)
+    command = request.pop('command', None)
+
+    if command == 'ping':
+        response = {'status': 'ok'}
+    elif command == 'shutdown':
+        raise Shutdown()
+    elif command is not None:
+        response = {'status': 'error', 'error': 'Unknown command {}'.format(command)}
+    elif 'project' not in request:
+        response = {'status': 'error', 'error': 'Missing project'}
+    else:
+        unknown = [k for k in request if k not in JOB_KEYS]
+        if unknown:
+            response = {'status': 'error', 'error': 'Unknown job keys: {}'.format(', '.join(unknown))}
+        else:
+            request.setdefault('unload', unload)
+            response = run_job(request)
+            if request['unload']:
+                flush_deleted_objects()
+
+    if job_id is not None:
+        response['id'] = job_id
+    return response
+
+
+def serve_stdin(unload=False):
+    """ Read jobs from stdin and write responses to stdout
+    """
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            response = process_request(line, unload)
+        except Shutdown:
+            return
+        sys.stdout.write(json.dumps(response) + '\n')
+        sys.stdout.flush()
+
+
+def serve_socket(path, unload=False):
+    """ Read jobs from a local UNIX socket
+
+        Connections are handled one at a time, Qgis must only be used from
+        the main thread.
+    """
+
+    class Handler(socketserver.StreamRequestHandler):
+
+        def handle(self):
+            for line in self.rfile:
+                if not line.strip():
+                    continue
+                try:
+                    response = process_request(line.decode('utf8'), unload)
+                except Shutdown:
+                    self.server.shutdown_requested = True
+                    return
+                self.wfile.write((json.dumps(response) + '\n').encode('utf8'))
+                self.wfile.flush()
+
+    if os.path.lexists(path):
+        # Left by a previous daemon, any other file is kept
+        if not stat.S_ISSOCK(os.lstat(path).st_mode):
+            raise FileExistsError("{} exists and is not a socket".format(path))
+        os.unlink(path)
+
+    server = socketserver.UnixStreamServer(path, Handler)
+    server.shutdown_requested = False
+    print("Listening on", path, file=sys.stderr)
+    try:
+        while not server.shutdown_requested:
+            server.handle_request()
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+def main(argv=None):
+    """ Run the Lizmap configuration daemon
+    """
+    import argparse
+
+    version = "version %s (api %s)" % (__version__, api_version())
+    parser = argparse.ArgumentParser(description="Generate Lizmap configuration files with a persistent Qgis")
+    parser.add_argument('--version'       , action='version', version=version, help="show version and exit")
+    parser.add_argument('--socket'        , default=None, metavar="PATH", help="Listen on a UNIX socket instead of stdin")
+    parser.add_argument('--unload'        , action='store_true', help="Unload the project after each job by default")
+    parser.add_argument('--verbose'       , action='store_true', help="Verbose mode")
+
+    args = parser.parse_args(argv)
+
+    init_qgis(verbose=args.verbose)
+
+    try:
+        if args.socket:
+            serve_socket(args.socket, args.unload)
+        else:
+            serve_stdin(args.unload)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,58 @@
+__copyright__ = 'Copyright 2023, 3Liz'
+__license__ = 'GPL version 3'
+__email__ = 'info@3liz.org'
+
+import json
+import os
+
+
+def _escape(key):
+    """ Escape a key as a JSON pointer token, RFC 6901
+    """
+    return str(key).replace('~', '~0').replace('/', '~1')
+
+
+def config_diff(old, new, path=''):
+    """ Structural diff between two JSON configurations
+
+        Dictionaries are compared key by key, whatever the order. Other values,
+        including lists, are compared as a whole.
+
+        Return a list of changes, `{"op": "add"|"remove"|"replace", "path": ...}`
+        with the `old` and/or the `new` value. The path is a JSON pointer.
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        changes = []
+        for key in old:
+            sub_path = '{}/{}'.format(path, _escape(key))
+            if key not in new:
+                changes.append({'op': 'remove', 'path': sub_path, 'old': old[key]})
+            else:
+                changes.extend(config_diff(old[key], new[key], sub_path))
+        for key in new:
+            if key not in old:
+                changes.append({'op': 'add', 'path': '{}/{}'.format(path, _escape(key)), 'new': new[key]})
+        return changes
+
+    if old == new and type(old) == type(new):
+        return []
+
+    return [{'op': 'replace', 'path': path, 'old': old, 'new': new}]
+
+
+def cfg_file_diff(path, json_config):
+    """ Structural diff between an existing CFG file and a generated JSON configuration
+
+        A missing or invalid file is reported as a single replacement of the root.
+    """
+    new = json.loads(json_config)
+    if not os.path.exists(path):
+        return [{'op': 'add', 'path': '', 'new': new}]
+
+    with open(path, encoding='utf8') as fp:
+        try:
+            old = json.load(fp)
+        except ValueError:
+            return [{'op': 'replace', 'path': '', 'old': None, 'new': new}]
+
+    return config_diff(old, new)
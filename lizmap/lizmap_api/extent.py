@@ -0,0 +1,186 @@
+__copyright__ = 'Copyright 2023, 3Liz'
+__license__ = 'GPL version 3'
+__email__ = 'info@3liz.org'
+
+import hashlib
+import json
+import os
+import re
+import time
+
+from enum import Enum
+
+from qgis.core import (
+    QgsDataProvider,
+    QgsDataSourceUri,
+    QgsMapLayer,
+    QgsProviderRegistry,
+)
+
+# Entries of the extent cache older than this number of seconds are removed
+EXTENT_CACHE_EXPIRATION = 7 * 86400
+# Maximum number of entries in the extent cache, the oldest ones are removed
+EXTENT_CACHE_MAX_ENTRIES = 5000
+
+# Providers able to compute an estimated extent from their statistics
+ESTIMATED_METADATA_PROVIDERS = ('postgres', 'mssql', 'oracle', 'hana')
+
+
+class ExtentStrategy(Enum):
+    # Extent written in the project XML when it was saved, no provider access
+    Project = 'project'
+    # Extent estimated by the provider, from the database statistics if possible
+    Estimated = 'estimated'
+    # Exact extent computed by the provider, can be a full table scan
+    Exact = 'exact'
+
+    @classmethod
+    def find(cls, value):
+        for item in cls.__members__.values():
+            if item.value == value:
+                return item
+        return None
+
+
+def rectangle_to_list(extent):
+    return [extent.xMinimum(), extent.yMinimum(), extent.xMaximum(), extent.yMaximum()]
+
+
+def source_validator(layer):
+    """ Last modification information of the file behind a layer
+
+        Return None if the layer is not stored in a local file.
+    """
+    # noinspection PyArgumentList
+    path = QgsProviderRegistry.instance().decodeUri(layer.providerType(), layer.source()).get('path')
+    if not path or not os.path.isfile(path):
+        return None
+    stat = os.stat(path)
+    return '{}:{}'.format(stat.st_mtime_ns, stat.st_size)
+
+
+class ExtentCache:
+    """ On disk cache of layer extents
+
+        Entries are keyed by a hash of the strategy and the layer data source,
+        the data source may contain credentials. Layers stored in a file are
+        validated with the file modification time and size. Other layers, in
+        a database for instance, have no cheap modification information and
+        expire after max_age seconds. Entries older than
+        EXTENT_CACHE_EXPIRATION seconds are removed.
+    """
+
+    def __init__(self, path, max_age=3600):
+        self.path = path
+        self.max_age = max_age
+        self._dirty = False
+        self._entries = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path) as fp:
+                    self._entries = json.load(fp)
+            except ValueError:
+                # Corrupted cache, it will be rewritten
+                self._entries = {}
+                self._dirty = True
+            self._evict()
+
+    @staticmethod
+    def key(layer, strategy):
+        key = '{}|{}|{}'.format(strategy.value, layer.providerType(), layer.source())
+        return hashlib.sha256(key.encode('utf8')).hexdigest()
+
+    def _evict(self):
+        """ Remove expired entries, entries in excess and entries from a previous format
+        """
+        limit = time.time() - EXTENT_CACHE_EXPIRATION
+        entries = {
+            key: entry for key, entry in self._entries.items()
+            if re.fullmatch('[0-9a-f]{64}', key) and entry.get('time', 0) > limit
+        }
+        if len(entries) > EXTENT_CACHE_MAX_ENTRIES:
+            recent = sorted(entries, key=lambda k: entries[k]['time'], reverse=True)[:EXTENT_CACHE_MAX_ENTRIES]
+            entries = {key: entries[key] for key in recent}
+        if len(entries) != len(self._entries):
+            self._entries = entries
+            self._dirty = True
+
+    def get(self, key, validator):
+        entry = self._entries.get(key)
+        if not entry or entry['validator'] != validator:
+            return None
+        if validator is None and time.time() - entry['time'] > self.max_age:
+            return None
+        return entry['extent']
+
+    def set(self, key, validator, extent):
+        self._entries[key] = {'validator': validator, 'time': time.time(), 'extent': extent}
+        self._dirty = True
+
+    def save(self):
+        """ Write the cache if it has been modified, atomically
+        """
+        if not self.path or not self._dirty:
+            return
+        self._evict()
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as fp:
+            json.dump(self._entries, fp)
+        os.replace(tmp, self.path)
+        self._dirty = False
+
+
+class LayerExtentResolver:
+    """ Compute layer extents according to a strategy, with an optional cache
+    """
+
+    def __init__(self, strategy=ExtentStrategy.Exact, cache=None, xml_layers=None):
+        """ Constructor
+
+            :param strategy: the ExtentStrategy to use
+            :param cache: an optional ExtentCache
+            :param xml_layers: layer metadata read from the project XML, needed
+                by the project strategy
+        """
+        self.strategy = strategy
+        self.cache = cache
+        self.xml_layers = xml_layers or {}
+
+    def extent(self, layer):
+        """ Return the extent of the layer as [xmin, ymin, xmax, ymax]
+        """
+        if self.strategy == ExtentStrategy.Project:
+            extent = self.xml_layers.get(layer.id(), {}).get('extent')
+            if extent:
+                return extent
+            # Not saved in the project yet
+            return rectangle_to_list(layer.extent())
+
+        if self.cache is None:
+            return self._provider_extent(layer)
+
+        key = self.cache.key(layer, self.strategy)
+        validator = source_validator(layer)
+        extent = self.cache.get(key, validator)
+        if extent is None:
+            extent = self._provider_extent(layer)
+            self.cache.set(key, validator, extent)
+        return extent
+
+    def _provider_extent(self, layer):
+        if self.strategy == ExtentStrategy.Estimated and layer.type() == QgsMapLayer.VectorLayer:
+            if layer.providerType() in ESTIMATED_METADATA_PROVIDERS:
+                uri = QgsDataSourceUri(layer.source())
+                if not uri.useEstimatedMetadata():
+                    uri.setUseEstimatedMetadata(True)
+                    # noinspection PyArgumentList
+                    provider = QgsProviderRegistry.instance().createProvider(
+                        layer.providerType(), uri.uri(False), QgsDataProvider.ProviderOptions())
+                    if provider and provider.isValid():
+                        return rectangle_to_list(provider.extent())
+
+            elif layer.providerType() == 'virtual' and self.xml_layers.get(layer.id(), {}).get('extent'):
+                # The saved extent is the best estimation, the provider would run the query
+                return self.xml_layers[layer.id()]['extent']
+
+        return rectangle_to_list(layer.extent())
@@ -0,0 +1,157 @@
+__copyright__ = 'Copyright 2023, 3Liz'
+__license__ = 'GPL version 3'
+__email__ = 'info@3liz.org'
+
+import hashlib
+import json
+import os
+import xml.etree.ElementTree as ET
+import zipfile
+
+from contextlib import contextmanager
+
+MANIFEST_FILENAME = '.lizmapcfg.manifest.json'
+MANIFEST_VERSION = 1
+
+
+def file_digest(path):
+    """ Return the sha256 hex digest of a file content, or None if the file is missing
+    """
+    h = hashlib.sha256()
+    try:
+        with open(path, 'rb') as fp:
+            for chunk in iter(lambda: fp.read(1 << 16), b''):
+                h.update(chunk)
+    except FileNotFoundError:
+        return None
+    return h.hexdigest()
+
+
+@contextmanager
+def open_project_xml(path):
+    """ Open the XML of a qgis project, read from the archive for a qgz project
+
+        Yield None if the project is not a valid archive or has no qgs file.
+    """
+    if not zipfile.is_zipfile(path):
+        with open(path, 'rb') as fp:
+            yield fp
+        return
+
+    with zipfile.ZipFile(path) as archive:
+        names = [name for name in archive.namelist() if name.lower().endswith('.qgs')]
+        if not names:
+            yield None
+            return
+        with archive.open(names[0]) as fp:
+            yield fp
+
+
+def embedded_projects(path):
+    """ Return the absolute paths of the projects embedded in a qgis project
+
+        Embedded layers and groups are followed recursively, the result
+        does not contain `path` itself.
+    """
+    found = []
+    pending = [os.path.abspath(path)]
+    seen = set(pending)
+    while pending:
+        current = pending.pop(0)
+        if not os.path.exists(current):
+            continue
+        base = os.path.dirname(current)
+        with open_project_xml(current) as fp:
+            if fp is None:
+                continue
+            try:
+                for _, elem in ET.iterparse(fp):
+                    if elem.get('embedded') == '1' and elem.get('project'):
+                        sub = os.path.normpath(os.path.join(base, elem.get('project')))
+                        if sub not in seen:
+                            seen.add(sub)
+                            found.append(sub)
+                            pending.append(sub)
+                    # Keep memory low on large projects
+                    if elem.tag in ('maplayer', 'layer-tree-group', 'layer-tree-layer'):
+                        elem.clear()
+            except ET.ParseError:
+                # Not a project, only its file digest is used
+                continue
+    return sorted(found)
+
+
+def project_digest(project, template=None, options=None):
+    """ Compute the content hash of all the inputs of a configuration generation
+
+        The hash covers the qgis project, its embedded sub-projects, the template
+        and the generation options.
+    """
+    h = hashlib.sha256()
+
+    def update(name, path):
+        h.update(name.encode('utf8'))
+        h.update(b'\0')
+        h.update((file_digest(path) or 'missing').encode('utf8'))
+        h.update(b'\0')
+
+    update('project', project)
+    for sub in embedded_projects(project):
+        update(sub, sub)
+    if template:
+        update('template', template)
+    h.update(json.dumps(options or {}, sort_keys=True).encode('utf8'))
+    return h.hexdigest()
+
+
+class Manifest:
+    """ On disk manifest of the generated configurations
+
+        Each project, keyed by its absolute path, records the digest of its
+        inputs and the digest of the written configuration file.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(os.getcwd(), MANIFEST_FILENAME)
+        self._projects = {}
+        if os.path.exists(self.path):
+            with open(self.path) as fp:
+                content = json.load(fp)
+            if content.get('version') == MANIFEST_VERSION:
+                self._projects = content.get('projects', {})
+
+    @staticmethod
+    def key(project):
+        return os.path.abspath(project)
+
+    def get(self, project):
+        return self._projects.get(self.key(project))
+
+    def is_up_to_date(self, project, digest, output):
+        """ Test if the configuration of the project would be identical to the existing one
+        """
+        entry = self.get(project)
+        if not entry:
+            return False
+        if entry['digest'] != digest or entry['output'] != os.path.abspath(output):
+            return False
+        # The configuration file must not have been modified or deleted since
+        return entry['output_digest'] == file_digest(output)
+
+    def update(self, project, digest, output):
+        self._projects[self.key(project)] = {
+            'digest': digest,
+            'output': os.path.abspath(output),
+            'output_digest': file_digest(output),
+        }
+
+    def remove(self, project):
+        self._projects.pop(self.key(project), None)
+
+    def save(self):
+        """ Write the manifest atomically
+        """
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as fp:
+            json.dump({'version': MANIFEST_VERSION, 'projects': self._projects}, fp, indent=4, sort_keys=True)
+        os.replace(tmp, self.path)
@@ -0,0 +1,103 @@
+__copyright__ = 'Copyright 2023, 3Liz'
+__license__ = 'GPL version 3'
+__email__ = 'info@3liz.org'
+
+import time
+import tracemalloc
+
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+
+def max_rss():
+    """ Peak resident memory of the process, in kilobytes, None if unknown
+    """
+    if resource is None:
+        return None
+    # Kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class Profiler:
+    """ Record the wall time and the memory of the phases of a generation
+
+        When disabled, phases are not measured and the profiler costs nothing.
+        The memory allocated by Python is traced with tracemalloc, allocations
+        made by Qgis itself are only visible in the process peak memory.
+
+        :param enabled: measure the phases
+        :param slowest: number of slowest layers kept in the report
+    """
+
+    def __init__(self, enabled=True, slowest=10):
+        self.enabled = enabled
+        self.slowest = slowest
+        self.phases = []
+        self.layers = []
+        self._start = time.perf_counter()
+        if enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def phase(self, name):
+        """ Measure a phase of the generation
+        """
+        if not self.enabled:
+            yield
+            return
+
+        # Python 3.9 and above
+        reset_peak = getattr(tracemalloc, 'reset_peak', None)
+        if reset_peak:
+            reset_peak()
+        current, _ = tracemalloc.get_traced_memory()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            self.phases.append({
+                'name': name,
+                'elapsed': round(elapsed, 6),
+                'python_peak_kb': round(max(peak - current, 0) / 1024) if reset_peak else round(peak / 1024),
+                'max_rss_kb': max_rss(),
+            })
+
+    @contextmanager
+    def layer(self, name):
+        """ Measure the options of a single layer
+        """
+        if not self.enabled:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.layers.append((time.perf_counter() - start, name))
+
+    def report(self):
+        """ The profiling report, as a dict ready to be dumped in JSON
+        """
+        slowest = sorted(self.layers, reverse=True)[:self.slowest]
+        return {
+            'elapsed': round(time.perf_counter() - self._start, 6),
+            'max_rss_kb': max_rss(),
+            'phases': self.phases,
+            'layers': {
+                'count': len(self.layers),
+                'elapsed': round(sum(elapsed for elapsed, _ in self.layers), 6),
+                'slowest': [{'name': name, 'elapsed': round(elapsed, 6)} for elapsed, name in slowest],
+            },
+        }
+
+    def stop(self):
+        if self.enabled and tracemalloc.is_tracing():
+            tracemalloc.stop()
@@ -0,0 +1,81 @@
+__copyright__ = 'Copyright 2023, 3Liz'
+__license__ = 'GPL version 3'
+__email__ = 'info@3liz.org'
+
+import os
+import xml.etree.ElementTree as ET
+
+from .manifest import open_project_xml
+
+# Values of the "geometry" attribute of a vector layer in the project XML
+XML_GEOMETRY_TYPES = {
+    'Point': 'point',
+    'Line': 'line',
+    'Polygon': 'polygon',
+    'Unknown geometry': 'unknown',
+    'No geometry': 'none',
+}
+
+
+def _read_extent(node):
+    """ Read an <extent> node as [xmin, ymin, xmax, ymax]
+    """
+    if node is None:
+        return None
+    try:
+        return [float(node.findtext(k)) for k in ('xmin', 'ymin', 'xmax', 'ymax')]
+    except (TypeError, ValueError):
+        return None
+
+
+def read_layers_metadata(path, _cache=None):
+    """ Read layer metadata stored in the project XML without any data provider
+
+        Return a dict keyed by layer id with the `extent` and, for vector
+        layers, the `geometryType` as written by Qgis when the project was
+        saved. Embedded layers are read from their own project.
+    """
+    if _cache is None:
+        _cache = {}
+    path = os.path.abspath(path)
+    if path in _cache:
+        return _cache[path]
+
+    layers = {}
+    _cache[path] = layers
+    if not os.path.exists(path):
+        return layers
+
+    base = os.path.dirname(path)
+    with open_project_xml(path) as fp:
+        if fp is None:
+            return layers
+        try:
+            _read_maplayers(fp, base, layers, _cache)
+        except ET.ParseError:
+            # Extents and geometry types are then read from the data providers
+            layers.clear()
+
+    return layers
+
+
+def _read_maplayers(fp, base, layers, _cache):
+    """ Fill `layers` with the metadata of the <maplayer> nodes of a project XML
+    """
+    for _, elem in ET.iterparse(fp):
+        if elem.tag != 'maplayer':
+            continue
+
+        layer_id = elem.get('id') or elem.findtext('id')
+        if elem.get('embedded') == '1':
+            sub = os.path.normpath(os.path.join(base, elem.get('project', '')))
+            sub_layers = read_layers_metadata(sub, _cache)
+            if layer_id in sub_layers:
+                layers[layer_id] = sub_layers[layer_id]
+        elif layer_id:
+            metadata = {'extent': _read_extent(elem.find('extent'))}
+            if elem.get('type') == 'vector':
+                metadata['geometryType'] = XML_GEOMETRY_TYPES.get(elem.get('geometry'))
+            layers[layer_id] = metadata
+
+        elem.clear()
@@ -0,0 +1,228 @@
+"""Regenerate Lizmap configuration files when projects are modified
+
+    Watched files are the projects, the projects they embed and the template.
+    Changes are detected with inotify if the optional `inotify_simple` package
+    is installed, by polling otherwise. Rapid saves are coalesced: the
+    regeneration starts once no file changed during the debounce window.
+"""
+
+__copyright__ = 'Copyright 2023, 3Liz'
+__license__ = 'GPL version 3'
+__email__ = 'info@3liz.org'
+
+import multiprocessing
+import os
+import sys
+import time
+
+from .commands import _init_worker, find_projects, run_job
+from .manifest import embedded_projects
+
+try:
+    import inotify_simple
+except ImportError:
+    inotify_simple = None
+
+
+def file_signature(path):
+    """ Modification time and size of a file, None if it does not exist
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class ProjectWatcher:
+    """ Detect the projects to regenerate in a set of paths
+
+        :param paths: directories, globs or files, like `find_projects`
+        :param pattern: project file pattern in directories
+        :param template: optional template, all projects are regenerated if it changes
+    """
+
+    def __init__(self, paths, pattern='*.qgs', template=None):
+        self.paths = paths
+        self.pattern = pattern
+        self.template = os.path.abspath(template) if template else None
+        # Embedded projects, by project, with the project signature they were read from
+        self._embedded = {}
+        self._signatures = self.scan()
+
+    def projects(self):
+        return [os.path.abspath(p) for p in find_projects(self.paths, self.pattern)]
+
+    def embedded(self, project, signature):
+        cached = self._embedded.get(project)
+        if cached is None or cached[0] != signature:
+            cached = (signature, embedded_projects(project) if signature else [])
+            self._embedded[project] = cached
+        return cached[1]
+
+    def scan(self):
+        """ Signatures of all the watched files
+        """
+        signatures = {}
+        for project in self.projects():
+            signatures[project] = file_signature(project)
+            for sub in self.embedded(project, signatures[project]):
+                if sub not in signatures:
+                    signatures[sub] = file_signature(sub)
+        if self.template:
+            signatures[self.template] = file_signature(self.template)
+        return signatures
+
+    def changed_files(self):
+        """ Return the files modified, added or removed since the last call
+        """
+        signatures = self.scan()
+        changed = {
+            path for path in set(signatures) | set(self._signatures)
+            if signatures.get(path) != self._signatures.get(path)
+        }
+        self._signatures = signatures
+        return changed
+
+    @staticmethod
+    def signatures(paths):
+        """ Current signatures of some files
+        """
+        return {path: file_signature(path) for path in paths}
+
+    def acknowledge(self, signatures):
+        """ Take these signatures as the reference, for files handled by the generation
+
+            A file modified after its signature was taken is detected as changed
+            by the next call to `changed_files`.
+        """
+        self._signatures.update(signatures)
+
+    def outdated_projects(self, changed):
+        """ Return the existing projects to regenerate for a set of changed files
+        """
+        projects = [p for p in self.projects() if self._signatures.get(p)]
+        if self.template and self.template in changed:
+            return projects
+        return [
+            p for p in projects
+            if p in changed or any(sub in changed for sub in self._embedded.get(p, (None, []))[1])
+        ]
+
+
+class Waiter:
+    """ Block until a watched file may have changed
+
+        With inotify, the directories are watched recursively and `wait` returns
+        on the first event. Otherwise, it just sleeps for the polling interval.
+    """
+
+    def __init__(self, paths, interval=1.0):
+        self.interval = interval
+        self._inotify = None
+        self._directories = {}
+        if inotify_simple is None:
+            return
+
+        flags = inotify_simple.flags
+        self._mask = flags.CLOSE_WRITE | flags.MOVED_TO | flags.MOVED_FROM | flags.CREATE | flags.DELETE
+        self._inotify = inotify_simple.INotify()
+        for path in paths:
+            if not os.path.isdir(path):
+                # A file or a glob, watch its directory
+                path = os.path.dirname(path.split('*')[0]) or '.'
+            self._add_tree(path)
+
+    def _add_tree(self, path):
+        for root, _, _ in os.walk(path):
+            try:
+                self._directories[self._inotify.add_watch(root, self._mask)] = root
+            except OSError:
+                # Removed in the meantime, or too many watches
+                pass
+
+    @property
+    def backend(self):
+        return 'inotify' if self._inotify else 'polling'
+
+    def wait(self, timeout):
+        """ Wait for a change, at most `timeout` seconds
+        """
+        if not self._inotify:
+            time.sleep(min(timeout, self.interval))
+            return
+
+        flags = inotify_simple.flags
+        for event in self._inotify.read(timeout=max(0, int(timeout * 1000))):
+            if event.mask & flags.ISDIR and event.mask & (flags.CREATE | flags.MOVED_TO):
+                parent = self._directories.get(event.wd)
+                if parent:
+                    self._add_tree(os.path.join(parent, event.name))
+
+
+def watch_projects(jobs_options, paths, pattern='*.qgs', debounce=2.0, interval=1.0, processes=None, verbose=False):
+    """ Regenerate the configuration of the modified projects, until interrupted
+
+        :param jobs_options: the `generate_config` options shared by all jobs
+        :param debounce: seconds without any change before regenerating
+        :param interval: polling interval, in seconds, without inotify
+        :param processes: number of worker processes
+    """
+    watcher = ProjectWatcher(paths, pattern, jobs_options.get('template'))
+    # The project itself is written when the server options, the title or the description are set
+    writes_project = any(jobs_options.get(key) for key in ('server', 'title', 'description'))
+    waiter = Waiter(paths, interval)
+    if processes is None:
+        processes = min(4, os.cpu_count() or 1)
+
+    print("Watching {} ({}), press Ctrl+C to stop".format(', '.join(paths), waiter.backend), file=sys.stderr)
+
+    pool = None
+    if processes > 1:
+        pool = multiprocessing.Pool(processes, initializer=_init_worker, initargs=(verbose,))
+    else:
+        _init_worker(verbose)
+
+    try:
+        while True:
+            waiter.wait(interval)
+            changed = watcher.changed_files()
+            if not changed:
+                continue
+
+            # Coalesce rapid saves, until nothing changed during the debounce window
+            last_change = time.monotonic()
+            while True:
+                remaining = debounce - (time.monotonic() - last_change)
+                if remaining <= 0:
+                    break
+                waiter.wait(remaining)
+                more = watcher.changed_files()
+                if more:
+                    changed |= more
+                    last_change = time.monotonic()
+
+            projects = watcher.outdated_projects(changed)
+            if not projects:
+                continue
+
+            # Projects saved while they are regenerated must be regenerated again
+            signatures = watcher.signatures(projects)
+
+            jobs = [dict(jobs_options, project=project) for project in projects]
+            results = pool.imap_unordered(run_job, jobs) if pool else map(run_job, jobs)
+            for result in results:
+                print("{} {} ({}s) {}".format(
+                    result['status'], result['project'], result['elapsed'], result['error'] or ''),
+                    file=sys.stderr)
+                if writes_project and result['status'] == 'ok':
+                    # The project itself has been written by the generation, this is not a change
+                    signatures.update(watcher.signatures([result['project']]))
+
+            watcher.acknowledge(signatures)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if pool:
+            pool.terminate()
+            pool.join()
@@ -2,17 +2,19 @@ __copyright__ = 'Copyright 2023, 3Liz'
 __license__ = 'GPL version 3'
 __email__ = 'info@3liz.org'
 
+import copy
 import json
 import logging
 import os
 import re
 import sys
+import time
 
 from collections import OrderedDict
 from functools import partial
 from pathlib import Path
 from shutil import copyfile
-from typing import Dict, Optional, Tuple
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 
 from qgis.core import (
     Qgis,
@@ -22,8 +24,8 @@ from qgis.core import (
     QgsLayerTree,
     QgsLayerTreeGroup,
     QgsLayerTreeLayer,
+    QgsLayerTreeNode,
     QgsMapLayer,
-    QgsMapLayerModel,
     QgsMapLayerProxyModel,
     QgsProject,
     QgsSettings,
@@ -33,9 +35,11 @@ from qgis.core import (
 from qgis.PyQt import sip
 from qgis.PyQt.QtCore import (
     QCoreApplication,
+    QModelIndex,
     QRegExp,
     QStorageInfo,
     Qt,
+    QTimer,
     QTranslator,
 )
 from qgis.PyQt.QtGui import (
@@ -53,7 +57,6 @@ from qgis.PyQt.QtWidgets import (
     QLineEdit,
     QMessageBox,
     QTableWidgetItem,
-    QTreeWidgetItem,
 )
 
 from lizmap import DEFAULT_LWC_VERSION
@@ -77,27 +80,18 @@ from lizmap.definitions.online_help import online_help
 from lizmap.definitions.time_manager import TimeManagerDefinitions
 from lizmap.definitions.tooltip import ToolTipDefinitions
 from lizmap.definitions.warnings import Warnings
-from lizmap.dialogs.html_editor import HtmlEditorDialog
-from lizmap.dialogs.lizmap_popup import LizmapPopupDialog
-from lizmap.dialogs.main import LizmapDialog
-from lizmap.dialogs.scroll_message_box import ScrollMessageBox
-from lizmap.forms.atlas_edition import AtlasEditionDialog
-from lizmap.forms.attribute_table_edition import AttributeTableEditionDialog
-from lizmap.forms.dataviz_edition import DatavizEditionDialog
-from lizmap.forms.edition_edition import EditionLayerDialog
-from lizmap.forms.filter_by_form_edition import FilterByFormEditionDialog
-from lizmap.forms.filter_by_login import FilterByLoginEditionDialog
-from lizmap.forms.filter_by_polygon import FilterByPolygonEditionDialog
-from lizmap.forms.layout_edition import LayoutEditionDialog
-from lizmap.forms.locate_layer_edition import LocateLayerEditionDialog
-from lizmap.forms.time_manager_edition import TimeManagerEditionDialog
-from lizmap.forms.tooltip_edition import ToolTipEditionDialog
+from lizmap.forms import edition_dialog
+from lizmap.layer_index import LayerIndex
+from lizmap.layer_tree_model import LayerTreeNode
 from lizmap.lizmap_api.config import LizmapConfig
-from lizmap.ogc_project_validity import OgcProjectValidity
+from lizmap.lizmap_api.extent import (
+    ExtentCache,
+    ExtentStrategy,
+    LayerExtentResolver,
+)
+from lizmap.lizmap_api.project_xml import read_layers_metadata
 from lizmap.saas import is_lizmap_dot_com_hosting, valid_saas_lizmap_dot_com
-from lizmap.table_manager.base import TableManager
-from lizmap.table_manager.dataviz import TableManagerDataviz
-from lizmap.table_manager.layouts import TableManagerLayouts
+from lizmap.serializers import OptionSerializers
 
 try:
     from lizmap.plugin_manager import PluginManager
@@ -106,7 +100,6 @@ except ModuleNotFoundError:
     # In a standalone application
     QGIS_PLUGIN_MANAGER = False
 
-from lizmap.dialogs.wizard_group import WizardGroupDialog
 from lizmap.qgis_plugin_tools.tools.custom_logging import setup_logger
 from lizmap.qgis_plugin_tools.tools.ghost_layers import remove_all_ghost_layers
 from lizmap.qgis_plugin_tools.tools.i18n import setup_translation, tr
@@ -117,9 +110,9 @@ from lizmap.qgis_plugin_tools.tools.resources import (
 )
 from lizmap.qgis_plugin_tools.tools.version import version
 from lizmap.qt_style_sheets import NEW_FEATURE_COLOR, NEW_FEATURE_CSS
-from lizmap.server_ftp import FtpServer
-from lizmap.server_lwc import MAX_DAYS, ServerManager
+from lizmap.save_task import SaveTask
 from lizmap.tools import (
+    cfg_file_content,
     convert_lizmap_popup,
     current_git_hash,
     format_qgis_version,
@@ -132,15 +125,19 @@ from lizmap.tools import (
     qgis_version,
     to_bool,
     unaccent,
+    write_file_if_changed,
 )
-from lizmap.tooltip import Tooltip
-from lizmap.version_checker import VersionChecker
 
 if qgis_version() >= 31400:
     from qgis.core import QgsProjectServerValidator
 
+if TYPE_CHECKING:
+    from lizmap.dialogs.main import LizmapDialog
+
 LOGGER = logging.getLogger(plugin_name())
 VERSION_URL = 'https://raw.githubusercontent.com/3liz/lizmap-web-client/versions/versions.json'
+# Delay after QGIS startup to build the dialog, if the "lizmap/preload_dialog" setting is enabled, in milliseconds
+PRELOAD_DIALOG_DELAY = 5000
 # To try a local file
 # VERSION_URL = 'file:///home/etienne/.local/share/QGIS/QGIS3/profiles/default/Lizmap/released_versions.json'
 
@@ -149,10 +146,14 @@ class Lizmap:
 
     def __init__(self, iface):
         """Constructor of the Lizmap plugin."""
+        # Time spent by the plugin while QGIS is starting, until the end of initGui
+        self._start_time = time.perf_counter()
         LOGGER.info("Plugin starting")
         self.iface = iface
         # noinspection PyArgumentList
         self.project = QgsProject.instance()
+        self.layer_index = LayerIndex(self.project)
+        self.layer_index.add_listener(self.layer_changed)
 
         # Keep it for a few months
         # 2023/04/15
@@ -177,10 +178,91 @@ class Lizmap:
 
         lizmap_config = LizmapConfig(project=self.project)
 
-        self.dlg = LizmapDialog()
         self.version = version()
         self.version_checker = None
+        self.save_task = None
+        self.save_task_id = None
+        self._close_after_save = False
+        # Progress is emitted by the task manager in the GUI thread
+        # noinspection PyArgumentList
+        QgsApplication.taskManager().progressChanged.connect(self.save_task_progress)
         self.is_dev_version = any(item in self.version for item in UNSTABLE_VERSION_PREFIX)
+
+        # The dialog is built the first time it is used, not when QGIS is starting
+        self._dlg = None
+        self._gui_initialized = False
+
+        self.layers_table = dict()
+
+        # List of ui widget for data driven actions and checking
+        self.global_options = lizmap_config.globalOptionDefinitions
+        self.layer_options_list = lizmap_config.layerOptionDefinitions
+        # Shared by all nodes of the layer tree, which store only their own values
+        self.layer_tree_defaults = {key: item['default'] for key, item in self.layer_options_list.items()}
+
+        # map QGIS geometry type
+        # TODO lizmap 4, to remove
+        self.mapQgisGeometryType = {
+            0: 'point',
+            1: 'line',
+            2: 'polygon',
+            3: 'unknown',
+            4: 'none'
+        }
+
+        self.layerList = None
+        self.action = None
+        self.embeddedGroups = None
+        self.myDic = None
+        self.help_action = None
+
+        # Sections of the CFG file, for tables not loaded yet
+        self._pending_tables = {}
+        self._cfg_target_version = None
+        self._cfg_plugin_version = None
+
+        # The Lizmap layer tree is kept in sync with the QGIS layer tree, between two openings of the dialog
+        self._layer_tree_synced = False
+        self._layer_tree_edited = False
+        # Incremented at each edition, to know if the layer tree has been edited while the CFG file was written
+        self._layer_tree_edits = 0
+        self._layer_tree_cfg_signature = None
+        self._json_layers = {}
+        self._removed_tree_ids = []
+        root = self.project.layerTreeRoot()
+        # noinspection PyUnresolvedReferences
+        root.addedChildren.connect(self.layer_tree_added_children)
+        # noinspection PyUnresolvedReferences
+        root.willRemoveChildren.connect(self.layer_tree_will_remove_children)
+        # noinspection PyUnresolvedReferences
+        root.removedChildren.connect(self.layer_tree_removed_children)
+        # noinspection PyUnresolvedReferences
+        root.nameChanged.connect(self.layer_tree_name_changed)
+        # Before reading another project, its layer tree must not be synced with the previous CFG file
+        # noinspection PyUnresolvedReferences
+        self.project.cleared.connect(self.project_cleared)
+
+    @property
+    def dlg(self) -> 'LizmapDialog':
+        """ The dialog of the plugin, built the first time it is used. """
+        if self._dlg is None:
+            start = time.perf_counter()
+            self.setup_dialog()
+            if self._gui_initialized:
+                self.setup_dialog_gui()
+            LOGGER.info("Lizmap dialog built in {:.0f} ms".format((time.perf_counter() - start) * 1000))
+        return self._dlg
+
+    def preload_dialog(self):
+        """ Build the dialog in advance, once QGIS is started. """
+        if self._dlg is None:
+            _ = self.dlg
+
+    def setup_dialog(self):
+        """ Build the dialog and the widgets depending on it. """
+        from lizmap.dialogs.main import LizmapDialog
+        self._dlg = LizmapDialog()
+        self.dlg.layer_tree_model.layer_index = self.layer_index
         self.dlg.label_dev_version.setVisible(False)
         if self.is_dev_version:
             self.dlg.setWindowTitle('Lizmap branch {}, commit {}, next {}'.format(
@@ -191,14 +273,9 @@ class Lizmap:
                 self.dlg.label_dev_version.setText(text)
                 self.dlg.label_dev_version.setVisible(True)
 
-        self.layers_table = dict()
-
         # List of ui widget for data driven actions and checking
-        self.global_options = lizmap_config.globalOptionDefinitions
         self.global_options['externalSearch']['widget'] = self.dlg.liExternalSearch
 
-        # List of ui widget for data driven actions and checking
-        self.layer_options_list = lizmap_config.layerOptionDefinitions
         self.layer_options_list['legend_image_option']['widget'] = self.dlg.combo_legend_option
         self.layer_options_list['popupSource']['widget'] = self.dlg.liPopupSource
         self.layer_options_list['imageFormat']['widget'] = self.dlg.liImageFormat
@@ -332,7 +409,6 @@ class Lizmap:
         self.global_options['atlasShowAtStartup']['widget'] = self.dlg.atlasShowAtStartup
         self.global_options['atlasAutoPlay']['widget'] = self.dlg.atlasAutoPlay
 
-        self.layer_options_list = lizmap_config.layerOptionDefinitions
         # Add widget information
         self.layer_options_list['title']['widget'] = self.dlg.inLayerTitle
         self.layer_options_list['abstract']['widget'] = self.dlg.teLayerAbstract
@@ -366,15 +442,8 @@ class Lizmap:
         # self.layer_options_list['imageFormat']['widget'] = self.dlg.liImageFormat
         # self.global_options['externalSearch']['widget'] = self.dlg.liExternalSearch
 
-        # map QGIS geometry type
-        # TODO lizmap 4, to remove
-        self.mapQgisGeometryType = {
-            0: 'point',
-            1: 'line',
-            2: 'polygon',
-            3: 'unknown',
-            4: 'none'
-        }
+        # Compiled when they are used, now that the widgets are known
+        self.option_serializers = OptionSerializers(self.global_options, self.layer_options_list)
 
         # Disable checkboxes on the layer tab
         self.enable_check_box(False)
@@ -383,7 +452,7 @@ class Lizmap:
         self.dlg.gb_lizmapExternalBaselayers.setVisible(False)
 
         # Catch user interaction on layer tree and inputs
-        self.dlg.layer_tree.itemSelectionChanged.connect(self.from_data_to_ui_for_layer_group)
+        self.dlg.layer_tree.selectionModel().selectionChanged.connect(self.from_data_to_ui_for_layer_group)
 
         # Catch user interaction on Map Scales input
         self.dlg.inMapScales.editingFinished.connect(self.get_min_max_scales)
@@ -470,6 +539,9 @@ class Lizmap:
             slot = self.on_baselayer_checkbox_change
             item.stateChanged.connect(slot)
 
+        from lizmap.server_ftp import FtpServer
+        from lizmap.server_lwc import ServerManager
+
         self.server_ftp = FtpServer(self.dlg)
 
         self.server_manager = ServerManager(
@@ -485,7 +557,7 @@ class Lizmap:
             self.check_dialog_validity,
         )
         # Debug
-        # self.server_manager.clean_cache(True)
+        # self.server_manager.metadata_cache.clean(True)
 
         current = format_qgis_version(qgis_version())
         current = '{}.{}'.format(current[0], current[1])
@@ -630,12 +702,6 @@ class Lizmap:
         self.target_server_changed()
         self.dlg.refresh_combo_repositories()
 
-        self.layerList = None
-        self.action = None
-        self.embeddedGroups = None
-        self.myDic = None
-        self.help_action = None
-
     def filename_changed(self):
         """ When the current project has been renamed. """
         if os.getenv("QGIS_PLUGIN_AUTO_SAVING"):
@@ -653,7 +719,7 @@ class Lizmap:
         if self.current_path and new_path != self.current_path and not os.getenv("CI"):
             old_cfg = self.current_path.with_suffix('.qgs.cfg')
             if old_cfg.exists():
-                box = QMessageBox(self.dlg)
+                box = QMessageBox(self._dlg)
                 box.setIcon(QMessageBox.Question)
                 box.setWindowIcon(QIcon(resources_path('icons', 'icon.png')), )
                 box.setWindowTitle(tr('Project has been renamed'))
@@ -780,14 +846,74 @@ class Lizmap:
         # noinspection PyUnresolvedReferences
         self.help_action.triggered.connect(self.show_help)
 
+        # detect project closed
+        self.iface.projectRead.connect(self.on_project_read)
+        self.iface.newProjectCreated.connect(self.on_project_read)
+
+        # Delete layers from table when deleted from registry
+        # noinspection PyUnresolvedReferences
+        # Once for all layers removed together, while they still exist
+        self.project.layersWillBeRemoved.connect(self.remove_layer_from_table_by_layer_ids)
+
+        # Layouts
+        # noinspection PyUnresolvedReferences
+        self.project.layoutManager().layoutAdded.connect(self.layout_added)
+        # noinspection PyUnresolvedReferences
+        self.project.layoutManager().layoutRenamed.connect(self.layout_renamed)
+        # noinspection PyUnresolvedReferences
+        self.project.layoutManager().layoutRemoved.connect(self.layout_removed)
+
+        self.iface.addPluginToWebMenu(None, self.action)
+        self.iface.addWebToolBarIcon(self.action)
+
+        server_side = tr(
+            "This value will be replaced on the server side when evaluating the expression thanks to "
+            "the QGIS server Lizmap plugin.")
+        # Register variable helps
+        if qgis_version() >= 32200:
+            QgsExpression.addVariableHelpText(
+                "lizmap_user",
+                "{}<br/>{}<br/>{}".format(
+                    tr("The current Lizmap login as a string."),
+                    tr("It might be an empty string if the user is not connected."),
+                    server_side,
+                )
+            )
+            QgsExpression.addVariableHelpText(
+                "lizmap_user_groups",
+                "{}<br/>{}<br/>{}".format(
+                    tr("The current groups of the logged user as an array."),
+                    tr("It might be an empty array if the user is not connected."),
+                    server_side,
+                )
+            )
+            QgsExpression.addVariableHelpText("lizmap_repository", tr("The current repository ID on the server."))
+
+        self._gui_initialized = True
+        if self._dlg is not None:
+            self.setup_dialog_gui()
+        elif QgsSettings().value('lizmap/preload_dialog', False, bool):
+            # Build the dialog once QGIS is idle, to open it faster later
+            QTimer.singleShot(PRELOAD_DIALOG_DELAY, self.preload_dialog)
+
+        LOGGER.info("Plugin loaded in {:.0f} ms".format((time.perf_counter() - self._start_time) * 1000))
+
+    def setup_dialog_gui(self):
+        """ Connect the dialog to the plugin, and create the table managers. """
+        from lizmap.table_manager.base import TableManager
+        from lizmap.table_manager.dataviz import TableManagerDataviz
+        from lizmap.table_manager.layouts import TableManagerLayouts
+
         # connect Lizmap signals and functions
         self.dlg.buttonBox.button(QDialogButtonBox.Cancel).clicked.connect(self.dlg.close)
         self.dlg.buttonBox.button(QDialogButtonBox.Apply).clicked.connect(self.save_cfg_file)
         self.dlg.buttonBox.button(QDialogButtonBox.Ok).clicked.connect(self.ok_button_clicked)
+        self.dlg.button_cancel_save.clicked.connect(self.cancel_save_task)
         self.dlg.buttonBox.button(QDialogButtonBox.Help).clicked.connect(self.show_help)
 
         # Connect the left menu to the right panel
         self.dlg.mOptionsListWidget.currentRowChanged.connect(self.dlg.mOptionsStackedWidget.setCurrentIndex)
+        self.dlg.mOptionsStackedWidget.currentChanged.connect(self.load_tables_in_panel)
 
         # clear log button clicked
         self.dlg.button_clear_log.clicked.connect(self.clear_log)
@@ -819,10 +945,6 @@ class Lizmap:
         self.dlg.button_refresh_link.setToolTip('Set the link from the dataUrl property in the layer properties.')
         self.dlg.button_refresh_link.clicked.connect(self.link_from_properties)
 
-        # detect project closed
-        self.iface.projectRead.connect(self.on_project_read)
-        self.iface.newProjectCreated.connect(self.on_project_read)
-
         # initial extent
         self.dlg.btSetExtentFromProject.clicked.connect(self.set_initial_extent_from_project)
         self.dlg.btSetExtentFromCanvas.clicked.connect(self.set_initial_extent_from_canvas)
@@ -870,37 +992,37 @@ class Lizmap:
                     add_button.clicked.connect(slot)
                 if key == 'atlas':
                     definition = AtlasDefinitions()
-                    dialog = AtlasEditionDialog
+                    dialog = edition_dialog('atlas_edition', 'AtlasEditionDialog')
                 elif key == 'attributeLayers':
                     definition = AttributeTableDefinitions()
-                    dialog = AttributeTableEditionDialog
+                    dialog = edition_dialog('attribute_table_edition', 'AttributeTableEditionDialog')
                 elif key == 'editionLayers':
                     definition = EditionDefinitions()
-                    dialog = EditionLayerDialog
+                    dialog = edition_dialog('edition_edition', 'EditionLayerDialog')
                 elif key == 'datavizLayers':
                     definition = DatavizDefinitions()
-                    dialog = DatavizEditionDialog
+                    dialog = edition_dialog('dataviz_edition', 'DatavizEditionDialog')
                 elif key == 'layouts':
                     definition = LayoutsDefinitions()
-                    dialog = LayoutEditionDialog
+                    dialog = edition_dialog('layout_edition', 'LayoutEditionDialog')
                 elif key == 'locateByLayer':
                     definition = LocateByLayerDefinitions()
-                    dialog = LocateLayerEditionDialog
+                    dialog = edition_dialog('locate_layer_edition', 'LocateLayerEditionDialog')
                 elif key == 'loginFilteredLayers':
                     definition = FilterByLoginDefinitions()
-                    dialog = FilterByLoginEditionDialog
+                    dialog = edition_dialog('filter_by_login', 'FilterByLoginEditionDialog')
                 elif key == 'timemanagerLayers':
                     definition = TimeManagerDefinitions()
-                    dialog = TimeManagerEditionDialog
+                    dialog = edition_dialog('time_manager_edition', 'TimeManagerEditionDialog')
                 elif key == 'tooltipLayers':
                     definition = ToolTipDefinitions()
-                    dialog = ToolTipEditionDialog
+                    dialog = edition_dialog('tooltip_edition', 'ToolTipEditionDialog')
                 elif key == 'formFilterLayers':
                     definition = FilterByFormDefinitions()
-                    dialog = FilterByFormEditionDialog
+                    dialog = edition_dialog('filter_by_form_edition', 'FilterByFormEditionDialog')
                 elif key == 'filter_by_polygon':
                     definition = FilterByPolygonDefinitions()
-                    dialog = FilterByPolygonEditionDialog
+                    dialog = edition_dialog('filter_by_polygon', 'FilterByPolygonEditionDialog')
                 else:
                     raise Exception('Unknown panel.')
 
@@ -916,6 +1038,7 @@ class Lizmap:
                         item['editButton'],
                         item.get('upButton'),
                         item.get('downButton'),
+                        self.layer_index,
                     )
                 elif key == 'layouts':
                     # noinspection PyTypeChecker
@@ -927,6 +1050,7 @@ class Lizmap:
                         item['editButton'],
                         item.get('upButton'),
                         item.get('downButton'),
+                        self.layer_index,
                     )
                 else:
                     # noinspection PyTypeChecker
@@ -939,6 +1063,7 @@ class Lizmap:
                         item['editButton'],
                         item.get('upButton'),
                         item.get('downButton'),
+                        self.layer_index,
                     )
 
                 control = item.get('upButton')
@@ -959,17 +1084,6 @@ class Lizmap:
                     control.setIcon(QIcon(QgsApplication.iconPath('mActionArrowDown.svg')))
                     control.setToolTip(tr('Move the layer down in the table'))
 
-        # Delete layers from table when deleted from registry
-        # noinspection PyUnresolvedReferences
-        self.project.layersRemoved.connect(self.remove_layer_from_table_by_layer_ids)
-
-        # Layouts
-        # Not connecting the "layoutAdded" signal, it's done when opening the Lizmap plugin
-        # noinspection PyUnresolvedReferences
-        self.project.layoutManager().layoutRenamed.connect(self.layout_renamed)
-        # noinspection PyUnresolvedReferences
-        self.project.layoutManager().layoutRemoved.connect(self.layout_removed)
-
         # Lizmap external layers as baselayers
         # add a layer to the lizmap external baselayers
         self.dlg.btLizmapBaselayerAdd.clicked.connect(self.addLayerToLizmapBaselayers)
@@ -977,32 +1091,6 @@ class Lizmap:
         # Atlas
         self.dlg.label_atlas_34.setVisible(self.is_dev_version)
 
-        self.iface.addPluginToWebMenu(None, self.action)
-        self.iface.addWebToolBarIcon(self.action)
-
-        server_side = tr(
-            "This value will be replaced on the server side when evaluating the expression thanks to "
-            "the QGIS server Lizmap plugin.")
-        # Register variable helps
-        if qgis_version() >= 32200:
-            QgsExpression.addVariableHelpText(
-                "lizmap_user",
-                "{}<br/>{}<br/>{}".format(
-                    tr("The current Lizmap login as a string."),
-                    tr("It might be an empty string if the user is not connected."),
-                    server_side,
-                )
-            )
-            QgsExpression.addVariableHelpText(
-                "lizmap_user_groups",
-                "{}<br/>{}<br/>{}".format(
-                    tr("The current groups of the logged user as an array."),
-                    tr("It might be an empty array if the user is not connected."),
-                    server_side,
-                )
-            )
-            QgsExpression.addVariableHelpText("lizmap_repository", tr("The current repository ID on the server."))
-
         # Let's fix the dialog to the first panel
         self.dlg.mOptionsListWidget.setCurrentRow(0)
 
@@ -1039,6 +1127,8 @@ class Lizmap:
             self.dlg.allow_navigation(False, msg)
             return False
 
+        from lizmap.server_cache import MAX_DAYS
+
         metadata = self.dlg.server_combo.currentData(ServerComboData.JsonMetadata.value)
         if not metadata:
             msg = tr(
@@ -1072,6 +1162,22 @@ class Lizmap:
             self.iface.pluginHelpMenu().removeAction(self.help_action)
             del self.help_action
 
+        # noinspection PyArgumentList
+        QgsApplication.taskManager().progressChanged.disconnect(self.save_task_progress)
+        self.layer_index.remove_listener(self.layer_changed)
+        self.layer_index.disconnect()
+        root = self.project.layerTreeRoot()
+        # noinspection PyUnresolvedReferences
+        root.addedChildren.disconnect(self.layer_tree_added_children)
+        # noinspection PyUnresolvedReferences
+        root.willRemoveChildren.disconnect(self.layer_tree_will_remove_children)
+        # noinspection PyUnresolvedReferences
+        root.removedChildren.disconnect(self.layer_tree_removed_children)
+        # noinspection PyUnresolvedReferences
+        root.nameChanged.disconnect(self.layer_tree_name_changed)
+        # noinspection PyUnresolvedReferences
+        self.project.cleared.disconnect(self.project_cleared)
+
     def enable_popup_source_button(self):
         """Enable or not the "Configure" button according to the popup source."""
         data = self.layer_options_list['popupSource']['widget'].currentData()
@@ -1120,6 +1226,7 @@ class Lizmap:
         # End of duplicated
 
         current_acl = line_edit.text()
+        from lizmap.dialogs.wizard_group import WizardGroupDialog
         wizard_dialog = WizardGroupDialog(helper, current_acl, acl['groups'])
         if not wizard_dialog.exec_():
             return None
@@ -1188,6 +1295,10 @@ class Lizmap:
         skip_tables is only used in tests, as we don't have "table managers". It's only for testing the "layer" panel.
         """
         json_options = {}
+        json_layers = None
+        self._pending_tables = {}
+        self._cfg_target_version = None
+        self._cfg_plugin_version = None
         json_file = self.dlg.cfg_file()
         if json_file.exists():
             with open(json_file, encoding='utf-8') as f:
@@ -1197,6 +1308,9 @@ class Lizmap:
             try:
                 sjson = json.loads(json_file_reader)
                 json_options = sjson['options']
+                json_layers = sjson.get('layers', {})
+                self._cfg_target_version = sjson.get('metadata', {}).get('lizmap_web_client_target_version')
+                self._cfg_plugin_version = sjson.get('metadata', {}).get('lizmap_plugin_version_str')
                 for key in self.layers_table.keys():
                     if key in sjson:
                         self.layers_table[key]['jsonConfig'] = sjson[key]
@@ -1209,16 +1323,18 @@ class Lizmap:
                         manager.truncate()
 
                         if key == 'layouts':
+                            # Layouts from the project are merged, always loaded
                             manager.load_qgis_layouts(sjson.get(key, {}))
                             continue
 
+                        # Tables are loaded when their panel is displayed
                         if key in sjson:
-                            manager.from_json(sjson[key])
+                            self._pending_tables[key] = (sjson[key], True)
                         else:
                             # get a subset of the data to give to the table form
                             data = {k: json_options[k] for k in json_options if k.startswith(manager.definitions.key())}
                             if data:
-                                manager.from_json(data)
+                                self._pending_tables[key] = (data, False)
 
             except Exception as e:
                 if self.is_dev_version:
@@ -1305,10 +1421,9 @@ class Lizmap:
             if item.get('widget'):
                 if item['wType'] == 'layers':
                     if key in json_options:
-                        for lyr in self.project.mapLayers().values():
-                            if lyr.id() == json_options[key]:
-                                item['widget'].setLayer(lyr)
-                                break
+                        lyr = self.get_qgis_layer_by_id(json_options[key])
+                        if lyr:
+                            item['widget'].setLayer(lyr)
 
         # Then set field combobox
         for key, item in self.global_options.items():
@@ -1357,21 +1472,117 @@ class Lizmap:
                 variables['lizmap_user_groups'] = list()
             self.project.setCustomVariables(variables)
 
-        self.layerList = dict()
+        if self.layer_tree_reusable():
+            # Nothing changed since the last time, the tree has been kept in sync with the QGIS layer tree
+            data = self._json_layers
+            self.dlg.layer_tree.setCurrentIndex(QModelIndex())
+            self.enable_check_box(False)
+        else:
+            self.layerList = dict()
 
-        # Get embedded groups
-        self.embeddedGroups = None
+            # Get embedded groups
+            self.embeddedGroups = None
 
-        # Fill the layer tree
-        data = self.populate_layer_tree()
+            # Fill the layer tree
+            data = self.populate_layer_tree(json_layers)
 
         # Fill base-layer startup
         self.on_baselayer_checkbox_change()
         self.set_startup_baselayer_from_config()
 
+        # The dialog might be opened on a panel with a table
+        self.load_tables_in_panel(self.dlg.mOptionsStackedWidget.currentIndex())
+
         # The return is used in tests
         return data
 
+    def load_tables_in_panel(self, index: int):
+        """ Load the tables displayed in a panel, if they are not loaded yet. """
+        if not self._pending_tables:
+            return
+
+        page = self.dlg.mOptionsStackedWidget.widget(index)
+        if page is None:
+            return
+
+        for key in list(self._pending_tables.keys()):
+            if page.isAncestorOf(self.layers_table[key]['tableWidget']):
+                self.load_pending_table(key)
+
+    def load_pending_table(self, key: str):
+        """ Load a table from the CFG file, if it is not loaded yet. """
+        pending = self._pending_tables.pop(key, None)
+        if pending is None:
+            return
+
+        LOGGER.debug("Loading the table '{}' from the CFG file".format(key))
+        manager = self.layers_table[key]['manager']
+        # noinspection PyBroadException
+        try:
+            manager.from_json(pending[0])
+        except Exception as e:
+            if self.is_dev_version:
+                raise
+            LOGGER.critical(e)
+            manager.truncate()
+            json_file = self.dlg.cfg_file()
+            copyfile(json_file, '{}.back'.format(json_file))
+            message = tr(
+                'Errors encountered while reading the table "{}" from the CFG file. '
+                'Please re-configure this table completely. '
+                'The previous .cfg has been saved as .cfg.back').format(key)
+            QMessageBox.critical(
+                self.dlg, tr('Lizmap Error'), message, QMessageBox.Ok)
+            self.log(message, abort=True, textarea=self.dlg.outLog)
+            LOGGER.critical('Error while reading the table "{}" from the CFG file'.format(key))
+
+    def pending_table_json(self, key: str) -> Optional[dict]:
+        """ The section of a table not loaded yet, to write it unchanged in the CFG file.
+
+        None if the table must be loaded : the section was in the legacy format, the target version or the plugin
+        version is not the one of the CFG file, a layer used in the section is not valid in the project anymore or a layer has been renamed
+        while the section is keyed by layer names.
+        """
+        pending = self._pending_tables.get(key)
+        if pending is None:
+            return None
+
+        data, is_section = pending
+        if not is_section:
+            return None
+
+        target = int(format_version_integer('{}.0'.format(self.dlg.current_lwc_version().value)))
+        if target != self._cfg_target_version:
+            return None
+
+        if self._cfg_plugin_version != self.version:
+            # Written by another version of the plugin, the format of the table may have changed
+            return None
+
+        def layers_exist(value) -> bool:
+            if isinstance(value, dict):
+                for k, v in value.items():
+                    if k in ('layerId', 'layer') and isinstance(v, str):
+                        layer = self.get_qgis_layer_by_id(v)
+                        if not layer or not layer.isValid():
+                            return False
+                    elif not layers_exist(v):
+                        return False
+            elif isinstance(value, list):
+                return all(layers_exist(v) for v in value)
+            return True
+
+        if not layers_exist(data):
+            return None
+
+        if self.layers_table[key]['manager'].keyed_by_layer_name():
+            for name, value in data.items():
+                if isinstance(value, dict) and isinstance(value.get('layerId'), str):
+                    if self.get_qgis_layer_by_id(value['layerId']).name() != name:
+                        return None
+
+        return copy.deepcopy(data)
+
     def load_config_into_table_widget(self, key):
         """Load data from lizmap config file into the widget.
 
@@ -1420,11 +1631,10 @@ class Lizmap:
                 data = list(json_config.items())
 
             # load content from json file
-            project_layers_ids = list(self.project.mapLayers().keys())
             for k, v in data:
                 # check if the layer still exists in the QGIS project
                 if 'layerId' in list(v.keys()):
-                    if v['layerId'] not in project_layers_ids:
+                    if v['layerId'] not in self.layer_index:
                         continue
                 tw_row_count = widget.rowCount()
                 # add a new line
@@ -1435,11 +1645,10 @@ class Lizmap:
                     # add layer name column - get name from layer if possible (if the user has renamed the layer)
                     icon = None
                     if 'layerId' in list(v.keys()):
-                        layer = self.project.mapLayer(v['layerId'])
-                        if layer:
-                            k = layer.name()
-                            # noinspection PyArgumentList
-                            icon = QgsMapLayerModel.iconForLayer(layer)
+                        metadata = self.layer_index.metadata(v['layerId'])
+                        if metadata:
+                            k = metadata.name
+                            icon = metadata.icon
 
                     new_item = QTableWidgetItem(k)
                     if icon:
@@ -1467,10 +1676,7 @@ class Lizmap:
 
     def get_qgis_layer_by_id(self, my_id) -> Optional[QgsMapLayer]:
         """Get a QgsLayer by its ID"""
-        for layer in self.project.mapLayers().values():
-            if my_id == layer.id():
-                return layer
-        return None
+        return self.layer_index.layer(my_id)
 
     def set_initial_extent_from_project(self):
         """
@@ -1512,47 +1718,71 @@ class Lizmap:
         Remove a layer from the list of layers
         for which to have the "locate by layer" tool
         """
-        tw = self.layers_table[key]['tableWidget']
-        tw.removeRow(tw.currentRow())
+        manager = self.layers_table[key].get('manager')
+        if manager:
+            row = manager.current_row()
+            if row >= 0:
+                manager.model.remove_row(row)
+        else:
+            tw = self.layers_table[key]['tableWidget']
+            tw.removeRow(tw.currentRow())
         LOGGER.info('Removing one row in table "{}"'.format(key))
 
-    def remove_layer_from_table_by_layer_ids(self, layer_ids):
+    def remove_layer_from_table_by_layer_ids(self, layer_ids: List[str]):
         """
         Remove layers from tables when deleted from layer registry
+
+        All layers removed together are given at once, the dialog is not repainted until all tables are updated.
         """
-        if not self.dlg.check_cfg_file_exists():
+        if self._dlg is None:
+            # Tables are not loaded yet
             return
 
-        for key, item in self.layers_table.items():
+        if not self.dlg.check_cfg_file_exists():
+            return
 
-            manager = self.layers_table[key].get('manager')
-            if manager:
-                manager.layers_has_been_deleted(layer_ids)
-                continue
+        layer_ids = set(layer_ids)
+        self.dlg.setUpdatesEnabled(False)
+        try:
+            for key, item in self.layers_table.items():
 
-            tw = self.layers_table[key]['tableWidget']
+                manager = self.layers_table[key].get('manager')
+                if manager:
+                    manager.layers_has_been_deleted(layer_ids)
+                    continue
+
+                # Get index of layerId column
+                if 'layerId' not in self.layers_table[key]['cols']:
+                    continue
+                idx = self.layers_table[key]['cols'].index('layerId') + 1
+
+                # Remove layer if layerId match, from the last row to keep the index of previous rows
+                tw = self.layers_table[key]['tableWidget']
+                for row in reversed(range(tw.rowCount())):
+                    if tw.item(row, idx) and tw.item(row, idx).text() in layer_ids:
+                        tw.removeRow(row)
+        finally:
+            self.dlg.setUpdatesEnabled(True)
 
-            # Count lines
-            tw_row_count = tw.rowCount()
-            if not tw_row_count:
-                continue
+        LOGGER.info('{} layer(s) removed from the project'.format(len(layer_ids)))
 
-            # Get index of layerId column
-            if 'layerId' not in self.layers_table[key]['cols']:
-                continue
-            idx = self.layers_table[key]['cols'].index('layerId') + 1
+    def layout_added(self, name: str):
+        """ When a layout has been added in the project. """
+        if self._dlg is None:
+            # The table will be loaded with the current layouts
+            return
 
-            # Remove layer if layerId match
-            for row in range(tw_row_count):
-                if tw.item(row, idx):
-                    item_layer_id = str(tw.item(row, idx).text())
-                    if item_layer_id in layer_ids:
-                        tw.removeRow(row)
+        if not self.dlg.check_cfg_file_exists():
+            return
 
-        LOGGER.info('Layer ID "{}" has been removed from the project'.format(layer_ids))
+        self.layers_table['layouts']['manager'].layout_added(name)
 
     def layout_renamed(self, layout, new_name: str):
         """ When a layout has been renamed in the project. """
+        if self._dlg is None:
+            # The table will be loaded with the current layouts
+            return
+
         if not self.dlg.check_cfg_file_exists():
             return
 
@@ -1560,6 +1790,9 @@ class Lizmap:
 
     def layout_removed(self, name: str):
         """ When a layout has been removed from the project. """
+        if self._dlg is None:
+            return
+
         if not self.dlg.check_cfg_file_exists():
             return
 
@@ -1637,10 +1870,8 @@ class Lizmap:
         # Type : group or layer
         self.myDic[item_key]['type'] = item_type
 
-        # DEFAULT VALUES : generic default values for layers and group
+        # DEFAULT VALUES : generic default values for layers and group, they are shared by all nodes
         self.myDic[item_key]['name'] = item_key
-        for key, item in self.layer_options_list.items():
-            self.myDic[item_key][key] = item['default']
         self.myDic[item_key]['title'] = self.myDic[item_key]['name']
 
         if item_type == 'group':
@@ -1694,120 +1925,243 @@ class Lizmap:
             json_key = self.myDic[item_key]['name']
             LOGGER.info('Reading configuration from dictionary for layer {}'.format(json_key))
             # loop through layer options to override
-            for key, item in self.layer_options_list.items():
-                # override only for ui widgets
-                if item.get('widget'):
-                    if key in json_layers[json_key]:
-
-                        if key == 'legend_image_option' and 'noLegendImage' in json_layers[json_key]:
-                            if self.myDic[item_key].get('legend_image_option'):
-                                # The key is already set before with noLegendImage
-                                LOGGER.info(
-                                    "Skip key legend_image_option because it has been set previously with noLegendImage"
-                                )
-                                continue
-
-                        # checkboxes
-                        if item['wType'] == 'checkbox':
-                            self.myDic[item_key][key] = to_bool(json_layers[json_key][key], False)
-                        # spin box
-                        elif item['wType'] == 'spinbox':
-                            if json_layers[json_key][key] != '':
-                                self.myDic[item_key][key] = json_layers[json_key][key]
-                        # text inputs
-                        elif item['wType'] in ('text', 'textarea'):
-                            if json_layers[json_key][key] != '':
-                                if item.get('isMetadata'):  # title and abstract
-                                    if not keep_metadata:
-                                        self.myDic[item_key][key] = json_layers[json_key][key]
-                                else:
-                                    self.myDic[item_key][key] = json_layers[json_key][key]
-                        # lists
-                        elif item['wType'] == 'list':
-                            # New way with data, label, tooltip and icon
-                            datas = [j[0] for j in item['list']]
-                            if json_layers[json_key][key] in datas:
-                                self.myDic[item_key][key] = json_layers[json_key][key]
-
-                else:
-                    if key == 'noLegendImage' and 'noLegendImage' in json_layers.get(json_key):
-                        tmp = 'hide_at_startup'  # Default value
-                        if to_bool(json_layers[json_key].get('noLegendImage')):
-                            tmp = 'disabled'
-                        self.myDic[item_key]['legend_image_option'] = tmp
+            node = self.myDic[item_key]
+            layer_config = json_layers[json_key]
+            for _, read in self.option_serializers.layer_readers():
+                read(node, layer_config, keep_metadata)
 
-                    # LOGGER.info('Skip key {} because no UI widget'.format(key))
+    @staticmethod
+    def layer_tree_node_info(child) -> Tuple[QgsLayerTreeNode, str, str]:
+        """ The casted node, the ID and the type of a node in the QGIS layer tree. """
+        if QgsLayerTree.isGroup(child):
+            if not isinstance(child, QgsLayerTreeGroup):
+                # Sip cast issue
+                # https://github.com/3liz/lizmap-plugin/issues/299
+                # noinspection PyTypeChecker
+                child = sip.cast(child, QgsLayerTreeGroup)
+            return child, child.name(), 'group'
+        elif QgsLayerTree.isLayer(child):
+            if not isinstance(child, QgsLayerTreeLayer):
+                # Sip cast issue
+                # https://github.com/3liz/lizmap-plugin/issues/299
+                # noinspection PyTypeChecker
+                child = sip.cast(child, QgsLayerTreeLayer)
+            return child, child.layerId(), 'layer'
+        else:
+            raise Exception('Unknown child type')
 
-                # popupContent
-                if key == 'popupTemplate':
-                    if key in json_layers[json_key]:
-                        self.myDic[item_key][key] = json_layers[json_key][key]
+    def create_layer_tree_node(self, child_id: str, child_type: str, json_layers: dict) -> LayerTreeNode:
+        """ Add the node of a layer or a group in the dictionary, not yet in the tree. """
+        node = LayerTreeNode(child_id, child_type, self.layer_tree_defaults)
+        self.myDic[child_id] = node
+        self.set_tree_item_data(child_type, child_id, json_layers)
+        return node
 
-    def process_node(self, node, parent_node, json_layers):
+    def process_node(self, node, parent_node: Optional[LayerTreeNode], json_layers):
         """
         Process a single node of the QGIS layer tree and adds it to Lizmap layer tree.
         """
+        model = self.dlg.layer_tree.model()
         for child in node.children():
-            if QgsLayerTree.isGroup(child):
-                if not isinstance(child, QgsLayerTreeGroup):
-                    # Sip cast issue
-                    # https://github.com/3liz/lizmap-plugin/issues/299
-                    # noinspection PyTypeChecker
-                    child = sip.cast(child, QgsLayerTreeGroup)
-                child_id = child.name()
-                child_type = 'group'
-                # noinspection PyCallByClass,PyArgumentList
-                child_icon = QIcon(QgsApplication.iconPath('mActionFolder.svg'))
-            elif QgsLayerTree.isLayer(child):
-                if not isinstance(child, QgsLayerTreeLayer):
-                    # Sip cast issue
-                    # https://github.com/3liz/lizmap-plugin/issues/299
-                    # noinspection PyTypeChecker
-                    child = sip.cast(child, QgsLayerTreeLayer)
-                child_id = child.layerId()
-                child_type = 'layer'
-                # noinspection PyArgumentList
-                child_icon = QgsMapLayerModel.iconForLayer(child.layer())
-            else:
-                raise Exception('Unknown child type')
+            child, child_id, child_type = self.layer_tree_node_info(child)
 
-            # Select an existing item, select the header item or create the item
+            # Select an existing node, select the root node or create the node
             if child_id in self.myDic:
-                # If the item already exists in self.myDic, select it
-                item = self.myDic[child_id]['item']
+                # If the node already exists in self.myDic, select it
+                tree_node = self.myDic[child_id]
             elif child_id == '':
-                # If the id is empty string, this is a root layer, select the headerItem
-                item = self.dlg.layer_tree.headerItem()
+                # If the id is empty string, this is a root layer, select the root node
+                tree_node = None
             else:
-                # else create the item and add it to the header item
-                # add the item to the dictionary
-                self.myDic[child_id] = {'id': child_id}
+                # else create the node and add it to its parent node
+                tree_node = self.create_layer_tree_node(child_id, child_type, json_layers)
+                model.append_node(parent_node, tree_node)
+
+            if child_type == 'group':
+                self.process_node(child, tree_node, json_layers)
+
+    def current_layer_tree_node(self) -> Optional[LayerTreeNode]:
+        """ The selected node in the layer tree. """
+        return self.dlg.layer_tree.model().node(self.dlg.layer_tree.currentIndex())
+
+    def layer_tree_cfg_signature(self) -> Optional[Tuple[str, int]]:
+        """ Path and modification time of the CFG file, used to know if the layer tree must be read again. """
+        json_file = self.dlg.cfg_file()
+        if not json_file.exists():
+            return None
+        return str(json_file), json_file.stat().st_mtime_ns
+
+    def layer_tree_reusable(self) -> bool:
+        """ If the Lizmap layer tree built previously is still valid.
+
+        The tree is kept in sync with the QGIS layer tree, but it must be built again if the CFG file has changed or
+        if some values have been edited without being saved.
+        """
+        if not self._layer_tree_synced or self._layer_tree_edited or self.myDic is None:
+            return False
+        return self._layer_tree_cfg_signature == self.layer_tree_cfg_signature()
+
+    def layer_tree_parent_node(self, node) -> Tuple[bool, Optional[LayerTreeNode]]:
+        """ The Lizmap node matching a group of the QGIS layer tree, None for the root.
+
+        The first value is False if the group is unknown.
+        """
+        if node is None or node.parent() is None:
+            return True, None
+        _, node_id, _ = self.layer_tree_node_info(node)
+        if node_id not in self.myDic:
+            return False, None
+        return True, self.myDic[node_id]
+
+    def layer_tree_sync_group(self, node, parent_node: Optional[LayerTreeNode]):
+        """ Make the children of a Lizmap node match the children of the QGIS group.
+
+        Existing nodes are moved if needed, only new QGIS nodes get a new Lizmap node.
+        """
+        model = self.dlg.layer_tree.model()
+        if parent_node is None:
+            parent_node = model.root
+
+        index = 0
+        for child in node.children():
+            child, child_id, child_type = self.layer_tree_node_info(child)
+            if child_id == '':
+                continue
+
+            new_node = child_id not in self.myDic
+            if new_node:
+                tree_node = self.create_layer_tree_node(child_id, child_type, self._json_layers)
                 if child_type == 'group':
-                    # it is a group
-                    self.set_tree_item_data('group', child_id, json_layers)
-                else:
-                    # it is a layer
-                    self.set_tree_item_data('layer', child_id, json_layers)
-
-                item = QTreeWidgetItem(
-                    [
-                        str(self.myDic[child_id]['name']),
-                        str(self.myDic[child_id]['id']),
-                        self.myDic[child_id]['type']
-                    ]
-                )
-                item.setToolTip(0, self.myDic[child_id]['name'])
-                item.setIcon(0, child_icon)
-                self.myDic[child_id]['item'] = item
+                    self.layer_tree_sync_group(child, tree_node)
+            else:
+                tree_node = self.myDic[child_id]
+
+                # Same name as an ancestor group, like in process_node, the node is not moved
+                ancestor = parent_node
+                while ancestor is not None and ancestor is not tree_node:
+                    ancestor = ancestor.parent
+                if ancestor is tree_node:
+                    continue
+
+                if tree_node.parent is parent_node and tree_node.row == index:
+                    # Already at the right place
+                    index += 1
+                    continue
+
+                model.take_node(tree_node)
+
+            model.insert_node(parent_node, index, tree_node)
+            index += 1
+
+            if new_node:
+                # Like expandAll in populate_layer_tree
+                pending = [tree_node]
+                while pending:
+                    current = pending.pop()
+                    self.dlg.layer_tree.expand(model.node_index(current))
+                    pending.extend(current.children)
+
+    def layer_tree_node_ids(self, node) -> List[Tuple[str, str]]:
+        """ IDs and types of a node and of all its descendants. """
+        node, node_id, node_type = self.layer_tree_node_info(node)
+        ids = [(node_id, node_type)]
+        if node_type == 'group':
+            for child in node.children():
+                ids.extend(self.layer_tree_node_ids(child))
+        return ids
+
+    def layer_tree_added_children(self, node, index_from: int, index_to: int):
+        """ Nodes have been added in the QGIS layer tree. """
+        _ = index_from, index_to
+        if not self._layer_tree_synced:
+            return
+        known, parent_node = self.layer_tree_parent_node(node)
+        if known:
+            self.layer_tree_sync_group(node, parent_node)
 
-                # Move group or layer to its parent node
-                if not parent_node:
-                    self.dlg.layer_tree.addTopLevelItem(item)
-                else:
-                    parent_node.addChild(item)
+    def layer_tree_will_remove_children(self, node, index_from: int, index_to: int):
+        """ Nodes are going to be removed from the QGIS layer tree. """
+        if not self._layer_tree_synced:
+            return
+        for child in node.children()[index_from:index_to + 1]:
+            self._removed_tree_ids.extend(self.layer_tree_node_ids(child))
 
-            if child_type == 'group':
-                self.process_node(child, item, json_layers)
+    def layer_tree_removed_children(self, node, index_from: int, index_to: int):
+        """ Nodes have been removed from the QGIS layer tree.
+
+        Items are removed only if they are not in the QGIS layer tree anymore, a drag&drop is adding the node
+        before removing the previous one.
+        """
+        _ = node, index_from, index_to
+        if not self._layer_tree_synced:
+            return
+        removed = self._removed_tree_ids
+        self._removed_tree_ids = []
+        root = self.project.layerTreeRoot()
+        for node_id, node_type in removed:
+            if node_id not in self.myDic:
+                continue
+            if node_type == 'group' and root.findGroup(node_id):
+                continue
+            if node_type == 'layer' and root.findLayer(node_id):
+                continue
+            self.dlg.layer_tree.model().take_node(self.myDic.pop(node_id))
+
+    def layer_changed(self, layer_id: str):
+        """ A QGIS layer has changed, its serialisation and the tables using it must be computed again. """
+        node = self.myDic.get(layer_id) if self.myDic else None
+        if node is not None:
+            node.config = None
+            node.icon = None
+
+        if self._dlg is None:
+            return
+
+        if node is not None:
+            self.dlg.layer_tree_model.node_changed(node)
+
+        for values in self.layers_table.values():
+            manager = values.get('manager')
+            if manager:
+                manager.layer_changed(layer_id)
+
+    def layer_tree_name_changed(self, node, name: str):
+        """ A node has been renamed in the QGIS layer tree. """
+        if not self._layer_tree_synced or self.myDic is None:
+            return
+
+        node, node_id, node_type = self.layer_tree_node_info(node)
+        if node_type == 'layer':
+            entry = self.myDic.get(node_id)
+        else:
+            # The ID of a group is its name, the previous name is the only Lizmap group of the parent which is not
+            # a QGIS group of the parent anymore
+            parent = node.parent()
+            if parent is None:
+                return
+            known, parent_node = self.layer_tree_parent_node(parent)
+            if not known:
+                return
+            if parent_node is None:
+                parent_node = self.dlg.layer_tree.model().root
+            groups = {c.name() for c in parent.children() if QgsLayerTree.isGroup(c)}
+            previous = [c for c in parent_node.children if c.type == 'group' and c.id not in groups]
+            if len(previous) != 1:
+                return
+            entry = previous[0]
+            if entry.id not in self.myDic or name in self.myDic:
+                return
+            del self.myDic[entry.id]
+            entry.id = name
+            self.myDic[name] = entry
+
+        if not entry:
+            return
+
+        if entry['title'] == entry['name']:
+            entry['title'] = name
+        entry['name'] = name
+        self.dlg.layer_tree.model().node_changed(entry)
 
     def read_lizmap_config_file(self) -> dict:
         """ Read the CFG file and returns the JSON content. """
@@ -1832,17 +2186,20 @@ class Lizmap:
             self.log(message, abort=True, textarea=self.dlg.outLog)
             return {}
 
-    def populate_layer_tree(self) -> dict:
+    def populate_layer_tree(self, json_layers: Optional[dict] = None) -> dict:
         """Populate the layer tree of the Layers tab from QGIS legend interface.
 
+        The layers from the CFG file can be given if the file has already been read.
+
         Needs to be refactored.
         """
         self.dlg.block_signals_address(True)
 
-        self.dlg.layer_tree.clear()
+        self.dlg.layer_tree.model().clear()
         self.myDic = {}
 
-        json_layers = self.read_lizmap_config_file()
+        if json_layers is None:
+            json_layers = self.read_lizmap_config_file()
         root = self.project.layerTreeRoot()
 
         # Recursively process layer tree nodes
@@ -1852,6 +2209,12 @@ class Lizmap:
         # Add the self.myDic to the global layerList dictionary
         self.layerList = self.myDic
 
+        # From now, the tree follows the QGIS layer tree
+        self._json_layers = json_layers
+        self._layer_tree_synced = True
+        self._layer_tree_edited = False
+        self._layer_tree_cfg_signature = self.layer_tree_cfg_signature()
+
         self.dlg.block_signals_address(False)
         self.enable_check_box(False)
 
@@ -1861,13 +2224,14 @@ class Lizmap:
     def from_data_to_ui_for_layer_group(self):
         """ Restore layer/group values into each field when selecting a layer in the tree. """
         # get the selected item
-        item = self.dlg.layer_tree.currentItem()
+        item = self.current_layer_tree_node()
         if item:
             self.enable_check_box(True)
         else:
             self.enable_check_box(False)
+            return
 
-        i_key = item.text(1)
+        i_key = item.id
         if i_key in self.layerList:
             # get information about the layer or the group from the layerList dictionary
             selected_item = self.layerList[i_key]
@@ -2041,32 +2405,38 @@ class Lizmap:
         data = [item.strip() for item in data]
         return data
 
+    def layer_tree_edited(self):
+        """ Some values of the layer tree have been edited, and are not saved yet. """
+        self._layer_tree_edited = True
+        self._layer_tree_edits += 1
+
     def save_value_layer_group_data(self, key: str):
         """ Save the new value from the UI in the global layer property self.layerList.
 
         Function called the corresponding UI widget has sent changed signal.
         """
         key = str(key)
+        self.layer_tree_edited()
         # get the selected item in the layer tree
-        item = self.dlg.layer_tree.currentItem()
+        item = self.current_layer_tree_node()
         # get the definition for this property
         layer_option = self.layer_options_list[key]
         # modify the property for the selected item
-        if item and item.text(1) in self.layerList:
+        if item and item.id in self.layerList:
             if layer_option['wType'] == 'text':
                 text = layer_option['widget'].text()
                 if layer_option['type'] == 'list':
                     text = self.string_to_list(text)
-                self.layerList[item.text(1)][key] = text
+                self.layerList[item.id][key] = text
                 self.set_layer_metadata(item, key)
             elif layer_option['wType'] == 'textarea':
-                self.layerList[item.text(1)][key] = layer_option['widget'].toPlainText()
+                self.layerList[item.id][key] = layer_option['widget'].toPlainText()
                 self.set_layer_metadata(item, key)
             elif layer_option['wType'] == 'spinbox':
-                self.layerList[item.text(1)][key] = layer_option['widget'].value()
+                self.layerList[item.id][key] = layer_option['widget'].value()
             elif layer_option['wType'] == 'checkbox':
                 checked = layer_option['widget'].isChecked()
-                self.layerList[item.text(1)][key] = checked
+                self.layerList[item.id][key] = checked
                 children = layer_option.get('children')
                 if children:
                     exclusive = layer_option.get('exclusive', False)
@@ -2081,7 +2451,7 @@ class Lizmap:
             elif layer_option['wType'] == 'list':
                 # New way with data, label, tooltip and icon
                 datas = [j[0] for j in layer_option['list']]
-                self.layerList[item.text(1)][key] = datas[layer_option['widget'].currentIndex()]
+                self.layerList[item.id][key] = datas[layer_option['widget'].currentIndex()]
 
             # Deactivate the "exclude" widget if necessary
             if 'exclude' in layer_option \
@@ -2089,28 +2459,29 @@ class Lizmap:
                     and layer_option['widget'].isChecked() \
                     and layer_option['exclude']['widget'].isChecked():
                 layer_option['exclude']['widget'].setChecked(False)
-                self.layerList[item.text(1)][layer_option['exclude']['key']] = False
+                self.layerList[item.id][layer_option['exclude']['key']] = False
 
     def set_layer_metadata(self, item, key):
         """Set the title/abstract/link QGIS metadata when corresponding item is changed
         Used in setLayerProperty"""
         if 'isMetadata' in self.layer_options_list[key]:
             # modify the layer.title|abstract|link() if possible
-            if self.layerList[item.text(1)]['type'] == 'layer':
-                layer = self.get_qgis_layer_by_id(item.text(1))
+            if self.layerList[item.id]['type'] == 'layer':
+                layer = self.get_qgis_layer_by_id(item.id)
                 if isinstance(layer, QgsMapLayer):
                     if key == 'title':
-                        layer.setTitle(self.layerList[item.text(1)][key])
+                        layer.setTitle(self.layerList[item.id][key])
                     if key == 'abstract':
-                        layer.setAbstract(self.layerList[item.text(1)][key])
+                        layer.setAbstract(self.layerList[item.id][key])
 
     def convert_html_maptip(self):
         """ Trying to convert a Lizmap popup to HTML popup. """
-        item = self.dlg.layer_tree.currentItem()
-        if item and item.text(1) in self.layerList:
-            if 'popupTemplate' in self.layerList[item.text(1)]:
-                self.layerList[item.text(1)]['popup'] = True
-                text = self.layerList[item.text(1)]['popupTemplate']
+        item = self.current_layer_tree_node()
+        if item and item.id in self.layerList:
+            if 'popupTemplate' in self.layerList[item.id]:
+                self.layer_tree_edited()
+                self.layerList[item.id]['popup'] = True
+                text = self.layerList[item.id]['popupTemplate']
 
                 layer = self._current_selected_layer()
                 html, errors = convert_lizmap_popup(text, layer)
@@ -2132,21 +2503,21 @@ class Lizmap:
     def configure_html_popup(self):
         """Open the dialog with a text field to store the popup template for one layer/group"""
         # get the selected item in the layer tree
-        item = self.dlg.layer_tree.currentItem()
+        item = self.current_layer_tree_node()
         if not item:
             return
 
-        if not item.text(1) in self.layerList:
+        if item.id not in self.layerList:
             return
 
         # do nothing if no popup configured for this layer/group
-        if not to_bool(self.layerList[item.text(1)]['popup']):
+        if not to_bool(self.layerList[item.id]['popup']):
             return
 
         # Set the content of the QTextEdit if needed
-        if 'popupTemplate' in self.layerList[item.text(1)]:
-            self.layerList[item.text(1)]['popup'] = True
-            text = self.layerList[item.text(1)]['popupTemplate']
+        if 'popupTemplate' in self.layerList[item.id]:
+            self.layerList[item.id]['popup'] = True
+            text = self.layerList[item.id]['popupTemplate']
         else:
             text = ''
 
@@ -2160,6 +2531,7 @@ class Lizmap:
             if isinstance(layer, QgsVectorLayer):
                 LOGGER.warning("The 'lizmap' popup is deprecated for vector layer. This will be removed soon.")
 
+            from lizmap.dialogs.lizmap_popup import LizmapPopupDialog
             popup_dialog = LizmapPopupDialog(text)
             if not popup_dialog.exec_():
                 return
@@ -2167,16 +2539,18 @@ class Lizmap:
             content = popup_dialog.txtPopup.text()
 
             # Get the selected item in the layer tree
-            item = self.dlg.layer_tree.currentItem()
-            if item and item.text(1) in self.layerList:
+            item = self.current_layer_tree_node()
+            if item and item.id in self.layerList:
                 # Write the content into the global object
-                self.layerList[item.text(1)]['popupTemplate'] = content
+                self.layer_tree_edited()
+                self.layerList[item.id]['popupTemplate'] = content
                 if isinstance(layer, QgsVectorLayer):
                     LOGGER.warning("The 'lizmap' popup is deprecated for vector layer. This will be removed soon.")
 
         else:
             # QGIS HTML maptip
             layer: QgsVectorLayer
+            from lizmap.dialogs.html_editor import HtmlEditorDialog
             html_editor = HtmlEditorDialog()
             html_editor.set_layer(layer)
             html_editor.editor.set_html_content(layer.mapTipTemplate())
@@ -2187,18 +2561,17 @@ class Lizmap:
 
     def _current_selected_layer(self) -> Optional[QgsMapLayer]:
         """ Current selected map layer in the tree. """
-        item = self.dlg.layer_tree.currentItem()
-        if item and item.text(1) in self.layerList:
-            lid = item.text(1)
-            layers = [layer for layer in self.project.mapLayers().values() if layer.id() == lid]
-            if not layers:
+        item = self.current_layer_tree_node()
+        if item and item.id in self.layerList:
+            lid = item.id
+            layer = self.get_qgis_layer_by_id(lid)
+            if not layer:
                 LOGGER.warning('Layers not found with searched text from the tree : {}'.format(lid))
                 return
         else:
             LOGGER.warning('No item selected in the Lizmap layer tree.')
             return
 
-        layer = layers[0]
         return layer
 
     def link_from_properties(self):
@@ -2279,28 +2652,94 @@ class Lizmap:
 
         root = config.invisibleRootContainer()
         relation_manager = self.project.relationManager()
+        from lizmap.tooltip import Tooltip
+
         html_content = Tooltip.create_popup_node_item_from_form(layer, root, 0, [], '', relation_manager)
         html_content = Tooltip.create_popup(html_content)
         html_content += Tooltip.css()
         self._set_maptip(layer, html_content)
 
-    def write_project_config_file(self, lwc_version: LwcVersions, with_gui: bool = True):
-        """ Write a Lizmap configuration to the file. """
-        liz2json = self.project_config_file(lwc_version, with_gui)
-        json_file_content = json.dumps(
-            liz2json,
-            sort_keys=False,
-            indent=4
-        )
-        json_file_content += '\n'
+    def write_project_config_file(self, lwc_version: LwcVersions, with_gui: bool = True, callback=None):
+        """ Write a Lizmap configuration to the file.
 
-        # Get the project data
+        The options are collected from the dialog, then the JSON is dumped and written in a background task if
+        there is a GUI. The callback is called with the success and an error message.
+        """
+        edits = self._layer_tree_edits
+        liz2json = self.project_config_file(lwc_version, with_gui)
         json_file = self.dlg.cfg_file()
-        with open(json_file, 'w', encoding='utf8') as cfg_file:
-            cfg_file.write(json_file_content)
+        content = []
+
+        written_file = []
+
+        def dump() -> None:
+            content.append(cfg_file_content(liz2json))
+
+        def write() -> None:
+            # The file is not touched if it did not change, Lizmap Web Client keeps its cache
+            written_file.append(write_file_if_changed(str(json_file), content[0]))
+
+        def written(success: bool, error: Optional[str]):
+            if success:
+                if self._layer_tree_synced:
+                    # The layer tree in memory is now the one in the file
+                    self._json_layers = liz2json['layers']
+                    if self._layer_tree_edits == edits:
+                        # Not edited while the task was running, otherwise the next save must serialise it again
+                        self._layer_tree_edited = False
+                    self._layer_tree_cfg_signature = self.layer_tree_cfg_signature()
+
+                if written_file[0]:
+                    LOGGER.info('The CFG file has been written to "{}"'.format(json_file))
+                else:
+                    LOGGER.info('The CFG file "{}" did not change, it has not been written'.format(json_file))
+                self.clean_project()
 
-        LOGGER.info('The CFG file has been written to "{}"'.format(json_file))
-        self.clean_project()
+            if callback:
+                callback(success, error)
+
+        stages = [
+            (tr('Serialising the configuration'), dump),
+            (tr('Writing the CFG file'), write),
+        ]
+        self.run_save_task(tr('Saving the Lizmap configuration'), stages, with_gui, written)
+
+    def run_save_task(self, description: str, stages: list, with_gui: bool, callback):
+        """ Run the stages of a save in a QGIS task, or synchronously without GUI.
+
+        The callback is called in the GUI thread, with the success and an error message.
+        """
+        task = SaveTask(description, stages)
+        if not with_gui:
+            callback(task.run(), task.error)
+            return
+
+        def finished(success: bool):
+            self.save_task = None
+            self.save_task_id = None
+            self.dlg.show_save_progress(False)
+            error = task.error
+            if not success and not error:
+                error = tr('Saving has been canceled.')
+            callback(success, error)
+
+        self.save_task = task
+        self.dlg.show_save_progress(True)
+        self.dlg.save_progress.setFormat('{} %p%'.format(description))
+        task.taskCompleted.connect(lambda: finished(True))
+        task.taskTerminated.connect(lambda: finished(False))
+        # noinspection PyArgumentList
+        self.save_task_id = QgsApplication.taskManager().addTask(task)
+
+    def save_task_progress(self, task_id: int, progress: float):
+        """ Display the progress of the save running in the background. """
+        if self.save_task_id is not None and task_id == self.save_task_id:
+            self.dlg.save_progress.setValue(int(progress))
+
+    def cancel_save_task(self):
+        """ Cancel the save running in the background. """
+        if self.save_task:
+            self.save_task.cancel()
 
     def project_config_file(self, lwc_version: LwcVersions, with_gui: bool = True, check_server=True) -> Dict:
         """ Generate the CFG file with all options. """
@@ -2357,6 +2796,7 @@ class Lizmap:
 
                 message += tr(
                     "The process is continuing but expect some layers to not be visible in Lizmap Web Client.")
+                from lizmap.dialogs.scroll_message_box import ScrollMessageBox
                 ScrollMessageBox(self.dlg, QMessageBox.Warning, tr('Lizmap.com hosting'), message)
 
         metadata = {
@@ -2396,79 +2836,23 @@ class Lizmap:
             self.set_initial_extent_from_project()
 
         # gui user defined options
-        for key, item in self.global_options.items():
-            if item.get('widget'):
-                input_value = None
-                # Get field value depending on widget type
-                if item['wType'] == 'text':
-                    input_value = item['widget'].text().strip(' \t')
-
-                if item['wType'] == 'wysiwyg':
-                    input_value = item['widget'].html_content().strip(' \t')
-
-                if item['wType'] == 'textarea':
-                    input_value = item['widget'].toPlainText().strip(' \t')
-
-                if item['wType'] == 'spinbox':
-                    input_value = item['widget'].value()
-
-                if item['wType'] == 'checkbox':
-                    input_value = str(item['widget'].isChecked())
-
-                if item['wType'] == 'list':
-                    input_value = item['widget'].currentData()
-
-                if item['wType'] == 'layers':
-                    lay = item['widget'].layer(item['widget'].currentIndex())
-                    input_value = lay.id()
-
-                if item['wType'] == 'fields':
-                    input_value = item['widget'].currentField()
-
-                # Cast value depending of data type
-                if item['type'] == 'string':
-                    if item['wType'] in ('text', 'textarea'):
-                        input_value = str(input_value)
-                    else:
-                        input_value = str(input_value)
-
-                elif item['type'] in ('intlist', 'floatlist', 'list'):
-                    if item['type'] == 'intlist':
-                        input_value = [int(a) for a in input_value.split(', ') if a.isdigit()]
-                    elif item['type'] == 'floatlist':
-                        input_value = [float(a) for a in input_value.split(', ')]
-                    else:
-                        input_value = [a.strip() for a in input_value.split(',') if a.strip()]
-
-                elif item['type'] == 'integer':
-                    # noinspection PyBroadException
-                    try:
-                        input_value = int(input_value)
-                    except Exception:
-                        input_value = int(item['default'])
-
-                elif item['type'] == 'boolean':
-                    input_value = item['widget'].isChecked()
-                    if not item.get('use_proper_boolean'):
-                        input_value = str(input_value)
-
-                # Add value to the option
-                if item['type'] == 'boolean':
-                    if not to_bool(input_value):
-                        if not item.get('always_export'):
-                            continue
-
-                if item['type'] in ('list', 'string'):
-                    if not input_value:
-                        # Empty list or string
-                        if not item.get('always_export'):
-                            continue
-
-                liz2json["options"][key] = input_value
+        for key, read, export in self.option_serializers.global_writers(lwc_version):
+            widget = self.global_options[key].get('widget')
+            if widget:
+                input_value = read(widget)
+                if export(input_value):
+                    liz2json["options"][key] = input_value
 
         for key in self.layers_table.keys():
             manager = self.layers_table[key].get('manager')
             if manager:
+                data = self.pending_table_json(key)
+                if data is not None:
+                    # The table has not been displayed, the section is written back as it was read
+                    liz2json[key] = data
+                    continue
+
+                self.load_pending_table(key)
                 data = manager.to_json()
 
                 if key == 'layouts':
@@ -2484,7 +2868,7 @@ class Lizmap:
                         LOGGER.info("Skipping the 'layout' table because version if less than LWC 3.7")
                         continue
 
-                if manager.use_single_row() and manager.table.rowCount() == 1:
+                if manager.use_single_row() and manager.model.rowCount() == 1:
                     liz2json['options'].update(data)
                 else:
                     liz2json[key] = data
@@ -2513,178 +2897,177 @@ class Lizmap:
                 }
 
         # gui user defined layers options
+        extent_resolver = self.layer_extent_resolver()
+        # Layers which did not change since the previous serialisation are not read again
+        cache_key = (lwc_version, with_gui, extent_resolver.strategy)
+        start = time.perf_counter()
+        serialised = 0
         for k, v in self.layerList.items():
-            layer = False
-            if v['groupAsLayer']:
-                layer_type = 'layer'
+            if v.config and v.config[0] == cache_key:
+                layer_options, messages = v.config[1], v.config[2]
             else:
-                layer_type = 'group'
-
-            if self.get_qgis_layer_by_id(k):
-                layer_type = 'layer'
-
-            # ~ # add layerOption only for geo layers
-            # ~ if geometryType != 4:
-            layer_options = dict()
-            layer_options["id"] = str(k)
-            layer_options["name"] = str(v['name'])
-            layer_options["type"] = layer_type
-
-            geometry_type = -1
-            if layer_type == 'layer':
-                layer = self.get_qgis_layer_by_id(k)
-                if layer and layer.type() == QgsMapLayer.VectorLayer:  # if it is a vector layer:
-                    geometry_type = layer.geometryType()
-
-            # geometry type
-            if geometry_type != -1:
-                layer_options["geometryType"] = self.mapQgisGeometryType[layer.geometryType()]
-
-            # extent
-            if layer:
-                extent = layer.extent()
-                layer_options['extent'] = [
-                    extent.xMinimum(), extent.yMinimum(), extent.xMaximum(), extent.yMaximum()]
-                layer_options['crs'] = layer.crs().authid()
-
-            # styles
-            if isinstance(layer, QgsMapLayer):
-                ls = layer.styleManager().styles()
-                if len(ls) > 1:
-                    layer_options['styles'] = ls
-
-            # Loop through the layer options and set properties from the dictionary
-            for key, val in self.layer_options_list.items():
-                property_value = v[key]
-                if val['type'] == 'string':
-                    if val['wType'] in ('text', 'textarea'):
-                        property_value = str(property_value)
-                    elif val['wType'] == 'list' and isinstance(property_value, tuple):
-                        # Process later, do not cast for now
-                        pass
-                    else:
-                        property_value = str(property_value)
-                elif val['type'] == 'integer':
-                    # noinspection PyBroadException
-                    try:
-                        property_value = int(property_value)
-                    except Exception:
-                        property_value = 1
-                elif val['type'] == 'boolean':
-                    if not val.get('use_proper_boolean'):
-                        property_value = str(property_value)
-
-                if key in ('legend_image_option', 'noLegendImage'):
-                    if layer_options.get('legend_image_option') and key == 'noLegendImage':
-                        # Let's skip, the key is already saved
-                        continue
+                layer_options, messages = self.layer_config(k, v, lwc_version, with_gui, extent_resolver)
+                v.config = (cache_key, layer_options, messages)
+                serialised += 1
 
-                    if layer_options.get('noLegendImage') and key == 'legend_image_option':
-                        # Let's skip, the key is already saved
-                        continue
+            for title, message in messages:
+                QMessageBox.warning(self.dlg, title, message, QMessageBox.Ok)
 
-                    max_version = val.get('max_version')
-                    if max_version and lwc_version > max_version:
-                        LOGGER.info("Skipping key '{}' because of max_version.".format(key))
-                        continue
+            # Add layer options to the json object
+            liz2json["layers"][v['name']] = dict(layer_options)
 
-                    min_version = val.get('min_version')
-                    if min_version and lwc_version < min_version:
-                        LOGGER.info("Skipping key '{}' because of min_version.".format(key))
-                        continue
+        if serialised:
+            LOGGER.info("{} layer(s) or group(s) serialised in {:.1f} ms".format(
+                serialised, (time.perf_counter() - start) * 1000))
 
-                    if key == 'noLegendImage':
-                        # We take the value of legend_image_option
-                        property_value = str(False)
-                        if v['legend_image_option'] == 'disabled':
-                            property_value = str(True)
-                        if v['legend_image_option'] == 'expand_at_startup' and with_gui:
-                            # We keep False
-                            QMessageBox.warning(
-                                self.dlg,
-                                tr('Legend image'),
-                                tr(
-                                    'Be careful, the option "Expand at startup" for the layer "{layer_name}" is not '
-                                    'available for your Lizmap Web Client target version {target}.'
-                                ).format(layer_name=k, target=lwc_version.value)
-                                + '\n\n'
-                                + tr('Falling back to "Hide at startup" in the configuration file.')
-                                + '\n\n'
-                                + tr('This option is only available for Lizmap Web Client 3.6 and above.')
-                            )
-
-                    if isinstance(property_value, tuple):
-                        property_value = property_value[0]
-
-                    # LOGGER.info("Saving {} = {} for layer {}".format(key, property_value, k))
-
-                layer_options[key] = property_value
-
-            # Cache Metatile: unset metatileSize if empty
-            # this is to avoid, but LWC must change accordingly to avoid using empty metatileSize
-            # (2.2.0 does not handle it)
-
-            # unset metatileSize
-            meta_tile_size = layer_options.get('metatileSize')
-            if meta_tile_size is not None and isinstance(meta_tile_size, str) and not re.match(r'\d,\d', meta_tile_size):
-                del layer_options['metatileSize']
-
-            # unset cacheExpiration if False
-            cached = layer_options.get('cached')
-            if cached and not to_bool(cached):
-                del layer_options['cacheExpiration']
-
-            # unset clientCacheExpiration if not needed
-            client_cache = layer_options.get('clientCacheExpiration')
-            if client_cache and client_cache < 0:
-                del layer_options['clientCacheExpiration']
-
-            # unset externalWms if False
-            external_wms = layer_options.get('externalWmsToggle')
-            if external_wms and not to_bool(external_wms):
-                del layer_options['externalWmsToggle']
-
-            # unset source project and repository if needed
-            source_repository = layer_options.get('sourceRepository')
-            source_project = layer_options.get('sourceProject')
-            if not source_repository or not source_project:
-                del layer_options['sourceRepository']
-                del layer_options['sourceProject']
-
-            # set popupSource to auto if set to lizmap and no lizmap conf found
-            if to_bool(layer_options['popup']) and layer_options['popupSource'] == 'lizmap' \
-                    and layer_options['popupTemplate'] == '':
-                layer_options['popupSource'] = 'auto'
-
-            if layer_options.get("geometryType") in ('point', 'line', 'polygon'):
-                if layer_options.get('popupSource') == 'lizmap' and to_bool(layer_options.get('popup')):
-                    QMessageBox.warning(
-                        self.dlg,
-                        tr('Deprecated feature'),
-                        tr(
-                            'The layer "{}" is vector layer and the popup is a "Lizmap HTML". This kind of popup is '
-                            'deprecated for vector layer, you should switch to another kind of popup, for instance to '
-                            'a "QGIS HTML maptip". This will be removed in a future version of Lizmap.'
-                        ).format(layer_options["name"]),
-                        QMessageBox.Ok
-                    )
+        if extent_resolver.cache:
+            extent_resolver.cache.save()
 
-            # Add external WMS options if needed
-            if isinstance(layer, QgsMapLayer) and to_bool(layer_options.get('externalWmsToggle', False)):
-                # Only for layers stored in disk
-                if layer.providerType() == 'wms':
-                    wms_params = get_layer_wms_parameters(layer)
-                    if wms_params:
-                        layer_options['externalAccess'] = wms_params
-                    else:
-                        layer_options['externalWmsToggle'] = str(False)
+        return liz2json
+
+    def layer_config(
+            self, k: str, v: LayerTreeNode, lwc_version: LwcVersions, with_gui: bool,
+            extent_resolver: LayerExtentResolver) -> Tuple[dict, list]:
+        """ Options of a layer or a group in the CFG file, with the warnings to display to the user. """
+        layer = False
+        messages = []
+        if v['groupAsLayer']:
+            layer_type = 'layer'
+        else:
+            layer_type = 'group'
+
+        qgis_layer = self.get_qgis_layer_by_id(k)
+        if qgis_layer:
+            layer_type = 'layer'
+
+        # ~ # add layerOption only for geo layers
+        # ~ if geometryType != 4:
+        layer_options = dict()
+        layer_options["id"] = str(k)
+        layer_options["name"] = str(v['name'])
+        layer_options["type"] = layer_type
+
+        geometry_type = -1
+        if layer_type == 'layer':
+            layer = qgis_layer
+            if layer and layer.type() == QgsMapLayer.VectorLayer:  # if it is a vector layer:
+                geometry_type = layer.geometryType()
+
+        # geometry type
+        if geometry_type != -1:
+            layer_options["geometryType"] = self.mapQgisGeometryType[layer.geometryType()]
+
+        # extent
+        if layer:
+            layer_options['extent'] = extent_resolver.extent(layer)
+            layer_options['crs'] = layer.crs().authid()
+
+        # styles
+        if isinstance(layer, QgsMapLayer):
+            ls = layer.styleManager().styles()
+            if len(ls) > 1:
+                layer_options['styles'] = ls
+
+        # Loop through the layer options and set properties from the dictionary
+        for key, write in self.option_serializers.layer_writers(lwc_version):
+            layer_options[key] = write(v)
+
+        if 'noLegendImage' in layer_options and v['legend_image_option'] == 'expand_at_startup' and with_gui:
+            # We keep False
+            messages.append((
+                tr('Legend image'),
+                tr(
+                    'Be careful, the option "Expand at startup" for the layer "{layer_name}" is not '
+                    'available for your Lizmap Web Client target version {target}.'
+                ).format(layer_name=k, target=lwc_version.value)
+                + '\n\n'
+                + tr('Falling back to "Hide at startup" in the configuration file.')
+                + '\n\n'
+                + tr('This option is only available for Lizmap Web Client 3.6 and above.')
+            ))
+
+        # Cache Metatile: unset metatileSize if empty
+        # this is to avoid, but LWC must change accordingly to avoid using empty metatileSize
+        # (2.2.0 does not handle it)
+
+        # unset metatileSize
+        meta_tile_size = layer_options.get('metatileSize')
+        if meta_tile_size is not None and isinstance(meta_tile_size, str) and not re.match(r'\d,\d', meta_tile_size):
+            del layer_options['metatileSize']
+
+        # unset cacheExpiration if False
+        cached = layer_options.get('cached')
+        if cached and not to_bool(cached):
+            del layer_options['cacheExpiration']
+
+        # unset clientCacheExpiration if not needed
+        client_cache = layer_options.get('clientCacheExpiration')
+        if client_cache and client_cache < 0:
+            del layer_options['clientCacheExpiration']
+
+        # unset externalWms if False
+        external_wms = layer_options.get('externalWmsToggle')
+        if external_wms and not to_bool(external_wms):
+            del layer_options['externalWmsToggle']
+
+        # unset source project and repository if needed
+        source_repository = layer_options.get('sourceRepository')
+        source_project = layer_options.get('sourceProject')
+        if not source_repository or not source_project:
+            del layer_options['sourceRepository']
+            del layer_options['sourceProject']
+
+        # set popupSource to auto if set to lizmap and no lizmap conf found
+        if to_bool(layer_options['popup']) and layer_options['popupSource'] == 'lizmap' \
+                and layer_options['popupTemplate'] == '':
+            layer_options['popupSource'] = 'auto'
+
+        if layer_options.get("geometryType") in ('point', 'line', 'polygon'):
+            if layer_options.get('popupSource') == 'lizmap' and to_bool(layer_options.get('popup')):
+                messages.append((
+                    tr('Deprecated feature'),
+                    tr(
+                        'The layer "{}" is vector layer and the popup is a "Lizmap HTML". This kind of popup is '
+                        'deprecated for vector layer, you should switch to another kind of popup, for instance to '
+                        'a "QGIS HTML maptip". This will be removed in a future version of Lizmap.'
+                    ).format(layer_options["name"]),
+                ))
+
+        # Add external WMS options if needed
+        if isinstance(layer, QgsMapLayer) and to_bool(layer_options.get('externalWmsToggle', False)):
+            # Only for layers stored in disk
+            if layer.providerType() == 'wms':
+                wms_params = get_layer_wms_parameters(layer)
+                if wms_params:
+                    layer_options['externalAccess'] = wms_params
                 else:
                     layer_options['externalWmsToggle'] = str(False)
+            else:
+                layer_options['externalWmsToggle'] = str(False)
 
-            # Add layer options to the json object
-            liz2json["layers"][v['name']] = layer_options
+        return layer_options, messages
 
-        return liz2json
+    def layer_extent_resolver(self) -> LayerExtentResolver:
+        """ Resolver of layer extents, according to the user settings.
+
+        The strategy is read from the "lizmap/extent_strategy" setting : "project", "estimated" or "exact".
+        Estimated extents are cached. Exact extents are cached only if the "lizmap/extent_cache" setting is set,
+        extents of layers in a database may then be out of date for an hour.
+        """
+        strategy = ExtentStrategy.find(QgsSettings().value('lizmap/extent_strategy', ExtentStrategy.Exact.value))
+        if strategy is None:
+            strategy = ExtentStrategy.Exact
+
+        xml_layers = None
+        if strategy != ExtentStrategy.Exact and self.project.fileName():
+            xml_layers = read_layers_metadata(self.project.fileName())
+
+        cache = None
+        if strategy == ExtentStrategy.Estimated or (
+                strategy == ExtentStrategy.Exact and to_bool(QgsSettings().value('lizmap/extent_cache', False))):
+            cache = ExtentCache(str(lizmap_user_folder().joinpath('extent_cache.json')))
+
+        return LayerExtentResolver(strategy, cache, xml_layers)
 
     def clean_project(self):
         """Clean a little the QGIS project.
@@ -2810,12 +3193,10 @@ class Lizmap:
         return True, ''
 
     def ok_button_clicked(self):
-        """When the OK button is press, we 'apply' and close the dialog."""
+        """When the OK button is press, we 'apply' and close the dialog, once the save is finished."""
+        self._close_after_save = True
         if not self.save_cfg_file():
-            return
-
-        # Only close the dialog if no error
-        self.dlg.close()
+            self._close_after_save = False
 
     def save_cfg_file(
             self,
@@ -2895,6 +3276,7 @@ class Lizmap:
                     lwc_version.value)
             )
             # Set shortnames if it's not set
+            from lizmap.ogc_project_validity import OgcProjectValidity
             ogc_projet_validity = OgcProjectValidity(self.project)
             ogc_projet_validity.add_shortnames()
             ogc_projet_validity.set_project_short_name()
@@ -2955,7 +3337,15 @@ class Lizmap:
                 self.project.writeEntry('WMSCrsList', '', crs_list[0])
 
         # write data in the lizmap json config file
-        self.write_project_config_file(lwc_version, with_gui)
+        self.write_project_config_file(
+            lwc_version, with_gui, partial(self.cfg_file_written, save_project, with_gui))
+        return True
+
+    def cfg_file_written(self, save_project: Optional[bool], with_gui: bool, success: bool, error: Optional[str]):
+        """ Save the project and send files to the FTP, once the CFG file has been written. """
+        if not success:
+            self.save_cfg_file_finished(False, error)
+            return
 
         self.log(
             tr('All the map parameters are correctly set'),
@@ -2989,29 +3379,53 @@ class Lizmap:
                     duration=30
                 )
 
-        if auto_save and self.dlg.checkbox_ftp_transfer.isChecked():
-            valid, message = self.server_ftp.connect(send_files=True)
-            if not valid:
-                # noinspection PyUnresolvedReferences
-                self.iface.messageBar().pushMessage(
-                    'Lizmap',
-                    message,
-                    level=Qgis.Critical,
-                )
-                return False
+        if not (auto_save and self.dlg.checkbox_ftp_transfer.isChecked()):
+            self.save_cfg_file_finished(True, msg)
+            return
 
-            msg = tr(
+        project_file = self.project.fileName()
+
+        def upload() -> Optional[str]:
+            valid, message = self.server_ftp.connect(send_files=True, project_file=project_file)
+            return None if valid else message
+
+        def sent(ftp_success: bool, ftp_error: Optional[str]):
+            if not ftp_success:
+                self.save_cfg_file_finished(False, ftp_error)
+                return
+
+            self.save_cfg_file_finished(True, tr(
                 'Lizmap configuration file has been updated and sent to the FTP {}.'
-            ).format(self.server_ftp.host)
+            ).format(self.server_ftp.host))
+
+        stages = [(tr('Sending files to the FTP'), upload)]
+        self.run_save_task(tr('Sending files to the FTP'), stages, with_gui, sent)
+
+    def save_cfg_file_finished(self, success: bool, message: Optional[str]):
+        """ End of the save, close the dialog if it was requested by the OK button. """
+        close_dialog = self._close_after_save
+        self._close_after_save = False
+
+        if not success:
+            # noinspection PyUnresolvedReferences
+            self.iface.messageBar().pushMessage(
+                'Lizmap',
+                message,
+                level=Qgis.Critical,
+            )
+            return
 
         # noinspection PyUnresolvedReferences
         self.iface.messageBar().pushMessage(
             'Lizmap',
-            msg,
+            message,
             level=Qgis.Success,
             duration=3
         )
-        return True
+
+        if close_dialog:
+            # Only close the dialog if no error
+            self.dlg.close()
 
     def check_visibility_crs_3857(self):
         """ Check if we display the warning about scales. """
@@ -3101,10 +3515,19 @@ class Lizmap:
         for key in self.layers_table.keys():
             self.layers_table[key]['jsonConfig'] = dict()
 
+    def project_cleared(self):
+        """ When the project is cleared, also when a project is going to be read. """
+        self._layer_tree_synced = False
+        self._json_layers = {}
+        self._removed_tree_ids = []
+
     def on_project_read(self):
         """
         Close Lizmap plugin when project is opened
         """
+        self._layer_tree_synced = False
+        if self._dlg is None:
+            return
         self.reinit_default_properties()
         self.dlg.close()
 
@@ -3138,6 +3561,8 @@ class Lizmap:
             self.dlg.label_atlasprint_plugin.setVisible(False)
             self.dlg.label_qgis_server_plugins.setVisible(False)
 
+        from lizmap.version_checker import VersionChecker
+
         self.version_checker = VersionChecker(self.dlg, VERSION_URL)
         self.version_checker.fetch()
 
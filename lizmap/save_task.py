@@ -0,0 +1,52 @@
+__copyright__ = 'Copyright 2023, 3Liz'
+__license__ = 'GPL version 3'
+__email__ = 'info@3liz.org'
+
+import logging
+
+from typing import Callable, List, Optional, Tuple
+
+from qgis.core import QgsTask
+
+from lizmap.qgis_plugin_tools.tools.resources import plugin_name
+
+LOGGER = logging.getLogger(plugin_name())
+
+
+class SaveTask(QgsTask):
+
+    """ Run the stages of the save which do not need the GUI, outside of the GUI thread.
+
+    A stage is a label and a function without argument, returning None or an error message. Stages must not use
+    widgets nor the project, the values they need are collected before by the GUI thread.
+    """
+
+    def __init__(self, description: str, stages: List[Tuple[str, Callable[[], Optional[str]]]]):
+        """ Constructor. """
+        super().__init__(description, QgsTask.CanCancel)
+        self.stages = stages
+        self.stage = None
+        self.error = None
+
+    def run(self) -> bool:
+        """ Run all stages, stop on the first error or if the task is canceled. """
+        for i, (label, function) in enumerate(self.stages):
+            if self.isCanceled():
+                LOGGER.info("Saving has been canceled before the stage '{}'".format(label))
+                return False
+
+            self.stage = label
+            self.setProgress(i * 100 / len(self.stages))
+            # noinspection PyBroadException
+            try:
+                error = function()
+            except Exception as e:
+                error = str(e)
+
+            if error:
+                LOGGER.critical("Error while saving, stage '{}' : {}".format(label, error))
+                self.error = error
+                return False
+
+        self.setProgress(100)
+        return True
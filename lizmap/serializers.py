@@ -0,0 +1,277 @@
+__copyright__ = 'Copyright 2023, 3Liz'
+__license__ = 'GPL version 3'
+__email__ = 'info@3liz.org'
+
+import logging
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from lizmap.definitions.definitions import LwcVersions
+from lizmap.qgis_plugin_tools.tools.resources import plugin_name
+from lizmap.tools import to_bool
+
+LOGGER = logging.getLogger(plugin_name())
+
+# Key and the function returning the value of this key from a node of the layer tree
+LayerWriter = Tuple[str, Callable[[Any], Any]]
+# Key and the function setting the value of this key in a node, from the layer configuration in the CFG file
+LayerReader = Tuple[str, Callable[[Any, dict, bool], None]]
+# Key, the function returning the value from the widget and the function telling if this value must be exported
+GlobalWriter = Tuple[str, Callable[[Any], Any], Callable[[Any], bool]]
+
+
+def is_available(key: str, definition: dict, lwc_version: LwcVersions) -> bool:
+    """ If the option can be written in the CFG file for this version of Lizmap Web Client. """
+    max_version = definition.get('max_version')
+    if max_version and lwc_version > max_version:
+        LOGGER.info("Skipping key '{}' because of max_version.".format(key))
+        return False
+
+    min_version = definition.get('min_version')
+    if min_version and lwc_version < min_version:
+        LOGGER.info("Skipping key '{}' because of min_version.".format(key))
+        return False
+
+    return True
+
+
+class OptionSerializers:
+
+    """ Serialisers of the layer and global options, compiled from their definitions.
+
+    The definitions from `LizmapConfig` are read the first time a version of Lizmap Web Client is used, to make a
+    list of small functions. Saving a layer or the global options is then a loop over these functions, without
+    checking again the widget type, the data type or the versions of each option.
+    """
+
+    def __init__(self, global_definitions: Dict[str, dict], layer_definitions: Dict[str, dict]):
+        """ Constructor.
+
+        Widgets must be set in the definitions before, only options with a widget are read from the CFG file.
+        """
+        self.global_definitions = global_definitions
+        self.layer_definitions = layer_definitions
+        self._layer_writers: Dict[LwcVersions, List[LayerWriter]] = {}
+        self._global_writers: Dict[LwcVersions, List[GlobalWriter]] = {}
+        self._layer_readers: Optional[List[LayerReader]] = None
+
+    def layer_writers(self, lwc_version: LwcVersions) -> List[LayerWriter]:
+        """ Functions returning the options of a layer or a group, for the CFG file. """
+        writers = self._layer_writers.get(lwc_version)
+        if writers is None:
+            writers = [
+                (key, self._layer_writer(key, definition))
+                for key, definition in self.layer_definitions.items()
+                if is_available(key, definition, lwc_version)
+            ]
+            self._layer_writers[lwc_version] = writers
+        return writers
+
+    def global_writers(self, lwc_version: LwcVersions) -> List[GlobalWriter]:
+        """ Functions returning the global options from the widgets, for the CFG file. """
+        writers = self._global_writers.get(lwc_version)
+        if writers is None:
+            writers = [
+                (key, self._global_reader(definition), self._global_export(definition))
+                for key, definition in self.global_definitions.items()
+                # The metadata is not an option edited with a widget
+                if 'wType' in definition and 'type' in definition and is_available(key, definition, lwc_version)
+            ]
+            self._global_writers[lwc_version] = writers
+        return writers
+
+    def layer_readers(self) -> List[LayerReader]:
+        """ Functions setting the options of a node from the CFG file. """
+        if self._layer_readers is None:
+            self._layer_readers = []
+            for key, definition in self.layer_definitions.items():
+                reader = self._layer_reader(key, definition)
+                if reader:
+                    self._layer_readers.append((key, reader))
+        return self._layer_readers
+
+    @staticmethod
+    def _layer_writer(key: str, definition: dict) -> Callable[[Any], Any]:
+        """ Compile the function returning the value of an option for a node. """
+        if key == 'noLegendImage':
+            # We take the value of legend_image_option
+            return lambda node: str(node['legend_image_option'] == 'disabled')
+
+        option_type = definition['type']
+        if option_type == 'string':
+            if definition['wType'] == 'list':
+                # Tuples are processed later, do not cast for now
+                def cast(value):
+                    return value if isinstance(value, tuple) else str(value)
+            else:
+                cast = str
+
+        elif option_type == 'integer':
+            def cast(value):
+                # noinspection PyBroadException
+                try:
+                    return int(value)
+                except Exception:
+                    return 1
+
+        elif option_type == 'boolean' and not definition.get('use_proper_boolean'):
+            cast = str
+
+        else:
+            return lambda node: node[key]
+
+        if key == 'legend_image_option':
+            def cast_legend(value):
+                value = cast(value)
+                if isinstance(value, tuple):
+                    value = value[0]
+                return value
+            return lambda node: cast_legend(node[key])
+
+        return lambda node: cast(node[key])
+
+    @staticmethod
+    def _layer_reader(key: str, definition: dict) -> Optional[Callable[[Any, dict, bool], None]]:
+        """ Compile the function setting an option of a node from the CFG file, if the option is read. """
+        if not definition.get('widget'):
+            if key == 'noLegendImage':
+                def read_legacy_legend(node, config: dict, keep_metadata: bool):
+                    _ = keep_metadata
+                    if key in config:
+                        node['legend_image_option'] = 'disabled' if to_bool(config[key]) else 'hide_at_startup'
+                return read_legacy_legend
+
+            if key == 'popupTemplate':
+                def read_template(node, config: dict, keep_metadata: bool):
+                    _ = keep_metadata
+                    if key in config:
+                        node[key] = config[key]
+                return read_template
+
+            return None
+
+        widget_type = definition['wType']
+        if widget_type == 'checkbox':
+            def read(node, value, keep_metadata: bool):
+                _ = keep_metadata
+                node[key] = to_bool(value, False)
+
+        elif widget_type == 'spinbox':
+            def read(node, value, keep_metadata: bool):
+                _ = keep_metadata
+                if value != '':
+                    node[key] = value
+
+        elif widget_type in ('text', 'textarea'):
+            is_metadata = definition.get('isMetadata')
+
+            def read(node, value, keep_metadata: bool):
+                # Title and abstract from the layer properties are kept
+                if value != '' and not (is_metadata and keep_metadata):
+                    node[key] = value
+
+        elif widget_type == 'list':
+            # New way with data, label, tooltip and icon
+            data = [item[0] for item in definition['list']]
+
+            def read(node, value, keep_metadata: bool):
+                _ = keep_metadata
+                if value in data:
+                    node[key] = value
+
+        else:
+            return None
+
+        if key == 'legend_image_option':
+            def read_legend(node, config: dict, keep_metadata: bool):
+                if key not in config:
+                    return
+                if 'noLegendImage' in config and node.get(key):
+                    # The key is already set before with noLegendImage
+                    return
+                read(node, config[key], keep_metadata)
+            return read_legend
+
+        def read_option(node, config: dict, keep_metadata: bool):
+            if key in config:
+                read(node, config[key], keep_metadata)
+        return read_option
+
+    @staticmethod
+    def _global_reader(definition: dict) -> Callable[[Any], Any]:
+        """ Compile the function returning the value of a global option from its widget. """
+        option_type = definition['type']
+        widget_type = definition['wType']
+        if option_type == 'boolean':
+            if definition.get('use_proper_boolean'):
+                return lambda widget: widget.isChecked()
+            return lambda widget: str(widget.isChecked())
+
+        if widget_type == 'text':
+            def read(widget):
+                return widget.text().strip(' \t')
+        elif widget_type == 'wysiwyg':
+            def read(widget):
+                return widget.html_content().strip(' \t')
+        elif widget_type == 'textarea':
+            def read(widget):
+                return widget.toPlainText().strip(' \t')
+        elif widget_type == 'spinbox':
+            def read(widget):
+                return widget.value()
+        elif widget_type == 'checkbox':
+            def read(widget):
+                return str(widget.isChecked())
+        elif widget_type == 'list':
+            def read(widget):
+                return widget.currentData()
+        elif widget_type == 'layers':
+            def read(widget):
+                return widget.layer(widget.currentIndex()).id()
+        elif widget_type == 'fields':
+            def read(widget):
+                return widget.currentField()
+        else:
+            def read(widget):
+                _ = widget
+                return None
+
+        if option_type == 'string':
+            return lambda widget: str(read(widget))
+
+        if option_type == 'intlist':
+            return lambda widget: [int(a) for a in read(widget).split(', ') if a.isdigit()]
+
+        if option_type == 'floatlist':
+            return lambda widget: [float(a) for a in read(widget).split(', ')]
+
+        if option_type == 'list':
+            return lambda widget: [a.strip() for a in read(widget).split(',') if a.strip()]
+
+        if option_type == 'integer':
+            default = int(definition['default'])
+
+            def read_integer(widget):
+                # noinspection PyBroadException
+                try:
+                    return int(read(widget))
+                except Exception:
+                    return default
+            return read_integer
+
+        return read
+
+    @staticmethod
+    def _global_export(definition: dict) -> Callable[[Any], bool]:
+        """ Compile the function telling if the value of a global option is written in the CFG file. """
+        if definition.get('always_export'):
+            return lambda value: True
+
+        if definition['type'] == 'boolean':
+            return to_bool
+
+        if definition['type'] in ('list', 'string'):
+            # Empty list or string
+            return bool
+
+        return lambda value: True
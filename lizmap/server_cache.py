@@ -0,0 +1,220 @@
+__copyright__ = 'Copyright 2023, 3Liz'
+__license__ = 'GPL version 3'
+__email__ = 'info@3liz.org'
+
+import json
+import logging
+import os
+import time
+
+from pathlib import Path
+from typing import Dict, Optional
+
+LOGGER = logging.getLogger('Lizmap')
+
+# Metadata older than this number of days are not used anymore
+MAX_DAYS = 7
+
+# Seconds during which the metadata is used without asking the server, if the server doesn't give a max-age
+DEFAULT_MAX_AGE = 3600
+
+
+def parse_cache_control(value: str) -> Dict[str, Optional[str]]:
+    """ Directives of a Cache-Control header, in lower case, with their value if any. """
+    directives = {}
+    for directive in value.split(','):
+        name, _, argument = directive.strip().partition('=')
+        if not name:
+            continue
+        directives[name.strip().lower()] = argument.strip().strip('"') if argument else None
+    return directives
+
+
+def _seconds(value: Optional[str], default: int) -> int:
+    """ Number of seconds of a directive, the default value if it's not a number. """
+    if value is None or not value.isdigit():
+        return default
+    return int(value)
+
+
+class CacheEntry:
+
+    """ Metadata of a server, with the HTTP validators and the freshness lifetime given by the server.
+
+    The URL and the authentication ID of the server are kept, the metadata depends on both.
+    """
+
+    __slots__ = (
+        'content', 'url', 'auth_id', 'etag', 'last_modified', 'date', 'max_age', 'stale_while_revalidate')
+
+    def __init__(
+            self, content: dict, date: float, url: Optional[str] = None, auth_id: Optional[str] = None,
+            etag: str = '', last_modified: str = '', max_age: int = 0,
+            stale_while_revalidate: int = MAX_DAYS * 86400):
+        self.content = content
+        self.url = url
+        self.auth_id = auth_id
+        self.date = date
+        self.etag = etag
+        self.last_modified = last_modified
+        self.max_age = max_age
+        self.stale_while_revalidate = stale_while_revalidate
+
+    def is_for(self, url: str, auth_id: str) -> bool:
+        """ If the metadata has been fetched from this URL, with this authentication ID.
+
+        Metadata saved by a previous version of the plugin does not have them, it's still used.
+        """
+        if self.url is not None and self.url != url:
+            return False
+        if self.auth_id is not None and self.auth_id != (auth_id or ''):
+            return False
+        return True
+
+    def age(self, now: float = None) -> float:
+        """ Seconds since the metadata has been fetched or validated by the server. """
+        return (time.time() if now is None else now) - self.date
+
+    def is_fresh(self, now: float = None) -> bool:
+        """ If the metadata can be used without asking the server. """
+        return self.age(now) < self.max_age
+
+    def is_usable(self, now: float = None) -> bool:
+        """ If the metadata can be displayed while the server is asked in the background. """
+        age = self.age(now)
+        return age < self.max_age + self.stale_while_revalidate and age < MAX_DAYS * 86400
+
+    def request_headers(self) -> Dict[str, str]:
+        """ Headers of a conditional request, the server answers "304 Not Modified" if the metadata is the same. """
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def update(self, headers: Dict[str, str], date: float):
+        """ Update the validators and the freshness lifetime from the headers of a response, in lower case. """
+        self.date = date
+        # A "304 Not Modified" may omit the validators, they are the same
+        self.etag = headers.get('etag', self.etag)
+        self.last_modified = headers.get('last-modified', self.last_modified)
+
+        cache_control = parse_cache_control(headers.get('cache-control', ''))
+        if 'no-cache' in cache_control or 'no-store' in cache_control:
+            # Always asking the server, but still displayed while waiting for the answer
+            self.max_age = 0
+        else:
+            self.max_age = _seconds(cache_control.get('max-age'), DEFAULT_MAX_AGE)
+        self.stale_while_revalidate = _seconds(cache_control.get('stale-while-revalidate'), MAX_DAYS * 86400)
+
+    def to_json(self) -> dict:
+        """ The HTTP metadata, without the content. """
+        return {
+            'url': self.url,
+            'auth_id': self.auth_id,
+            'date': self.date,
+            'etag': self.etag,
+            'last_modified': self.last_modified,
+            'max_age': self.max_age,
+            'stale_while_revalidate': self.stale_while_revalidate,
+        }
+
+
+class MetadataCache:
+
+    """ Cache of the metadata of each server, on disk.
+
+    The metadata is in a JSON file named from the server, the HTTP metadata is in a second file next to it. Files
+    are read once, then kept in memory.
+    """
+
+    def __init__(self, folder: Path):
+        self.folder = folder
+        self._entries: Dict[str, Optional[CacheEntry]] = {}
+
+    def file(self, name: str) -> Path:
+        """ The file of the metadata, according to a server name. """
+        return self.folder.joinpath('{}.json'.format(name.replace('/', '-')))
+
+    def http_file(self, name: str) -> Path:
+        """ The file of the HTTP metadata, according to a server name. """
+        return self.folder.joinpath('{}.http.json'.format(name.replace('/', '-')))
+
+    def entry(self, name: str, url: str, auth_id: str) -> Optional[CacheEntry]:
+        """ The metadata of a server, if it's in the cache for the same URL and authentication ID. """
+        entry = self._read(name)
+        if entry and not entry.is_for(url, auth_id):
+            LOGGER.info("Metadata in cache for server '{}' is for another URL or login".format(name))
+            return None
+        return entry
+
+    def _read(self, name: str) -> Optional[CacheEntry]:
+        """ The metadata of a server in the cache, read from the disk the first time. """
+        if name in self._entries:
+            return self._entries[name]
+
+        entry = None
+        cache_file = self.file(name)
+        if cache_file.exists():
+            # noinspection PyBroadException
+            try:
+                with open(cache_file, encoding='utf8') as f:
+                    entry = CacheEntry(json.load(f), os.stat(cache_file).st_mtime)
+
+                http_file = self.http_file(name)
+                if http_file.exists():
+                    with open(http_file, encoding='utf8') as f:
+                        for key, value in json.load(f).items():
+                            setattr(entry, key, value)
+            except Exception as e:
+                LOGGER.warning("Skipping the metadata in cache for server '{}' : {}".format(name, str(e)))
+                entry = None
+
+        self._entries[name] = entry
+        return entry
+
+    def store(
+            self, name: str, url: str, auth_id: str, content: dict, headers: Dict[str, str],
+            date: float = None) -> CacheEntry:
+        """ Save a new metadata fetched from the server, with the headers in lower case. """
+        entry = CacheEntry(content, 0, url, auth_id or '')
+        entry.update(headers, time.time() if date is None else date)
+        self._entries[name] = entry
+
+        json_file_content = json.dumps(content, sort_keys=False, indent=4)
+        json_file_content += '\n'
+        with open(self.file(name), 'w', encoding='utf8') as json_file:
+            json_file.write(json_file_content)
+
+        self._write_http(name, entry)
+        return entry
+
+    def revalidated(
+            self, name: str, url: str, auth_id: str, headers: Dict[str, str],
+            date: float = None) -> Optional[CacheEntry]:
+        """ The server answered "304 Not Modified", the metadata in cache is fresh again. """
+        entry = self.entry(name, url, auth_id)
+        if not entry:
+            return None
+
+        entry.url = url
+        entry.auth_id = auth_id or ''
+        entry.update(headers, time.time() if date is None else date)
+        # The metadata file must not be removed by the cleaning
+        os.utime(self.file(name))
+        self._write_http(name, entry)
+        return entry
+
+    def _write_http(self, name: str, entry: CacheEntry):
+        """ Save the HTTP metadata. """
+        with open(self.http_file(name), 'w', encoding='utf8') as json_file:
+            json_file.write(json.dumps(entry.to_json(), indent=4) + '\n')
+
+    def clean(self, force: bool = False):
+        """ Remove all files in the cache older than MAX_DAYS days. """
+        now = time.time()
+        for item in self.folder.glob('*'):
+            if force or os.stat(item).st_mtime < now - MAX_DAYS * 86400:
+                item.unlink()
+        self._entries.clear()
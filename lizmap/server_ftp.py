@@ -158,13 +158,16 @@ class FtpServer:
             self.dialog.checkbox_ftp_transfer.setEnabled(False)
             self.dialog.checkbox_ftp_transfer.setChecked(False)
 
-    def connect(self, send_files: bool = False) -> Tuple[bool, Optional[str]]:
-        """ Send the QGS and the CFG file over FTP. """
+    def connect(self, send_files: bool = False, project_file: str = None) -> Tuple[bool, Optional[str]]:
+        """ Send the QGS and the CFG file over FTP.
+
+        The project file can be given, when called outside of the GUI thread.
+        """
         if not self.is_ftp_available():
             return False, "The FTP is not installed."
 
         try:
-            self.with_tls(send_files)
+            self.with_tls(send_files, project_file)
         except socket.gaierror:
             return False, 'Host is not correct'
         except ConnectionResetError as e:
@@ -184,7 +187,10 @@ class FtpServer:
         LOGGER.info("Both QGS and CFG files have been send on {}".format(self.host))
         return True, None
 
-    def with_tls(self, send_files):
+    def with_tls(self, send_files, project_file: str = None):
+        if not project_file:
+            project_file = self.project.fileName()
+
         with FTP_TLS(self.host) as session:
             session.login(user=self.user, passwd=self.password)
             session.prot_p()
@@ -194,14 +200,14 @@ class FtpServer:
             if send_files:
                 session.set_pasv(True)
 
-                cfg_path = Path(self.project.fileName() + '.cfg')
+                cfg_path = Path(project_file + '.cfg')
                 # CFG file
                 with open(cfg_path, 'rb') as file:
                     session.storbinary(f'STOR {cfg_path.name}', file)
 
                 # QGS file
-                with open(self.project.fileName(), 'rb') as file:
-                    session.storbinary(f'STOR {Path(self.project.fileName()).name}', file)
+                with open(project_file, 'rb') as file:
+                    session.storbinary(f'STOR {Path(project_file).name}', file)
 
                 try:
                     session.close()
@@ -5,12 +5,11 @@ __email__ = 'info@3liz.org'
 import json
 import logging
 import os
-import time
 
 from enum import Enum
 from functools import partial
 from pathlib import Path
-from typing import List, Optional, Tuple, Union
+from typing import Dict, List, Optional, Tuple, Union
 
 from qgis.core import (
     Qgis,
@@ -20,7 +19,7 @@ from qgis.core import (
     QgsNetworkContentFetcher,
     QgsSettings,
 )
-from qgis.PyQt.QtCore import QPoint, Qt, QUrl, QVariant
+from qgis.PyQt.QtCore import QPoint, Qt, QTimer, QUrl, QVariant
 from qgis.PyQt.QtGui import (
     QColor,
     QCursor,
@@ -49,6 +48,7 @@ from lizmap.dialogs.server_wizard import NamePage, ServerWizard
 from lizmap.qgis_plugin_tools.tools.i18n import tr
 from lizmap.qgis_plugin_tools.tools.version import version
 from lizmap.saas import is_lizmap_dot_com_hosting
+from lizmap.server_cache import MetadataCache
 from lizmap.tools import lizmap_user_folder, qgis_version, to_bool
 
 LOGGER = logging.getLogger('Lizmap')
@@ -73,9 +73,6 @@ class Color(Enum):
     Normal = QColor("black")
 
 
-MAX_DAYS = 7
-
-
 class ServerManager:
     """ Fetch the Lizmap server version for a list of server. """
 
@@ -97,6 +94,7 @@ class ServerManager:
 
         # Network
         self.fetchers = {}
+        self.metadata_cache = MetadataCache(lizmap_user_folder().joinpath("cache_server_metadata"))
 
         # First new server
         self.add_first_server.setIcon(QIcon(QgsApplication.iconPath('symbologyAdd.svg')))
@@ -190,7 +188,7 @@ class ServerManager:
         self.down_button.clicked.connect(self.move_server_down)
 
         # Actions
-        self.clean_cache()
+        self.metadata_cache.clean()
         self.load_table()
         self.visible_new_server_button()
 
@@ -218,24 +216,6 @@ class ServerManager:
         LOGGER.info("Found password ID {}".format(auth_id))
         return conf
 
-    @classmethod
-    def clean_cache(cls, force=False):
-        """ Remove all files in the server cache directory older than X days. """
-        now = time.time()
-        cache_dir = lizmap_user_folder().joinpath("cache_server_metadata")
-        for item in cache_dir.glob('*'):
-            if os.stat(item).st_mtime < now - MAX_DAYS * 86400:
-                item.unlink()
-            elif force:
-                item.unlink()
-
-    @classmethod
-    def cache_file_for_name(cls, name: str) -> Path:
-        """ Return a cache file name according to a server name. """
-        name = name.replace('/', '-')
-        cache_file = lizmap_user_folder().joinpath("cache_server_metadata").joinpath('{}.json'.format(name))
-        return cache_file
-
     def check_validity_servers(self) -> bool:
         """ Check if all servers are valid with at least a login. """
         if self.table.rowCount() == 0:
@@ -313,7 +293,7 @@ class ServerManager:
 
         row = self.table.rowCount()
         self.table.setRowCount(row + 1)
-        self._edit_row(row, dialog.current_url(), dialog.auth_id, dialog.current_name())
+        self._edit_row(row, dialog.current_url(), dialog.auth_id, dialog.current_name(), force=True)
         self.save_table()
         self.refresh_server_combo()
 
@@ -355,7 +335,7 @@ class ServerManager:
         if result != QDialog.Accepted:
             return
 
-        self._edit_row(row, dialog.current_url(), dialog.auth_id, dialog.current_name())
+        self._edit_row(row, dialog.current_url(), dialog.auth_id, dialog.current_name(), force=True)
         self.save_table()
         self.refresh_server_combo()
 
@@ -394,8 +374,11 @@ class ServerManager:
         self.refresh_server_combo()
         self.parent.refresh_combo_repositories()
 
-    def _edit_row(self, row: int, server_url: str, auth_id: str, name: str):
-        """ Internal function to edit a row. """
+    def _edit_row(self, row: int, server_url: str, auth_id: str, name: str, force: bool = False):
+        """ Internal function to edit a row.
+
+        With force, the server is asked even if the metadata in cache is fresh, the login may have changed.
+        """
         login = tr('Unknown')
         conf = self.config_for_id(auth_id)
         if conf:
@@ -446,7 +429,7 @@ class ServerManager:
         self.table.setItem(row, TableCell.ActionText.value, cell)
 
         self.table.clearSelection()
-        self.fetch(server_url, auth_id, row)
+        self.fetch(server_url, auth_id, row, name, force)
 
     def move_server_up(self):
         """Move the selected server up."""
@@ -474,10 +457,10 @@ class ServerManager:
 
     def refresh_table(self):
         """ Refresh all rows with the server status. """
-        self.clean_cache(True)
         for row in range(self.table.rowCount()):
-            url, auth_id, _ = self._fetch_cells(row)
-            self.fetch(url, auth_id, row)
+            url, auth_id, name = self._fetch_cells(row)
+            # Metadata in cache are still sent as validators, the server tells if they changed
+            self.fetch(url, auth_id, row, name, force=True)
 
     @staticmethod
     def url_metadata(base_url: str) -> str:
@@ -497,9 +480,22 @@ class ServerManager:
         url = '{}admin.php/admin/server_information'.format(base_url)
         return url
 
-    def fetch(self, url: str, auth_id: str, row: int):
-        """ Fetch the JSON file and call the function when it's finished. """
-        self.display_action(row, False, tr('Fetching…'))
+    def fetch(self, url: str, auth_id: str, row: int, name: str, force: bool = False, conditional: bool = True):
+        """ Fetch the JSON file and call the function when it's finished.
+
+        The metadata in cache is displayed without asking the server while it's fresh. When it's stale, it's displayed
+        while the server is asked in the background if it has changed. The cache is not used if not conditional.
+        """
+        entry = self.metadata_cache.entry(name, url, auth_id) if conditional else None
+        if entry and entry.is_usable():
+            self.metadata_received(row, entry.content)
+            if entry.is_fresh() and not force:
+                LOGGER.info("Using the metadata in cache for server '{}'".format(name))
+                return
+        else:
+            entry = None
+            self.display_action(row, False, tr('Fetching…'))
+
         self.fetchers[row] = QgsNetworkContentFetcher()
         self.fetchers[row].finished.connect(partial(self.request_finished, row))
 
@@ -508,10 +504,22 @@ class ServerManager:
 
         request = QNetworkRequest()
         request.setUrl(QUrl(self.url_metadata(url)))
-        # According to QGIS debug panel, this is not working for now
-        request.setAttribute(QNetworkRequest.CacheLoadControlAttribute, QNetworkRequest.PreferNetwork)
+        # The metadata cache is managed by the plugin, not by the network cache from QGIS
+        request.setAttribute(QNetworkRequest.CacheLoadControlAttribute, QNetworkRequest.AlwaysNetwork)
+        request.setAttribute(QNetworkRequest.CacheSaveControlAttribute, False)
+        if entry:
+            for header, value in entry.request_headers().items():
+                request.setRawHeader(header.encode('utf8'), value.encode('utf8'))
         self.fetchers[row].fetchContent(request, auth_id)
 
+    @staticmethod
+    def reply_headers(reply: QNetworkReply) -> Dict[str, str]:
+        """ Headers of the reply, with names in lower case. """
+        return {
+            bytes(header).decode('latin-1').lower(): bytes(reply.rawHeader(header)).decode('latin-1')
+            for header in reply.rawHeaderList()
+        }
+
     def request_finished(self, row: int):
         """ Dispatch the answer to update the GUI. """
         try:
@@ -521,21 +529,32 @@ class ServerManager:
         except AttributeError:
             return
 
-        url, auth_id, _ = self._fetch_cells(row)
+        url, auth_id, server_alias = self._fetch_cells(row)
 
-        login = ''
-        conf = self.config_for_id(auth_id)
-        if conf:
-            login = conf.config('username', '')
+        reply = self.fetchers[row].reply()
+
+        if reply and reply.attribute(QNetworkRequest.HttpStatusCodeAttribute) == 304:
+            # Not modified, the metadata in cache is still valid
+            entry = self.metadata_cache.revalidated(
+                server_alias, url, auth_id, self.reply_headers(reply))
+            if entry:
+                LOGGER.info("Metadata in cache for server '{}' not modified".format(server_alias))
+                self.metadata_received(row, entry.content)
+                return
+
+            request = reply.request()
+            if request.hasRawHeader(b'If-None-Match') or request.hasRawHeader(b'If-Modified-Since'):
+                # The metadata in cache has been removed meanwhile, the body of the answer is empty
+                # The fetcher is replaced after the end of this signal
+                LOGGER.info("Metadata in cache for server '{}' not found, fetching it again".format(server_alias))
+                QTimer.singleShot(
+                    0, partial(self.fetch, url, auth_id, row, server_alias, force=True, conditional=False))
+                return
 
         lizmap_cell = QTableWidgetItem()
-        qgis_cell = QTableWidgetItem()
-        action_text_cell = QTableWidgetItem()
-        self.table.setItem(row, TableCell.ActionText.value, action_text_cell)
+        self.table.setItem(row, TableCell.ActionText.value, QTableWidgetItem())
         self.table.setItem(row, TableCell.LizmapVersion.value, lizmap_cell)
-        self.table.setItem(row, TableCell.QgisVersion.value, qgis_cell)
-
-        reply = self.fetchers[row].reply()
+        self.table.setItem(row, TableCell.QgisVersion.value, QTableWidgetItem())
 
         if not reply:
             lizmap_cell.setText(tr('Error'))
@@ -566,16 +585,39 @@ class ServerManager:
             self.display_action(row, Qgis.Critical, tr('Not a JSON document.'))
             return
 
+        if self.metadata_received(row, content):
+            # Reply is good at this step, let's save it in our cache
+            self.metadata_cache.store(server_alias, url, auth_id, content, self.reply_headers(reply))
+
+    def metadata_received(self, row: int, content: dict) -> bool:
+        """ Update the GUI with the metadata of a server, from the network or the cache.
+
+        :return: If the metadata is valid.
+        """
+        url, auth_id, _ = self._fetch_cells(row)
+
+        login = ''
+        conf = self.config_for_id(auth_id)
+        if conf:
+            login = conf.config('username', '')
+
+        lizmap_cell = QTableWidgetItem()
+        qgis_cell = QTableWidgetItem()
+        action_text_cell = QTableWidgetItem()
+        self.table.setItem(row, TableCell.ActionText.value, action_text_cell)
+        self.table.setItem(row, TableCell.LizmapVersion.value, lizmap_cell)
+        self.table.setItem(row, TableCell.QgisVersion.value, qgis_cell)
+
         info = content.get('info')
         if not info:
             self.display_action(row, Qgis.Critical, tr('No "info" in the JSON document'))
-            return
+            return False
 
         # Lizmap version
         lizmap_version = info.get('version')
         if not info:
             self.display_action(row, Qgis.Critical, tr('No "version" in the JSON document'))
-            return
+            return False
 
         # LWC version split
         lizmap_version_split = self._split_lizmap_version(lizmap_version)
@@ -594,7 +636,7 @@ class ServerManager:
                                 'interface.'
                             )
                         )
-                        return
+                        return False
                 else:
                     # Starting from LWC 3.6.0 RC 2
                     # https://github.com/3liz/lizmap-web-client/pull/3292
@@ -604,7 +646,7 @@ class ServerManager:
             # qgis_server must be in the JSON file
             if not qgis_server:
                 self.display_action(row, Qgis.Critical, tr('No "qgis_server" in the JSON document'))
-                return
+                return False
 
             mime_type = qgis_server.get('mime_type')
             if not mime_type:
@@ -613,21 +655,10 @@ class ServerManager:
                     Qgis.Critical,
                     tr('QGIS Server is not loaded properly. Check the settings in the administration interface.')
                 )
-                return
+                return False
 
         lizmap_cell.setText(lizmap_version)
 
-        # Reply is good at this step, let's save it in our cache
-        server_alias = self.table.item(row, TableCell.Name.value).data(Qt.UserRole)
-        json_file_content = json.dumps(
-            content,
-            sort_keys=False,
-            indent=4
-        )
-        json_file_content += '\n'
-        with open(self.cache_file_for_name(server_alias), 'w', encoding='utf8') as json_file:
-            json_file.write(json_file_content)
-
         # TODO, I think there something wrong here
         # action_text_cell.setData(Qt.UserRole, content)
 
@@ -664,7 +695,7 @@ class ServerManager:
             # Make a better warning to upgrade ASAP
             markdown += '* QGIS Server and plugins unknown status\n'
             qgis_cell.setData(Qt.UserRole, markdown)
-            return
+            return True
 
         if qgis_server_info and "error" not in qgis_server_info.keys():
             # The current user is an admin, running at least LWC >= 3.5.1
@@ -681,7 +712,7 @@ class ServerManager:
                 markdown += '* QGIS Server plugin {} : {}\n'.format(plugin, info['version'])
             qgis_cell.setData(Qt.UserRole, markdown)
             self.update_action_version(lizmap_version, qgis_version, row, login)
-            return
+            return True
 
         if branch < (3, 5):
             # Running LWC < 3.5.X
@@ -694,7 +725,7 @@ class ServerManager:
                 tr("Not possible to determine QGIS Server version because you need at least Lizmap Web Client 3.5"))
             qgis_cell.setData(Qt.UserRole, markdown)
             self.update_action_version(lizmap_version, None, row)
-            return
+            return True
 
         if branch >= (3, 5):
             # QGIS Server is either not setup or no login
@@ -711,7 +742,7 @@ class ServerManager:
                     tr("Not possible to determine QGIS Server version because you didn't provide a login"))
 
                 self.update_action_version(lizmap_version, None, row)
-                return
+                return True
             else:
                 if "error" in qgis_server_info.keys():
                     if qgis_server_info['error'] in ('NO_ACCESS', 'WRONG_CREDENTIALS'):
@@ -721,7 +752,7 @@ class ServerManager:
                         )
                         qgis_cell.setData(Qt.UserRole, markdown)
                         self.update_action_version(lizmap_version, None, row, login, error=qgis_server_info['error'])
-                        return
+                        return True
 
                     markdown += (
                         '* QGIS Server and plugins unknown status because of the settings in QGIS Server, '
@@ -730,12 +761,13 @@ class ServerManager:
                     )
                     qgis_cell.setData(Qt.UserRole, markdown)
                     self.update_action_version(lizmap_version, None, row, login, error=qgis_server_info['error'])
-                    return
+                    return True
 
         # Unknown
         markdown += '* QGIS Server and plugins unknown status\n'
         qgis_cell.setData(Qt.UserRole, markdown)
         self.update_action_version(lizmap_version, None, row)
+        return True
 
     def existing_json_server_list(self) -> List:
         """ Read the JSON file and return its content. """
@@ -764,12 +796,10 @@ class ServerManager:
             self.server_combo.addItem(name, auth_id)
             index = self.server_combo.findData(auth_id, ServerComboData.AuthId.value)
             self.server_combo.setItemData(index, url, ServerComboData.ServerUrl.value)
-            cache_file = self.cache_file_for_name(name)
-            if cache_file.exists():
-                with open(cache_file, encoding='utf8') as f:
-                    metadata = json.load(f)
-                    self.server_combo.setItemData(index, metadata, ServerComboData.JsonMetadata.value)
-                    LOGGER.info("Loading server '{}' using cache in the drop down list".format(name))
+            entry = self.metadata_cache.entry(name, url, auth_id)
+            if entry and entry.is_usable():
+                self.server_combo.setItemData(index, entry.content, ServerComboData.JsonMetadata.value)
+                LOGGER.info("Loading server '{}' using cache in the drop down list".format(name))
             else:
                 self.server_combo.setItemData(index, {}, ServerComboData.JsonMetadata.value)
                 LOGGER.info("Loading server '{}' without metadata in the drop down list".format(name))
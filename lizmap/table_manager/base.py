@@ -1,4 +1,5 @@
 """Table manager."""
+import copy
 import enum
 import inspect
 import json
@@ -6,26 +7,23 @@ import logging
 import os
 
 from collections import namedtuple
-from typing import Optional, Union
+from typing import Iterable, Optional, Union
 
 from qgis._core import QgsMasterLayoutInterface
-from qgis.core import QgsMapLayerModel, QgsProject
+from qgis.core import QgsMapLayer, QgsProject
 from qgis.PyQt.QtCore import Qt
 from qgis.PyQt.QtGui import QColor, QIcon
-from qgis.PyQt.QtWidgets import (
-    QAbstractItemView,
-    QDialog,
-    QMessageBox,
-    QTableWidgetItem,
-)
+from qgis.PyQt.QtWidgets import QAbstractItemView, QDialog, QMessageBox
 
 from lizmap import DEFAULT_LWC_VERSION
 from lizmap.definitions.base import BaseDefinitions, InputType
 from lizmap.definitions.dataviz import AggregationType, GraphType
 from lizmap.definitions.definitions import LwcVersions
+from lizmap.layer_index import LayerIndex, LayerMetadata
 from lizmap.qgis_plugin_tools.tools.i18n import tr
 from lizmap.qgis_plugin_tools.tools.resources import plugin_name
 from lizmap.qt_style_sheets import NEW_FEATURE_CSS
+from lizmap.table_manager.model import RenderedRow, TableManagerModel
 from lizmap.tools import to_bool
 
 LOGGER = logging.getLogger(plugin_name())
@@ -42,9 +40,10 @@ class TableManager:
 
     def __init__(
             self, parent, definitions: BaseDefinitions, edition: Optional[QDialog], table, remove_button, edit_button,
-            up_button, down_button):
+            up_button, down_button, layer_index: Optional[LayerIndex] = None):
         """ Constructor. """
         self.parent = parent
+        self.layer_index = layer_index
         self.definitions = definitions
         self.edition = edition
         self.table = table
@@ -63,26 +62,32 @@ class TableManager:
         self.lwc_versions.append(LwcVersions.Lizmap_3_7)
 
         self.keys = [i for i, j in self.definitions.layer_config.items() if j.get('plural') is None]
-        self.table.setColumnCount(len(self.keys))
+
+        # Rows are stored in the model, the view only displays them
+        headers = [
+            (self.definitions.layer_config[key]['header'], self.definitions.layer_config[key].get('tooltip'))
+            for key in self.keys
+        ]
+        self.model = TableManagerModel(self.keys, headers, self._render_row, self.table)
+        self.table.setModel(self.model)
 
         for i, key in enumerate(self.keys):
-            item = self.definitions.layer_config[key]
-            column = QTableWidgetItem(item['header'])
-            tooltip = item.get('tooltip')
-            if tooltip:
-                column.setToolTip(tooltip)
-            self.table.setHorizontalHeaderItem(i, column)
-            if not item.get('visible', True):
+            if not self.definitions.layer_config[key].get('visible', True):
                 self.table.setColumnHidden(i, True)
 
         self.table.setSelectionMode(QAbstractItemView.SingleSelection)
         self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
         self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
         self.table.setAlternatingRowColors(True)
-        self.table.cellDoubleClicked.connect(self.edit_existing_row)
+        self.table.doubleClicked.connect(self.edit_existing_row)
 
-        # This is a hack to get the layer and then field icons.
-        self._layer = None
+        # The JSON is computed again only if the table, a general widget or a layer has changed
+        self._json_cache = None
+        self.model.dataChanged.connect(self.set_dirty)
+        self.model.rowsInserted.connect(self.set_dirty)
+        self.model.rowsRemoved.connect(self.set_dirty)
+        self.model.rowsMoved.connect(self.set_dirty)
+        self.model.modelReset.connect(self.set_dirty)
 
         # header = self.table.horizontalHeader()
         # header.setSectionResizeMode(QHeaderView.ResizeToContents)
@@ -116,6 +121,15 @@ class TableManager:
             if widget is None:
                 continue
 
+            if general_config['type'] == InputType.Layer:
+                widget.layerChanged.connect(self.set_dirty)
+            elif general_config['type'] == InputType.Field:
+                widget.fieldChanged.connect(self.set_dirty)
+            elif general_config['type'] == InputType.CheckBox:
+                widget.toggled.connect(self.set_dirty)
+            elif general_config['type'] == InputType.CheckBoxAsDropdown:
+                widget.currentIndexChanged.connect(self.set_dirty)
+
             tooltip = general_config.get('tooltip')
             if tooltip:
                 widget.setToolTip(tooltip)
@@ -150,6 +164,25 @@ class TableManager:
         # noinspection PyArgumentList
         self.project = QgsProject.instance()
 
+    def map_layer(self, layer_id: str) -> Optional[QgsMapLayer]:
+        """ Layer from its ID, using the plugin layer index if available. """
+        if self.layer_index is not None:
+            return self.layer_index.layer(layer_id)
+        return self.project.mapLayer(layer_id)
+
+    def layer_metadata(self, layer_id: str) -> Optional[LayerMetadata]:
+        """ Name, CRS and icons of a layer, shared with the other panels if the plugin layer index is available. """
+        if self.layer_index is not None:
+            return self.layer_index.metadata(layer_id)
+        layer = self.project.mapLayer(layer_id) if layer_id else None
+        return LayerMetadata(layer) if layer else None
+
+    def layer_changed(self, layer_id: str):
+        """ A layer has changed, the JSON and the cells must be computed again. """
+        _ = layer_id
+        self.set_dirty()
+        self.model.refresh()
+
     def set_lwc_version(self, current_version):
         """ When the target LWC version is changed, we need to update all widgets to set the color. """
         found = False
@@ -175,31 +208,26 @@ class TableManager:
     def _primary_keys(self) -> dict:
         """ Fetch the list of values part of the primary key for each row. """
         unicity_dict = dict()
-        rows = self.table.rowCount()
+
+        # We do not want to add selected values in the list.
+        # When saving the form, we will check if the current input is already in this list.
+        selected = [index.row() for index in self.table.selectionModel().selectedIndexes()]
 
         for key in self.definitions.primary_keys():
             unicity_dict[key] = list()
+            if key not in self.keys:
+                continue
 
-            for i, config_key in enumerate(self.keys):
-                if config_key == key:
-                    for row in range(rows):
-                        item = self.table.item(row, i)
-                        item: QTableWidgetItem
-                        if item is None:
-                            # Do not put if not item, it might be False
-                            raise Exception('Cell is not initialized ({}, {})'.format(row, i))
-
-                        if item.isSelected():
-                            # We do not want to add selected values in the list.
-                            # When saving the form, we will check if the current input is already in this list.
-                            continue
+            for row in range(self.model.rowCount()):
+                if row in selected:
+                    continue
 
-                        cell = item.data(Qt.UserRole)
-                        if cell is None:
-                            # Do not put if not cell, it might be False
-                            raise Exception('Cell has no data ({}, {})'.format(row, i))
+                cell = self.model.value(row, key)
+                if cell is None:
+                    # Do not put if not cell, it might be False
+                    raise Exception('Cell has no data ({}, {})'.format(row, self.keys.index(key)))
 
-                        unicity_dict[key].append(cell)
+                unicity_dict[key].append(cell)
 
         return unicity_dict
 
@@ -210,9 +238,7 @@ class TableManager:
         result = dialog.exec_()
         if result == QDialog.Accepted:
             data = dialog.save_form()
-            row = self.table.rowCount()
-            self.table.setRowCount(row + 1)
-            self._edit_row(row, data)
+            self._edit_row(self.model.rowCount(), data)
 
     def edit_existing_row(self):
         """ When editing an existing row in the table. """
@@ -224,10 +250,8 @@ class TableManager:
         row = selection[0].row()
 
         data = dict()
-        for i, key in enumerate(self.keys):
-            cell = self.table.item(row, i)
-            value = cell.data(Qt.UserRole)
-            data[key] = value
+        for key in self.keys:
+            data[key] = self.model.value(row, key)
 
         # We give the main UI of the plugin in the edition dialog
         dialog = self.edition(self.parent, self._primary_keys())
@@ -240,181 +264,56 @@ class TableManager:
         return result
 
     def _edit_row(self, row, data):
-        """ Internal function to edit a row. """
-        self._layer = None
-        for i, key in enumerate(data.keys()):
-            value = data[key]
-            cell = QTableWidgetItem()
+        """ Internal function to add or edit a row.
 
+        The row is added if it is after the last row of the table.
+        """
+        values = dict()
+        layer = None
+        for key, value in data.items():
             input_type = self.definitions.layer_config[key]['type']
 
-            if self._layer and hasattr(value, '__call__'):
+            if layer and hasattr(value, '__call__'):
                 # Value is a for now a function, we need to evaluate it
                 sig = inspect.signature(value)
                 if 'plot_type' in [i for i in sig.parameters]:
                     # TODO fixme for dataviz
-                    value = value(self._layer, data.get('type'))
+                    value = value(layer, data.get('type'))
                 else:
-                    value = value(self._layer)
+                    value = value(layer)
 
             if input_type == InputType.Layer:
-                layer = self.project.mapLayer(value)
-                self._layer = layer
-                cell.setText(layer.name())
-                cell.setData(Qt.UserRole, layer.id())
-                cell.setData(Qt.ToolTipRole, '{} ({})'.format(layer.name(), layer.crs().authid()))
-                # noinspection PyArgumentList
-                cell.setIcon(QgsMapLayerModel.iconForLayer(layer))
-
-            elif input_type == InputType.Layers:
-                names = []
-                for layer in value:
-                    if layer != '':
-                        vector = self.project.mapLayer(layer)
-                        if vector:
-                            names.append(vector.name())
-                display = ' ,'.join(names)
-                cell.setText(display)
-                cell.setData(Qt.UserRole, value)
-                cell.setData(Qt.ToolTipRole, display)
-
-            elif input_type == InputType.Field:
-                cell.setText(value)
-                cell.setData(Qt.UserRole, value)
-                cell.setData(Qt.ToolTipRole, value)
-
-                # Get the icon for the field
-                if self._layer:
-                    index = self._layer.fields().indexFromName(value)
-                    if index >= 0:
-                        cell.setIcon(self._layer.fields().iconForField(index))
-
-            elif input_type == InputType.Fields:
-                cell.setText(value)
-                cell.setData(Qt.UserRole, value)
-                cell.setData(Qt.ToolTipRole, value)
-
-            elif input_type == InputType.File:
-                cell.setText(value)
-                cell.setData(Qt.UserRole, value)
-                cell.setData(Qt.ToolTipRole, value)
-
-            elif input_type == InputType.Color:
-                cell.setText(value)
-                cell.setData(Qt.UserRole, value)
-                cell.setData(Qt.ToolTipRole, value)
-                if value:
-                    cell.setData(Qt.DecorationRole, QColor(value))
+                layer = self.map_layer(value)
+                value = layer.id()
 
             elif input_type == InputType.CheckBox:
-                if value:
-                    cell.setText('✓')
-                    cell.setData(Qt.UserRole, True)
-                    cell.setData(Qt.ToolTipRole, tr('True'))
-                else:
-                    cell.setText('')
-                    cell.setData(Qt.UserRole, False)
-                    cell.setData(Qt.ToolTipRole, tr('False'))
-                cell.setTextAlignment(Qt.AlignCenter)
+                value = bool(value)
 
             elif input_type == InputType.Json:
-                if value:
-                    cell.setText(json.dumps(value))
-                    cell.setData(Qt.UserRole, value)
-                    cell.setData(Qt.ToolTipRole, value)
-                else:
-                    cell.setText('')
-                    cell.setData(Qt.UserRole, '')
-                    cell.setData(Qt.ToolTipRole, '')
+                if not value:
+                    value = ''
 
             elif input_type in (InputType.List, InputType.CheckBoxAsDropdown):
-                cell.setData(Qt.UserRole, value)
-                cell.setData(Qt.ToolTipRole, value)
                 items = self.definitions.layer_config[key].get('items')
                 multiple_selection = self.definitions.layer_config[key].get('multiple_selection', False)
-                if items:
-                    if not multiple_selection:
-                        for item_enum in items:
-                            if item_enum.value['data'] == value:
-                                text = item_enum.value['label']
-                                icon = item_enum.value.get('icon')
-                                break
-                        else:
-                            msg = 'Error with value = "{}" in list "{}"'.format(value, key)
-                            LOGGER.critical(msg)
-                            raise Exception(msg)
-                        cell.setText(text)
-                        if icon:
-                            cell.setIcon(QIcon(icon))
-                    else:
-                        labels = []
-                        for item_enum in items:
-                            if item_enum.value['data'] in value:
-                                # TODO
-                                # We should add the label and not the data, but there is a bug later when opening the
-                                # form
-                                labels.append(item_enum.value['data'])
-                        value = ','.join(labels)
-                        cell.setText(value)
-
-            elif input_type == InputType.SpinBox:
-                unit = self.definitions.layer_config[key].get('unit')
-                if unit:
-                    display = '{}{}'.format(value, unit)
-                else:
-                    display = '{}'.format(value)
-                cell.setText(display)
-                cell.setData(Qt.UserRole, value)
-                cell.setData(Qt.ToolTipRole, value)
-
-            elif input_type == InputType.Text:
-                cell.setText(value)
-                cell.setData(Qt.UserRole, value)
-                cell.setData(Qt.ToolTipRole, value)
-
-                if self.definitions.key() == 'layouts' and key == 'layout':
-                    manager = QgsProject.instance().layoutManager()
-                    layout = manager.layoutByName(value)
-
-                    atlas_layout = None
-                    if layout.layoutType() == QgsMasterLayoutInterface.PrintLayout:
-                        for _print_layout in manager.printLayouts():
-                            if _print_layout.name() == value:
-                                atlas_layout = _print_layout
-                                break
-
-                    if not atlas_layout:
-                        # The report shouldn't be loaded
-                        return
-
-                    if atlas_layout.atlas().enabled():
-                        icon = QIcon(":images/themes/default/mIconAtlas.svg")
-                    else:
-                        icon = QIcon(":images/themes/default/mActionFilePrint.svg")
-                    cell.setIcon(icon)
-
-            elif input_type == InputType.MultiLine:
-                cell.setText(value)
-                cell.setData(Qt.UserRole, value)
-                cell.setData(Qt.ToolTipRole, value)
-
-            elif input_type == InputType.HtmlWysiwyg:
-                cell.setText(value)
-                cell.setData(Qt.UserRole, value)
-                cell.setData(Qt.ToolTipRole, value)
-
-            elif input_type == InputType.Collection:
-                json_dump = json.dumps(value)
-                cell.setText(json_dump)
-                cell.setData(Qt.UserRole, value)
-                function = self.definitions.layer_config[key]['represent_value']
-                cell.setData(Qt.ToolTipRole, function(value))
-
-            else:
+                if items and not multiple_selection:
+                    if value not in [item_enum.value['data'] for item_enum in items]:
+                        msg = 'Error with value = "{}" in list "{}"'.format(value, key)
+                        LOGGER.critical(msg)
+                        raise Exception(msg)
+
+            elif input_type not in (
+                    InputType.Layers, InputType.Field, InputType.Fields, InputType.File, InputType.Color,
+                    InputType.SpinBox, InputType.Text, InputType.MultiLine, InputType.HtmlWysiwyg,
+                    InputType.Collection):
                 raise Exception('InputType "{}" not implemented'.format(input_type))
 
-            self.table.setItem(row, i, cell)
-        self._layer = None
+            values[key] = value
+
+        if row >= self.model.rowCount():
+            self.model.insert_row(self.model.rowCount(), values)
+        else:
+            self.model.set_row(row, values)
 
         if self.definitions.key() == 'dataviz':
             # We want to refresh the plot.
@@ -423,29 +322,127 @@ class TableManager:
 
         self.table.clearSelection()
 
+    def _render_row(self, values: dict) -> RenderedRow:
+        """ Text, tooltip and icon of each cell of a row, only called when the row is displayed. """
+        # The layer of the row, for the field icons
+        layer = None
+        for key in self.keys:
+            if self.definitions.layer_config[key]['type'] == InputType.Layer:
+                layer = self.layer_metadata(values.get(key))
+                break
+
+        return [self._render_cell(key, values.get(key), layer) for key in self.keys]
+
+    def _render_cell(self, key: str, value, layer: Optional[LayerMetadata]) -> dict:
+        """ Text, tooltip and icon of a cell. """
+        input_type = self.definitions.layer_config[key]['type']
+        cell = {Qt.DisplayRole: value, Qt.ToolTipRole: value}
+
+        if input_type == InputType.Layer:
+            cell_layer = self.layer_metadata(value)
+            if cell_layer:
+                cell[Qt.DisplayRole] = cell_layer.name
+                cell[Qt.ToolTipRole] = '{} ({})'.format(cell_layer.name, cell_layer.crs)
+                cell[Qt.DecorationRole] = cell_layer.icon
+
+        elif input_type == InputType.Layers:
+            names = []
+            for layer_id in value:
+                if layer_id != '':
+                    vector = self.layer_metadata(layer_id)
+                    if vector:
+                        names.append(vector.name)
+            display = ' ,'.join(names)
+            cell[Qt.DisplayRole] = display
+            cell[Qt.ToolTipRole] = display
+
+        elif input_type == InputType.Field:
+            # Get the icon for the field
+            if layer:
+                icon = layer.field_icon(value)
+                if icon:
+                    cell[Qt.DecorationRole] = icon
+
+        elif input_type == InputType.Color:
+            if value:
+                cell[Qt.DecorationRole] = QColor(value)
+
+        elif input_type == InputType.CheckBox:
+            cell[Qt.DisplayRole] = '✓' if value else ''
+            cell[Qt.ToolTipRole] = tr('True') if value else tr('False')
+            cell[Qt.TextAlignmentRole] = Qt.AlignCenter
+
+        elif input_type == InputType.Json:
+            cell[Qt.DisplayRole] = json.dumps(value) if value else ''
+
+        elif input_type in (InputType.List, InputType.CheckBoxAsDropdown):
+            items = self.definitions.layer_config[key].get('items')
+            multiple_selection = self.definitions.layer_config[key].get('multiple_selection', False)
+            if items:
+                if not multiple_selection:
+                    for item_enum in items:
+                        if item_enum.value['data'] == value:
+                            cell[Qt.DisplayRole] = item_enum.value['label']
+                            icon = item_enum.value.get('icon')
+                            if icon:
+                                cell[Qt.DecorationRole] = QIcon(icon)
+                            break
+                else:
+                    labels = []
+                    for item_enum in items:
+                        if item_enum.value['data'] in value:
+                            # TODO
+                            # We should add the label and not the data, but there is a bug later when opening the
+                            # form
+                            labels.append(item_enum.value['data'])
+                    cell[Qt.DisplayRole] = ','.join(labels)
+
+        elif input_type == InputType.SpinBox:
+            unit = self.definitions.layer_config[key].get('unit')
+            if unit:
+                cell[Qt.DisplayRole] = '{}{}'.format(value, unit)
+            else:
+                cell[Qt.DisplayRole] = '{}'.format(value)
+
+        elif input_type == InputType.Text:
+            if self.definitions.key() == 'layouts' and key == 'layout':
+                manager = QgsProject.instance().layoutManager()
+                layout = manager.layoutByName(value)
+                if layout and layout.layoutType() == QgsMasterLayoutInterface.PrintLayout:
+                    # The report does not have an icon
+                    if layout.atlas().enabled():
+                        cell[Qt.DecorationRole] = QIcon(":images/themes/default/mIconAtlas.svg")
+                    else:
+                        cell[Qt.DecorationRole] = QIcon(":images/themes/default/mActionFilePrint.svg")
+
+        elif input_type == InputType.Collection:
+            cell[Qt.DisplayRole] = json.dumps(value)
+            function = self.definitions.layer_config[key]['represent_value']
+            cell[Qt.ToolTipRole] = function(value)
+
+        return cell
+
+    def current_row(self) -> int:
+        """ The current row in the table, -1 if there isn't any. """
+        return self.table.currentIndex().row()
+
     def move_layer_up(self):
         """Move the selected layer up."""
-        row = self.table.currentRow()
+        row = self.current_row()
         if row <= 0:
             return
-        column = self.table.currentColumn()
-        self.table.insertRow(row - 1)
-        for i in range(self.table.columnCount()):
-            self.table.setItem(row - 1, i, self.table.takeItem(row + 1, i))
-            self.table.setCurrentCell(row - 1, column)
-        self.table.removeRow(row + 1)
+        column = self.table.currentIndex().column()
+        self.model.move_row(row, row - 1)
+        self.table.setCurrentIndex(self.model.index(row - 1, column))
 
     def move_layer_down(self):
         """Move the selected layer down."""
-        row = self.table.currentRow()
-        if row == self.table.rowCount() - 1 or row < 0:
+        row = self.current_row()
+        if row == self.model.rowCount() - 1 or row < 0:
             return
-        column = self.table.currentColumn()
-        self.table.insertRow(row + 2)
-        for i in range(self.table.columnCount()):
-            self.table.setItem(row + 2, i, self.table.takeItem(row, i))
-            self.table.setCurrentCell(row + 2, column)
-        self.table.removeRow(row)
+        column = self.table.currentIndex().column()
+        self.model.move_row(row, row + 1)
+        self.table.setCurrentIndex(self.model.index(row + 1, column))
 
     def remove_selection(self):
         """Remove the selected row from the table."""
@@ -455,26 +452,32 @@ class TableManager:
 
         row = selection[0].row()
         self.table.clearSelection()
-        self.table.removeRow(row)
-
-    def layers_has_been_deleted(self, layer_ids):
-        """When some layers have been deleted from QGIS."""
-        for layer in layer_ids:
-            row = self.table.rowCount()
-            for i in range(row):
-                cell = self.table.item(i, 0)
-                if not cell:
-                    continue
+        self.model.remove_row(row)
 
-                value = cell.data(Qt.UserRole)
-                if value == layer:
-                    self.table.removeRow(i)
-                    LOGGER.info("Removing '{}' from table {}".format(layer, self.definitions.key()))
-                    continue
+    def layers_has_been_deleted(self, layer_ids: Iterable[str]):
+        """When some layers have been deleted from QGIS.
+
+        All rows are removed in a single update of the table. Other rows may use these layers in another column,
+        the table is refreshed once.
+        """
+        layer_ids = set(layer_ids)
+        key = self.keys[0]
+        rows = [row for row in range(self.model.rowCount()) if self.model.value(row, key) in layer_ids]
+
+        self.table.setUpdatesEnabled(False)
+        try:
+            self.model.remove_rows(rows)
+            self.set_dirty()
+            self.model.refresh()
+        finally:
+            self.table.setUpdatesEnabled(True)
+
+        if rows:
+            LOGGER.info("Removing {} row(s) from table {}".format(len(rows), self.definitions.key()))
 
     def truncate(self):
         """Truncate the table."""
-        self.table.setRowCount(0)
+        self.model.clear()
 
     def use_single_row(self):
         return self.definitions.use_single_row
@@ -484,10 +487,27 @@ class TableManager:
         """ The label in the CFG file prefixing the list. """
         return "layers"
 
+    def keyed_by_layer_name(self) -> bool:
+        """ If the layers are keyed by their name in the CFG file. """
+        return self.definitions.key() in [
+            'locateByLayer',
+            'loginFilteredLayers',
+            'tooltipLayers',
+            'attributeLayers',
+            'editionLayers',
+            'timemanagerLayers',
+        ]
+
+    def set_dirty(self, *args):
+        """ The JSON must be computed again. """
+        _ = args
+        self._json_cache = None
+
     def to_json(self, version=None) -> dict:
         """Write the configuration to JSON.
 
         Since Lizmap 3.4, the JSON is different.
+        The JSON is reused if nothing changed since the previous call.
         """
         if not version:
             if self.parent:
@@ -495,6 +515,27 @@ class TableManager:
             else:
                 version = DEFAULT_LWC_VERSION
 
+        if self._json_cache is None or self._json_cache[0] != version:
+            self._json_cache = (version, self._to_json(version))
+        data = copy.deepcopy(self._json_cache[1])
+
+        # Check for PG with centroid options
+        # Maybe move this code later if we have more checks to do when saving CFG
+        if self.definitions.key() == 'filter_by_polygon':
+            for layer_data in data['layers']:
+                if layer_data['use_centroid']:
+                    vector_layer = self.map_layer(layer_data['layer'])
+                    if vector_layer.providerType() == 'postgres':
+                        # noinspection PyUnresolvedReferences
+                        has_index, message = self.definitions.has_spatial_centroid_index(vector_layer)
+                        if not has_index:
+                            # noinspection PyUnresolvedReferences,PyArgumentList
+                            QMessageBox.critical(self.parent, tr('Filter by polygon'), message, QMessageBox.Ok)
+
+        return data
+
+    def _to_json(self, version: LwcVersions) -> dict:
+        """ Write the configuration to JSON, without cache. """
         data = dict()
 
         if self.definitions.key() in ('filter_by_polygon', 'layouts', ):
@@ -521,66 +562,31 @@ class TableManager:
 
         data[self.label_dictionary_list()] = list()
 
-        rows = self.table.rowCount()
+        rows = self.model.rowCount()
 
         export_legacy_single_row = self.definitions.use_single_row and rows == 1
 
         for row in range(rows):
             layer_data = dict()
+            values = self.model.rows[row]
             for i, key in enumerate(self.keys):
-                input_type = self.definitions.layer_config[key]['type']
-                use_bool_type = self.definitions.layer_config[key].get('use_json', False)
-                item = self.table.item(row, i)
+                definition = self.definitions.layer_config[key]
+                cell = values.get(key)
 
                 if export_legacy_single_row:
                     key = '{}{}{}'.format(self.definitions.key(), key[0].capitalize(), key[1:])
 
-                if item is None:
-                    # Do not put if not item, it might be False
-                    raise Exception('Cell is not initialized ({}, {})'.format(row, i))
-
-                cell = item.data(Qt.UserRole)
                 if cell is None:
                     # Do not put if not cell, it might be False
                     raise Exception('Cell has no data ({}, {})'.format(row, i))
 
-                if input_type == InputType.Layer:
-                    layer_data[key] = cell
-                elif input_type == InputType.Collection:
-                    layer_data[key] = cell
-                elif input_type == InputType.Layers:
-                    layer_data[key] = cell
-                elif input_type == InputType.Color:
-                    layer_data[key] = cell
-                elif input_type == InputType.Field:
-                    layer_data[key] = cell
-                elif input_type == InputType.Fields:
-                    layer_data[key] = cell
-                elif input_type == InputType.File:
-                    layer_data[key] = cell
-                elif input_type == InputType.Json:
-                    layer_data[key] = cell
-                elif input_type in (InputType.CheckBox, InputType.CheckBoxAsDropdown):
-                    if use_bool_type:
-                        layer_data[key] = cell
-                    else:
+                if definition['type'] in (InputType.CheckBox, InputType.CheckBoxAsDropdown):
+                    if not definition.get('use_json', False):
                         # Lizmap 4 #176
-                        layer_data[key] = str(True) if cell else str(False)
-                elif input_type == InputType.SpinBox:
-                    layer_data[key] = cell
-                elif input_type == InputType.List:
-                    layer_data[key] = cell
-                elif input_type == InputType.Text:
-                    layer_data[key] = cell
-                elif input_type == InputType.MultiLine:
-                    layer_data[key] = cell
-                elif input_type == InputType.HtmlWysiwyg:
-                    layer_data[key] = cell
-                else:
-                    raise Exception('InputType "{}" not implemented'.format(input_type))
+                        cell = str(True) if cell else str(False)
 
-                if layer_data[key] == '':
-                    layer_data.pop(key)
+                if cell != '':
+                    layer_data[key] = cell
 
             for key in self.keys:
                 # Re-iterate after we got the layer ID in the form
@@ -589,7 +595,7 @@ class TableManager:
                 is_read_only = self.definitions.layer_config[key].get('read_only', False)
                 if default_value is not None and hasattr(default_value, '__call__') and is_read_only:
                     # Value is a for now a function, we need to evaluate it
-                    vector_layer = self.project.mapLayer(layer_data['layerId'])
+                    vector_layer = self.map_layer(layer_data['layerId'])
                     # TODO to make it future proof by inspecting parameters etc
                     # We assume for now we use the QgsVectorLayer for the input and optional dataviz type
                     sig = inspect.signature(default_value)
@@ -628,7 +634,7 @@ class TableManager:
                     3: 'unknown',
                     4: 'none'
                 }
-                vector_layer = self.project.mapLayer(layer_data['layerId'])
+                vector_layer = self.map_layer(layer_data['layerId'])
                 layer_data['geometryType'] = geometry_type[vector_layer.geometryType()]
 
             if self.definitions.key() == 'datavizLayers':
@@ -676,19 +682,6 @@ class TableManager:
 
             data[self.label_dictionary_list()].append(layer_data)
 
-        # Check for PG with centroid options
-        # Maybe move this code later if we have more checks to do when saving CFG
-        if self.definitions.key() == 'filter_by_polygon':
-            for layer_data in data['layers']:
-                if layer_data['use_centroid']:
-                    vector_layer = self.project.mapLayer(layer_data['layer'])
-                    if vector_layer.providerType() == 'postgres':
-                        # noinspection PyUnresolvedReferences
-                        has_index, message = self.definitions.has_spatial_centroid_index(vector_layer)
-                        if not has_index:
-                            # noinspection PyUnresolvedReferences,PyArgumentList
-                            QMessageBox.critical(self.parent, tr('Filter by polygon'), message, QMessageBox.Ok)
-
         if self.definitions.key() in [
             'locateByLayer',
             'loginFilteredLayers',
@@ -702,12 +695,12 @@ class TableManager:
             result = {}
             for i, layer in enumerate(data['layers']):
                 layer_id = layer.get('layerId')
-                vector_layer = self.project.mapLayer(layer_id)
+                vector_layer = self.map_layer(layer_id)
                 layer_name = vector_layer.name()
-                if self.definitions.key() in ['formFilterLayers', 'datavizLayers']:
-                    key = str(i)
-                else:
+                if self.keyed_by_layer_name():
                     key = layer_name
+                else:
+                    key = str(i)
                 if result.get(layer_name):
                     LOGGER.warning(
                         'Skipping "{}" while saving "{}" JSON configuration. Duplicated entry.'.format(
@@ -887,7 +880,7 @@ class TableManager:
 
                 widget_type = self.definitions.general_config[config_key]['type']
                 if widget_type == InputType.Layer:
-                    vector_layer = self.project.mapLayer(value)
+                    vector_layer = self.map_layer(value)
                     if not vector_layer or not vector_layer.isValid():
                         LOGGER.warning(
                             'In CFG file, section "{}" with key {}, the layer with ID "{}" is invalid or does not '
@@ -937,7 +930,7 @@ class TableManager:
                 value = layer.get(key)
                 if value:
                     if definition['type'] == InputType.Layer:
-                        vector_layer = self.project.mapLayer(value)
+                        vector_layer = self.map_layer(value)
                         if not vector_layer or not vector_layer.isValid():
                             LOGGER.warning(
                                 'In CFG file, section "{}", the layer with ID "{}" is invalid or does not exist.'
@@ -1019,7 +1012,7 @@ class TableManager:
 
             if not valid_layer:
                 # We didn't find any valid layer during the process of reading this JSON dictionary
-                row = self.table.rowCount()
+                row = self.model.rowCount()
                 LOGGER.info(
                     "No valid layer found when reading this section {}. Not adding the row number {}".format(
                         row + 1,
@@ -1039,6 +1032,4 @@ class TableManager:
                     valid_layer = False
 
             if valid_layer:
-                row = self.table.rowCount()
-                self.table.setRowCount(row + 1)
-                self._edit_row(row, layer_data)
+                self._edit_row(self.model.rowCount(), layer_data)
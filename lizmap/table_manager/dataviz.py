@@ -26,6 +26,7 @@ from qgis.PyQt.QtWidgets import QDialog, QLabel
 from lizmap.definitions.base import BaseDefinitions
 from lizmap.definitions.dataviz import GraphType
 from lizmap.definitions.definitions import ServerComboData
+from lizmap.layer_index import LayerIndex
 from lizmap.qgis_plugin_tools.tools.i18n import tr
 from lizmap.qgis_plugin_tools.tools.resources import (
     plugin_name,
@@ -52,8 +53,9 @@ class TableManagerDataviz(TableManager):
 
     def __init__(
             self, parent, definitions: BaseDefinitions, edition: Optional[QDialog], table, edit_button, up_button,
-            down_button):
-        TableManager.__init__(self, parent, definitions, edition, table, None, edit_button, up_button, down_button)
+            down_button, layer_index: Optional[LayerIndex] = None):
+        TableManager.__init__(
+            self, parent, definitions, edition, table, None, edit_button, up_button, down_button, layer_index)
 
         label = tr(
             "This plot is a preview, using the <b>data</b> and the <b>project</b> currently stored "
@@ -61,7 +63,7 @@ class TableManagerDataviz(TableManager):
         )
         self.parent.label_helper_dataviz.setText(label)
 
-        self.table.itemSelectionChanged.connect(self.preview_dataviz_dialog)
+        self.table.selectionModel().selectionChanged.connect(self.preview_dataviz_dialog)
 
         if qgis_version() >= 31400:
             self.parent.dataviz_feature_picker.setShowBrowserButtons(True)
@@ -258,7 +260,7 @@ class TableManagerDataviz(TableManager):
     def dataviz_expression_filter(self, layer_id: str) -> Optional[str]:
         """ Return the expression filter if possible. """
         project = QgsProject.instance()
-        layer = project.mapLayer(layer_id)
+        layer = self.map_layer(layer_id)
         if not layer:
             return
 
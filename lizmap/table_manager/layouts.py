@@ -3,14 +3,15 @@
 import logging
 
 from enum import Enum
-from typing import Optional
+from typing import Dict, Optional
 
-from qgis.core import QgsProject
-from qgis.PyQt.QtCore import Qt
+from qgis.core import QgsPrintLayout, QgsProject
+from qgis.PyQt import sip
 from qgis.PyQt.QtWidgets import QDialog
 
 from lizmap.definitions.base import BaseDefinitions
 from lizmap.definitions.definitions import LwcVersions
+from lizmap.layer_index import LayerIndex
 from lizmap.qgis_plugin_tools.tools.resources import plugin_name
 from lizmap.table_manager.base import TableManager
 
@@ -28,8 +29,19 @@ class TableManagerLayouts(TableManager):
 
     def __init__(
             self, parent, definitions: BaseDefinitions, edition: Optional[QDialog], table, edit_button, up_button,
-            down_button):
-        TableManager.__init__(self, parent, definitions, edition, table, None, edit_button, up_button, down_button)
+            down_button, layer_index: Optional[LayerIndex] = None):
+        TableManager.__init__(
+            self, parent, definitions, edition, table, None, edit_button, up_button, down_button, layer_index)
+        # Index of layouts from the C++ address of the QGIS layout, updated from the signals of the layout manager.
+        # The layout has already its new name when it's renamed, the previous name is kept here.
+        self._layout_names: Dict[int, str] = {}
+        self._layout_addresses: Dict[str, int] = {}
+        # Row of each layout name, computed again only when rows are added, removed or moved
+        self._rows: Optional[Dict[str, int]] = None
+        self.model.rowsInserted.connect(self._rows_changed)
+        self.model.rowsRemoved.connect(self._rows_changed)
+        self.model.rowsMoved.connect(self._rows_changed)
+        self.model.modelReset.connect(self._rows_changed)
 
     @staticmethod
     def label_dictionary_list() -> str:
@@ -47,107 +59,130 @@ class TableManagerLayouts(TableManager):
                 del tmp['layout']
                 tmp_layout_cfg[layout.get('layout')] = tmp
 
-        # Previous print from <= LWC 3.6 was activated or not
-        # Do not break pre-existing format
-        if self.parent:
-            current_version = self.parent.current_lwc_version()
-            if current_version:
-                legacy_print_checkbox = (
-                        self.parent.cbActivatePrint.isChecked() or current_version <= LwcVersions.Lizmap_3_6)
-            else:
-                legacy_print_checkbox = False
-        else:
-            legacy_print_checkbox = False
+        legacy_print_checkbox = self._legacy_print_checkbox()
 
         # For all layouts in the project already loaded
         for layout in QgsProject.instance().layoutManager().printLayouts():
             # TODO check for report ?
             LOGGER.debug("  * reading layout {}".format(layout.name()))
-            row = self.table.rowCount()
-            self.table.setRowCount(row + 1)
-
-            # We create the empty structure
-            json = dict()
-
-            # We fill with the layout name
-            json['layout'] = layout.name()
-
-            # We first fill with None or default values from definitions
-            for key, values in self.definitions.layer_config.items():
-
-                if key == 'layout':
-                    continue
-
-                json[key] = None
-                default = values.get('default')
-                if isinstance(default, Enum):
-                    default = default.value['data']
 
-                if default is not None:
-                    # Be careful, default can an empty string...
-                    json[key] = default
-
-                if legacy_print_checkbox and key == 'dpi_available':
-                    json['dpi_available'] = ('100', '200', '300')
-
-                if legacy_print_checkbox and key == 'formats_available':
-                    json['formats_available'] = ('pdf', 'png', 'jpeg', 'svg')
+            json = self._default_row(layout.name(), legacy_print_checkbox)
 
             # Then we override by the CFG file
             if layout.name() in tmp_layout_cfg.keys():
                 for item_key, cfg_value in tmp_layout_cfg[layout.name()].items():
                     json[item_key] = cfg_value
 
-            self._edit_row(row, json)
+            self._add_layout(layout, json)
 
-    def layout_renamed(self, layout, new_name: str):
-        """ When a layout has been renamed in the project. """
-        # The 'layout' has already the new name !
-        # Shame, I need to make a diff to find which one was it...
-        _ = layout
+    def _legacy_print_checkbox(self) -> bool:
+        """ If the previous print from <= LWC 3.6 was activated or not. """
+        # Do not break pre-existing format
+        if not self.parent:
+            return False
 
-        row = self.table.rowCount()
+        current_version = self.parent.current_lwc_version()
+        if not current_version:
+            return False
 
-        lizmap_layouts = []
-        for i in range(row):
-            cell = self.table.item(i, 0)
-            if not cell:
-                continue
+        return self.parent.cbActivatePrint.isChecked() or current_version <= LwcVersions.Lizmap_3_6
 
-            lizmap_layouts.append(cell.data(Qt.UserRole))
+    def _default_row(self, name: str, legacy_print_checkbox: bool) -> dict:
+        """ Values of a layout which is not in the CFG file. """
+        # We create the empty structure
+        json = dict()
 
-        qgis_layouts = []
-        for layout in QgsProject.instance().layoutManager().printLayouts():
-            qgis_layouts.append(layout.name())
+        # We fill with the layout name
+        json['layout'] = name
+
+        # We first fill with None or default values from definitions
+        for key, values in self.definitions.layer_config.items():
 
-        # Make the diff
-        diff = [x for x in lizmap_layouts if x not in qgis_layouts]
+            if key == 'layout':
+                continue
 
-        # Logically, it must be only one in the diff...
-        if len(diff) >= 2:
-            # Sorry, I don't know which one it was.
+            json[key] = None
+            default = values.get('default')
+            if isinstance(default, Enum):
+                default = default.value['data']
+
+            if default is not None:
+                # Be careful, default can an empty string...
+                json[key] = default
+
+            if legacy_print_checkbox and key == 'dpi_available':
+                json['dpi_available'] = ('100', '200', '300')
+
+            if legacy_print_checkbox and key == 'formats_available':
+                json['formats_available'] = ('pdf', 'png', 'jpeg', 'svg')
+
+        return json
+
+    def _add_layout(self, layout: QgsPrintLayout, json: dict):
+        """ Add the row of a layout at the end of the table, and index it. """
+        address = sip.unwrapinstance(layout)
+        self._layout_names[address] = layout.name()
+        self._layout_addresses[layout.name()] = address
+        self._edit_row(self.model.rowCount(), json)
+
+    def _layout_rows(self) -> Dict[str, int]:
+        """ Row of each layout in the table, from its name. """
+        if self._rows is None:
+            key = self.keys[0]
+            self._rows = {self.model.value(row, key): row for row in range(self.model.rowCount())}
+        return self._rows
+
+    def _rows_changed(self, *args):
+        """ Rows have been added, removed or moved, the position of layouts must be computed again. """
+        _ = args
+        self._rows = None
+
+    def truncate(self):
+        """ Truncate the table and the index of layouts. """
+        super().truncate()
+        self._layout_names.clear()
+        self._layout_addresses.clear()
+
+    def layout_added(self, name: str):
+        """ When a layout has been added in the project. """
+        layout = QgsProject.instance().layoutManager().layoutByName(name)
+        if not isinstance(layout, QgsPrintLayout):
+            # Reports are not in the table
             return
-        elif len(diff) == 0:
-            # Strange, no diff
-            # Nothing to do
+
+        if name in self._layout_addresses:
             return
 
-        old_name = diff[0]
+        LOGGER.info("Adding layout '{}'".format(name))
+        self._add_layout(layout, self._default_row(name, self._legacy_print_checkbox()))
 
-        for i in range(row):
-            cell = self.table.item(i, 0)
-            if not cell:
-                continue
+    def layout_renamed(self, layout, new_name: str):
+        """ When a layout has been renamed in the project. """
+        # The 'layout' has already the new name, the previous one is in the index
+        address = sip.unwrapinstance(layout)
+        old_name = self._layout_names.get(address)
+        if old_name is None or old_name == new_name:
+            return
+
+        self._layout_names[address] = new_name
+        del self._layout_addresses[old_name]
+        self._layout_addresses[new_name] = address
 
-            value = cell.data(Qt.UserRole)
-            if value == old_name:
-                LOGGER.info("Renaming layout from '{}' to '{}'".format(old_name, new_name))
-                cell.setData(Qt.UserRole, new_name)
-                cell.setText(new_name)
-                break
+        rows = self._layout_rows()
+        row = rows.pop(old_name, None)
+        if row is None:
+            return
+
+        rows[new_name] = row
+        LOGGER.info("Renaming layout from '{}' to '{}'".format(old_name, new_name))
+        self.model.set_value(row, self.keys[0], new_name)
 
     def layout_removed(self, name: str):
         """ When a layout has been removed from the project. """
-        # A layout removed is the same behavior as a layer deleted in other tables.
-        # We only need to make it as a list.
-        self.layers_has_been_deleted([name])
+        address = self._layout_addresses.pop(name, None)
+        if address is not None:
+            del self._layout_names[address]
+
+        row = self._layout_rows().get(name)
+        if row is not None:
+            self.model.remove_row(row)
@@ -0,0 +1,155 @@
+""" Model of the rows of a table manager. """
+
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from qgis.PyQt.QtCore import QAbstractTableModel, QModelIndex, Qt
+
+__copyright__ = 'Copyright 2023, 3Liz'
+__license__ = 'GPL version 3'
+__email__ = 'info@3liz.org'
+
+# Display, tooltip, decoration and alignment of each cell of a row
+RenderedRow = List[Dict[int, Any]]
+
+
+class TableManagerModel(QAbstractTableModel):
+
+    """ Rows of a table manager, each row is a dictionary with the value of each key.
+
+    The text, the tooltip and the icon of the cells are computed only when the row is displayed, and kept until the
+    row is changed. The value of a cell is given with the Qt.UserRole.
+    """
+
+    def __init__(
+            self, keys: List[str], headers: List[Tuple[str, Optional[str]]], render: Callable[[dict], RenderedRow],
+            parent=None):
+        """ Constructor.
+
+        :param keys: Keys of the columns.
+        :param headers: Label and tooltip of each column.
+        :param render: Function returning the roles of each cell of a row, from the values of the row.
+        """
+        super().__init__(parent)
+        self.keys = keys
+        self.headers = headers
+        self.render = render
+        self.rows: List[dict] = []
+        self._rendered: List[Optional[RenderedRow]] = []
+
+    def value(self, row: int, key: str) -> Any:
+        """ Value of a key in a row, None if it's not set. """
+        return self.rows[row].get(key)
+
+    def insert_row(self, row: int, values: dict):
+        """ Add a row at the given position. """
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.rows.insert(row, values)
+        self._rendered.insert(row, None)
+        self.endInsertRows()
+
+    def set_row(self, row: int, values: dict):
+        """ Replace all values of a row. """
+        self.rows[row] = values
+        self._row_changed(row)
+
+    def set_value(self, row: int, key: str, value: Any):
+        """ Replace one value of a row. """
+        self.rows[row][key] = value
+        self._row_changed(row)
+
+    def remove_row(self, row: int):
+        """ Remove a row. """
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.rows[row]
+        del self._rendered[row]
+        self.endRemoveRows()
+
+    def remove_rows(self, rows: Iterable[int]):
+        """ Remove many rows in a single update of the model. """
+        rows = set(rows)
+        if not rows:
+            return
+
+        first, last = min(rows), max(rows)
+        if last - first + 1 == len(rows):
+            # Consecutive rows
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self.rows[first:last + 1]
+            del self._rendered[first:last + 1]
+            self.endRemoveRows()
+            return
+
+        self.beginResetModel()
+        self.rows = [values for i, values in enumerate(self.rows) if i not in rows]
+        self._rendered = [rendered for i, rendered in enumerate(self._rendered) if i not in rows]
+        self.endResetModel()
+
+    def move_row(self, row: int, new_row: int) -> bool:
+        """ Move a row to a new position. """
+        if row == new_row or not 0 <= new_row < len(self.rows):
+            return False
+
+        # The destination is the row before which the row is moved, before removing it
+        destination = new_row + 1 if new_row > row else new_row
+        if not self.beginMoveRows(QModelIndex(), row, row, QModelIndex(), destination):
+            return False
+        self.rows.insert(new_row, self.rows.pop(row))
+        self._rendered.insert(new_row, self._rendered.pop(row))
+        self.endMoveRows()
+        return True
+
+    def clear(self):
+        """ Remove all rows. """
+        self.beginResetModel()
+        self.rows = []
+        self._rendered = []
+        self.endResetModel()
+
+    def refresh(self):
+        """ Compute again the text, the tooltip and the icon of all rows. """
+        self._rendered = [None] * len(self.rows)
+        if self.rows:
+            self.dataChanged.emit(self.index(0, 0), self.index(len(self.rows) - 1, len(self.keys) - 1))
+
+    def _row_changed(self, row: int):
+        self._rendered[row] = None
+        self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.keys) - 1))
+
+    # QAbstractTableModel
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return len(self.rows)
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return len(self.keys)
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole) -> Any:
+        if not index.isValid():
+            return None
+
+        row = index.row()
+        if role == Qt.UserRole:
+            return self.rows[row].get(self.keys[index.column()])
+
+        rendered = self._rendered[row]
+        if rendered is None:
+            rendered = self.render(self.rows[row])
+            self._rendered[row] = rendered
+
+        return rendered[index.column()].get(role)
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.DisplayRole) -> Any:
+        if orientation != Qt.Horizontal or not 0 <= section < len(self.headers):
+            return super().headerData(section, orientation, role)
+
+        if role == Qt.DisplayRole:
+            return self.headers[section][0]
+
+        if role == Qt.ToolTipRole:
+            return self.headers[section][1]
+
+        return None
@@ -0,0 +1,50 @@
+"""Test the check mode of the Lizmap API."""
+
+import json
+import os
+import tempfile
+import unittest
+
+from lizmap.lizmap_api.diff import cfg_file_diff, config_diff
+
+__copyright__ = 'Copyright 2023, 3Liz'
+__license__ = 'GPL version 3'
+__email__ = 'info@3liz.org'
+
+
+class TestApiDiff(unittest.TestCase):
+
+    def test_config_diff(self):
+        """ Test the structural diff between two configurations. """
+        old = {
+            'options': {'hideProject': 'True', 'zoomHistory': 'True'},
+            'layers': {'a/b': {'popup': 'False', 'extent': [0, 0, 1, 1]}},
+        }
+        self.assertListEqual([], config_diff(old, json.loads(json.dumps(old, sort_keys=True))))
+
+        new = {
+            'options': {'hideProject': 'True', 'geolocation': 'True'},
+            'layers': {'a/b': {'popup': 'True', 'extent': [0, 0, 1, 2]}},
+        }
+        self.assertListEqual(
+            [
+                {'op': 'remove', 'path': '/options/zoomHistory', 'old': 'True'},
+                {'op': 'add', 'path': '/options/geolocation', 'new': 'True'},
+                {'op': 'replace', 'path': '/layers/a~1b/popup', 'old': 'False', 'new': 'True'},
+                {'op': 'replace', 'path': '/layers/a~1b/extent', 'old': [0, 0, 1, 1], 'new': [0, 0, 1, 2]},
+            ],
+            config_diff(old, new),
+        )
+
+        # Same value, but not the same type
+        self.assertEqual('replace', config_diff({'a': True}, {'a': 1})[0]['op'])
+
+    def test_cfg_file_diff(self):
+        """ Test the diff with a CFG file. """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'project.qgs.cfg')
+            self.assertEqual('add', cfg_file_diff(path, '{}')[0]['op'])
+
+            with open(path, 'w') as fp:
+                json.dump({'options': {}}, fp)
+            self.assertListEqual([], cfg_file_diff(path, '{"options": {}}'))
@@ -0,0 +1,101 @@
+"""Test the layer extent strategies of the Lizmap API."""
+
+import json
+import os
+import tempfile
+import time
+import unittest
+import zipfile
+
+from qgis.core import QgsVectorLayer
+
+from lizmap.lizmap_api.extent import (
+    EXTENT_CACHE_EXPIRATION,
+    ExtentCache,
+    ExtentStrategy,
+    LayerExtentResolver,
+    source_validator,
+)
+from lizmap.lizmap_api.project_xml import read_layers_metadata
+from lizmap.qgis_plugin_tools.tools.resources import plugin_test_data_path
+
+__copyright__ = 'Copyright 2023, 3Liz'
+__license__ = 'GPL version 3'
+__email__ = 'info@3liz.org'
+
+
+class TestApiExtent(unittest.TestCase):
+
+    def test_project_strategy(self):
+        """ Test the extent is read from the project XML metadata if available. """
+        layer = QgsVectorLayer(plugin_test_data_path('lines.geojson'), 'lines', 'ogr')
+        resolver = LayerExtentResolver(ExtentStrategy.Project, xml_layers={layer.id(): {'extent': [0, 0, 1, 1]}})
+        self.assertListEqual([0, 0, 1, 1], resolver.extent(layer))
+
+        # Not in the project yet
+        resolver = LayerExtentResolver(ExtentStrategy.Project)
+        extent = layer.extent()
+        self.assertListEqual(
+            [extent.xMinimum(), extent.yMinimum(), extent.xMaximum(), extent.yMaximum()], resolver.extent(layer))
+
+    def test_project_xml_qgz(self):
+        """ Test the layer metadata is read from a qgz project, or empty if it's not a project. """
+        project = (
+            '<qgis><projectlayers>'
+            '<maplayer type="vector" geometry="Line"><id>lines_id</id>'
+            '<extent><xmin>0</xmin><ymin>1</ymin><xmax>2</xmax><ymax>3</ymax></extent>'
+            '</maplayer>'
+            '</projectlayers></qgis>'
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'project.qgz')
+            with zipfile.ZipFile(path, 'w') as archive:
+                archive.writestr('project.qgs', project)
+            self.assertDictEqual(
+                {'lines_id': {'extent': [0, 1, 2, 3], 'geometryType': 'line'}}, read_layers_metadata(path))
+
+            path = os.path.join(directory, 'broken.qgs')
+            with open(path, 'w') as f:
+                f.write('<qgis><projectlayers>')
+            self.assertDictEqual({}, read_layers_metadata(path))
+
+    def test_cache(self):
+        """ Test the extent cache is saved and validated with the file. """
+        layer = QgsVectorLayer(plugin_test_data_path('lines.geojson'), 'lines', 'ogr')
+        validator = source_validator(layer)
+        self.assertIsNotNone(validator)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cache.json')
+            cache = ExtentCache(path)
+            resolver = LayerExtentResolver(ExtentStrategy.Exact, cache)
+            extent = resolver.extent(layer)
+            cache.save()
+            self.assertTrue(os.path.exists(path))
+
+            key = ExtentCache.key(layer, ExtentStrategy.Exact)
+            cache = ExtentCache(path)
+            self.assertListEqual(extent, cache.get(key, validator))
+            self.assertIsNone(cache.get(key, 'another validator'))
+            self.assertIsNone(cache.get(ExtentCache.key(layer, ExtentStrategy.Estimated), validator))
+
+    def test_cache_eviction(self):
+        """ Test the data source is not in the cache, and old entries are removed. """
+        layer = QgsVectorLayer(plugin_test_data_path('lines.geojson'), 'lines', 'ogr')
+        key = ExtentCache.key(layer, ExtentStrategy.Exact)
+        self.assertNotIn(layer.source(), key)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cache.json')
+            entries = {
+                key: {'validator': None, 'time': time.time(), 'extent': [0, 0, 1, 1]},
+                'a' * 64: {'validator': None, 'time': time.time() - EXTENT_CACHE_EXPIRATION - 1, 'extent': [0, 0, 1, 1]},
+                'exact|postgres|password=secret': {'validator': None, 'time': time.time(), 'extent': [0, 0, 1, 1]},
+            }
+            with open(path, 'w') as f:
+                json.dump(entries, f)
+
+            cache = ExtentCache(path)
+            cache.save()
+            with open(path) as f:
+                self.assertListEqual([key], list(json.load(f).keys()))
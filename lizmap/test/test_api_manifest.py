@@ -0,0 +1,103 @@
+"""Test the manifest of the incremental mode of the Lizmap API."""
+
+import tempfile
+import unittest
+import zipfile
+
+from pathlib import Path
+
+from lizmap.lizmap_api.manifest import (
+    Manifest,
+    embedded_projects,
+    project_digest,
+)
+
+__copyright__ = 'Copyright 2023, 3Liz'
+__license__ = 'GPL version 3'
+__email__ = 'info@3liz.org'
+
+PROJECT = """<qgis version="3.28">
+  <layer-tree-group>
+    <layer-tree-group name="embedded" embedded="1" project="./sub/child.qgs"/>
+  </layer-tree-group>
+  <projectlayers>
+    <maplayer embedded="1" project="./other.qgs" id="lines_id"/>
+  </projectlayers>
+</qgis>
+"""
+
+CHILD = """<qgis version="3.28">
+  <projectlayers>
+    <maplayer embedded="1" project="../other.qgs" id="points_id"/>
+  </projectlayers>
+</qgis>
+"""
+
+
+class TestApiManifest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = Path(self.directory.name)
+        self.project = self.path.joinpath('project.qgs')
+        self.project.write_text(PROJECT)
+        self.path.joinpath('sub').mkdir()
+        self.path.joinpath('sub', 'child.qgs').write_text(CHILD)
+        self.path.joinpath('other.qgs').write_text('<qgis/>')
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_embedded_projects(self):
+        """ Test embedded projects are found recursively, only once. """
+        self.assertListEqual(
+            sorted([str(self.path.joinpath('other.qgs')), str(self.path.joinpath('sub', 'child.qgs'))]),
+            embedded_projects(str(self.project)),
+        )
+
+    def test_embedded_projects_qgz(self):
+        """ Test embedded projects are read from a qgz project, and a broken archive is ignored. """
+        project = self.path.joinpath('project.qgz')
+        with zipfile.ZipFile(str(project), 'w') as archive:
+            archive.writestr('project.qgs', PROJECT)
+            archive.writestr('project.qgd', b'')
+        self.assertListEqual(
+            sorted([str(self.path.joinpath('other.qgs')), str(self.path.joinpath('sub', 'child.qgs'))]),
+            embedded_projects(str(project)),
+        )
+
+        broken = self.path.joinpath('broken.qgz')
+        with zipfile.ZipFile(str(broken), 'w') as archive:
+            archive.writestr('project.qgd', b'')
+        self.assertListEqual([], embedded_projects(str(broken)))
+        self.assertTrue(project_digest(str(broken)))
+
+    def test_digest(self):
+        """ Test the digest changes with the project, the embedded projects and the options. """
+        digest = project_digest(str(self.project), options={'server': False})
+        self.assertEqual(digest, project_digest(str(self.project), options={'server': False}))
+        self.assertNotEqual(digest, project_digest(str(self.project), options={'server': True}))
+
+        self.path.joinpath('other.qgs').write_text('<qgis version="3.30"/>')
+        self.assertNotEqual(digest, project_digest(str(self.project), options={'server': False}))
+
+    def test_up_to_date(self):
+        """ Test the manifest detects unchanged projects and modified outputs. """
+        output = self.path.joinpath('project.qgs.cfg')
+        output.write_text('{}')
+        manifest_path = str(self.path.joinpath('manifest.json'))
+
+        manifest = Manifest(manifest_path)
+        digest = project_digest(str(self.project))
+        self.assertFalse(manifest.is_up_to_date(str(self.project), digest, str(output)))
+
+        manifest.update(str(self.project), digest, str(output))
+        manifest.save()
+
+        manifest = Manifest(manifest_path)
+        self.assertTrue(manifest.is_up_to_date(str(self.project), digest, str(output)))
+        self.assertFalse(manifest.is_up_to_date(str(self.project), 'another digest', str(output)))
+
+        # The CFG has been edited by hand
+        output.write_text('{"options": {}}')
+        self.assertFalse(manifest.is_up_to_date(str(self.project), digest, str(output)))
@@ -0,0 +1,35 @@
+"""Test the profiler of the Lizmap API."""
+
+import unittest
+
+from lizmap.lizmap_api.profiler import Profiler
+
+__copyright__ = 'Copyright 2023, 3Liz'
+__license__ = 'GPL version 3'
+__email__ = 'info@3liz.org'
+
+
+class TestApiProfiler(unittest.TestCase):
+
+    def test_report(self):
+        """ Test phases and slowest layers are reported. """
+        profiler = Profiler(slowest=2)
+        with profiler.phase('layer_options'):
+            for name in ('a', 'b', 'c'):
+                with profiler.layer(name):
+                    _ = [0] * (10000 if name == 'b' else 10)
+        profiler.stop()
+
+        report = profiler.report()
+        self.assertEqual(['layer_options'], [phase['name'] for phase in report['phases']])
+        self.assertEqual(3, report['layers']['count'])
+        self.assertEqual(2, len(report['layers']['slowest']))
+
+    def test_disabled(self):
+        """ Test nothing is recorded when disabled. """
+        profiler = Profiler(enabled=False)
+        with profiler.phase('project_read'):
+            with profiler.layer('a'):
+                pass
+        self.assertListEqual([], profiler.report()['phases'])
+        self.assertEqual(0, profiler.report()['layers']['count'])
@@ -0,0 +1,71 @@
+"""Test the watch mode of the Lizmap API."""
+
+import os
+import tempfile
+import unittest
+
+from pathlib import Path
+
+from lizmap.lizmap_api.watch import ProjectWatcher
+
+__copyright__ = 'Copyright 2023, 3Liz'
+__license__ = 'GPL version 3'
+__email__ = 'info@3liz.org'
+
+PROJECT = """<qgis version="3.28">
+  <projectlayers>
+    <maplayer embedded="1" project="./common/base.qgs" id="lines_id"/>
+  </projectlayers>
+</qgis>
+"""
+
+
+class TestApiWatch(unittest.TestCase):
+
+    def test_outdated_projects(self):
+        """ Test projects are regenerated when they, their embedded projects or the template change. """
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory)
+            path.joinpath('common').mkdir()
+            base = path.joinpath('common', 'base.qgs')
+            base.write_text('<qgis/>')
+            project = path.joinpath('project.qgs')
+            project.write_text(PROJECT)
+            template = path.joinpath('template.json')
+            template.write_text('{}')
+
+            watcher = ProjectWatcher([directory], template=str(template))
+            self.assertSetEqual(set(), watcher.changed_files())
+
+            os.utime(str(project), ns=(0, 0))
+            changed = watcher.changed_files()
+            self.assertSetEqual({str(project)}, changed)
+            self.assertListEqual([str(project)], watcher.outdated_projects(changed))
+
+            # The embedded project is also a project in the directory
+            base.write_text('<qgis version="3.30"/>')
+            changed = watcher.changed_files()
+            self.assertListEqual(sorted([str(base), str(project)]), sorted(watcher.outdated_projects(changed)))
+
+            template.write_text('{"options": {}}')
+            changed = watcher.changed_files()
+            self.assertEqual(2, len(watcher.outdated_projects(changed)))
+
+    def test_acknowledge(self):
+        """ Test a project saved during its regeneration is still detected as changed. """
+        with tempfile.TemporaryDirectory() as directory:
+            project = Path(directory).joinpath('project.qgs')
+            project.write_text('<qgis/>')
+            watcher = ProjectWatcher([directory])
+
+            os.utime(str(project), ns=(0, 0))
+            self.assertSetEqual({str(project)}, watcher.changed_files())
+
+            # Signatures taken before the generation, then the project is saved by the user
+            signatures = watcher.signatures([str(project)])
+            project.write_text('<qgis version="3.30"/>')
+            watcher.acknowledge(signatures)
+            self.assertSetEqual({str(project)}, watcher.changed_files())
+
+            watcher.acknowledge(watcher.signatures([str(project)]))
+            self.assertSetEqual(set(), watcher.changed_files())
@@ -0,0 +1,83 @@
+"""Test the time needed to import the plugin."""
+
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+from pathlib import Path
+
+__copyright__ = 'Copyright 2023, 3Liz'
+__license__ = 'GPL version 3'
+__email__ = 'info@3liz.org'
+
+# Maximum time to import the plugin, without QGIS itself, in milliseconds
+# The time depends on the machine, it's checked only if the environment variable is set
+IMPORT_TIME_BUDGET = 2000
+IMPORT_TIME_VARIABLE = 'LIZMAP_TEST_IMPORT_TIME'
+
+# Modules which must be imported only when the dialog is opened
+DEFERRED_MODULES = (
+    'lizmap.dialogs.html_editor',
+    'lizmap.dialogs.lizmap_popup',
+    'lizmap.dialogs.main',
+    'lizmap.dialogs.server_wizard',
+    'lizmap.dialogs.wizard_group',
+    'lizmap.forms.atlas_edition',
+    'lizmap.forms.dataviz_edition',
+    'lizmap.forms.edition_edition',
+    'lizmap.server_ftp',
+    'lizmap.server_lwc',
+    'lizmap.table_manager.base',
+    'lizmap.version_checker',
+    'qgis.PyQt.QtWebKit',
+    'qgis.PyQt.QtWebKitWidgets',
+)
+
+# QGIS is already loaded when the plugin is imported
+QGIS_IMPORTS = 'import qgis.core, qgis.gui, qgis.PyQt.QtWidgets; '
+
+
+class TestImportTime(unittest.TestCase):
+
+    @staticmethod
+    def run_python(*args: str) -> subprocess.CompletedProcess:
+        """ Run a new Python interpreter, to have a fresh sys.modules. """
+        root = str(Path(__file__).parent.parent.parent)
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join([root, env.get('PYTHONPATH', '')])
+        return subprocess.run(
+            [sys.executable, *args], cwd=root, env=env, capture_output=True, text=True, check=True)
+
+    def test_deferred_imports(self):
+        """ Test dialogs, forms and WebKit are not imported with the plugin. """
+        result = self.run_python(
+            '-c', 'import json, sys; import lizmap.plugin; print(json.dumps(list(sys.modules.keys())))')
+        modules = json.loads(result.stdout.splitlines()[-1])
+        self.assertIn('lizmap.plugin', modules)
+        self.assertListEqual([], [m for m in DEFERRED_MODULES if m in modules])
+
+    @unittest.skipUnless(os.environ.get(IMPORT_TIME_VARIABLE), "{} is not set".format(IMPORT_TIME_VARIABLE))
+    def test_import_time_budget(self):
+        """ Test the import of the plugin with "python -X importtime", against the budget. """
+        result = self.run_python('-X', 'importtime', '-c', QGIS_IMPORTS + 'import lizmap.plugin')
+        cumulative = 0
+        for line in result.stderr.splitlines():
+            # import time: self [us] | cumulative | imported package
+            if not line.startswith('import time:'):
+                continue
+            _, time_cumulative, package = line[len('import time:'):].split('|')
+            # Only top level imports, nested imports are already in the cumulative time
+            if package.strip() in ('lizmap', 'lizmap.plugin') and not package.startswith('  '):
+                cumulative += int(time_cumulative)
+
+        self.assertGreater(cumulative, 0, result.stderr)
+        self.assertLess(
+            cumulative / 1000,
+            IMPORT_TIME_BUDGET,
+            'Importing the plugin took {} ms, the budget is {} ms'.format(cumulative / 1000, IMPORT_TIME_BUDGET))
+
+
+if __name__ == '__main__':
+    unittest.main()
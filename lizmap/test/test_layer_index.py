@@ -0,0 +1,65 @@
+"""Test the layer index."""
+
+import unittest
+
+from qgis.core import QgsProject, QgsVectorLayer
+
+from lizmap.layer_index import LayerIndex
+from lizmap.qgis_plugin_tools.tools.resources import plugin_test_data_path
+
+__copyright__ = 'Copyright 2023, 3Liz'
+__license__ = 'GPL version 3'
+__email__ = 'info@3liz.org'
+
+
+class TestLayerIndex(unittest.TestCase):
+
+    def test_signals(self):
+        """ Test the index follows layers added and removed from the project. """
+        project = QgsProject()
+        index = LayerIndex(project)
+        self.assertEqual(0, len(index))
+        changed = []
+        index.add_listener(changed.append)
+
+        layer = QgsVectorLayer(plugin_test_data_path('lines.geojson'), 'lines', 'ogr')
+        layer_id = layer.id()
+        project.addMapLayer(layer)
+        self.assertIn(layer_id, index)
+        self.assertEqual(layer, index.layer(layer_id))
+        self.assertIsNone(index.layer('unknown'))
+
+        layer.setName('renamed')
+        self.assertListEqual([layer_id], changed)
+
+        # Removed layers are handled with the signal layersWillBeRemoved of the project, not by the listeners
+        project.removeMapLayer(layer_id)
+        self.assertNotIn(layer_id, index)
+        self.assertIsNone(index.layer(layer_id))
+        self.assertListEqual([layer_id], changed)
+
+        index.disconnect()
+
+    def test_metadata(self):
+        """ Test the metadata of a layer is computed again when the layer changes. """
+        project = QgsProject()
+        index = LayerIndex(project)
+
+        layer = QgsVectorLayer(plugin_test_data_path('lines.geojson'), 'lines', 'ogr')
+        project.addMapLayer(layer)
+
+        metadata = index.metadata(layer.id())
+        self.assertEqual('lines', metadata.name)
+        self.assertEqual(layer.crs().authid(), metadata.crs)
+        self.assertEqual(layer.geometryType(), metadata.geometry_type)
+        self.assertIsNotNone(metadata.field_icon('id'))
+        self.assertIsNone(metadata.field_icon('unknown'))
+        self.assertIs(metadata, index.metadata(layer.id()))
+
+        layer.setName('renamed')
+        self.assertEqual('renamed', index.metadata(layer.id()).name)
+
+        project.removeMapLayer(layer.id())
+        self.assertIsNone(index.metadata('unknown'))
+
+        index.disconnect()
@@ -5,6 +5,7 @@ from qgis.testing import unittest
 from qgis.testing.mocked import get_iface
 
 from lizmap.definitions.definitions import LayerProperties
+from lizmap.layer_tree_model import LayerTreeNode
 from lizmap.plugin import Lizmap
 from lizmap.qgis_plugin_tools.tools.resources import plugin_test_data_path
 from lizmap.tools import layer_property
@@ -22,6 +23,25 @@ class TestLayerTree(unittest.TestCase):
         layer.setDataUrl('https://hello.world')
         self.assertEqual('https://hello.world', layer_property(layer, LayerProperties.DataUrl))
 
+    def test_layer_tree_node(self):
+        """ Test a node stores only values different from the defaults. """
+        defaults = {'title': '', 'popup': False, 'group_visibility': []}
+        node = LayerTreeNode('lines_id', 'layer', defaults)
+        self.assertEqual('', node['title'])
+        self.assertIn('popup', node)
+
+        node['popup'] = True
+        node['title'] = ''
+        self.assertTrue(node['popup'])
+        self.assertEqual(1, len(node._values))
+
+        node['popup'] = False
+        self.assertEqual(0, len(node._values))
+
+        # The shared default is never modified
+        node['group_visibility'].append('admins')
+        self.assertListEqual([], defaults['group_visibility'])
+
     def test_string_to_list(self):
         """ Test about text to JSON list. """
         lizmap = Lizmap(get_iface())
@@ -108,3 +128,56 @@ class TestLayerTree(unittest.TestCase):
         hard_coded_config[layer_name]['link'] = ''
         lizmap.process_node(project.layerTreeRoot(), None, hard_coded_config)
         self.assertEqual('', lizmap.myDic[layer.id()]['link'])
+
+    def test_layer_tree_sync(self):
+        """ Test the Lizmap layer tree follows the QGIS layer tree without being built again. """
+        project = QgsProject.instance()
+        project.clear()
+        root = project.layerTreeRoot()
+
+        lizmap = Lizmap(get_iface())
+        lizmap.populate_layer_tree()
+        model = lizmap.dlg.layer_tree.model()
+        self.assertEqual(0, model.rowCount())
+
+        layer = QgsVectorLayer(plugin_test_data_path('lines.geojson'), 'lines', 'ogr')
+        project.addMapLayer(layer)
+        self.assertEqual(1, model.rowCount())
+        self.assertEqual('lines', lizmap.layerList[layer.id()]['name'])
+        lizmap.layerList[layer.id()]['abstract'] = 'Edited in the plugin'
+
+        group = root.addGroup('group')
+        self.assertEqual(2, model.rowCount())
+        group_node = lizmap.layerList['group']
+
+        # Move the layer in the group, like a drag&drop
+        node = root.findLayer(layer.id())
+        group.insertChildNode(0, node.clone())
+        root.removeChildNode(node)
+        self.assertEqual(1, model.rowCount())
+        self.assertEqual(1, len(group_node.children))
+        self.assertEqual(layer.id(), group_node.children[0].id)
+        self.assertEqual('Edited in the plugin', lizmap.layerList[layer.id()]['abstract'])
+
+        group.setName('renamed')
+        self.assertNotIn('group', lizmap.layerList)
+        self.assertEqual('renamed', lizmap.layerList['renamed']['name'])
+        self.assertEqual('renamed', model.data(model.node_index(group_node)))
+
+        # The renamed group is found from its previous name, not from its position
+        other = root.insertGroup(0, 'other')
+        other_node = lizmap.layerList['other']
+        other.setName('second')
+        self.assertEqual('second', lizmap.layerList['second']['name'])
+        self.assertIs(other_node, lizmap.layerList['second'])
+        self.assertIs(group_node, lizmap.layerList['renamed'])
+        root.removeChildNode(other)
+
+        layer.setName('new name')
+        self.assertEqual('new name', lizmap.layerList[layer.id()]['name'])
+
+        project.removeMapLayer(layer.id())
+        self.assertNotIn(layer.id(), lizmap.layerList)
+        self.assertEqual(0, len(group_node.children))
+
+        project.clear()
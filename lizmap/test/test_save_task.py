@@ -0,0 +1,61 @@
+"""Test the save task."""
+
+from qgis.testing import unittest
+
+from lizmap.save_task import SaveTask
+
+__copyright__ = 'Copyright 2023, 3Liz'
+__license__ = 'GPL version 3'
+__email__ = 'info@3liz.org'
+
+
+class TestSaveTask(unittest.TestCase):
+
+    def test_stages(self):
+        """ Test all stages are run in order. """
+        called = []
+        stages = [
+            ('first', lambda: called.append('first')),
+            ('second', lambda: called.append('second')),
+        ]
+        task = SaveTask('Saving', stages)
+        self.assertTrue(task.run())
+        self.assertListEqual(['first', 'second'], called)
+        self.assertIsNone(task.error)
+        self.assertEqual(100, task.progress())
+
+    def test_error(self):
+        """ Test the task stops on the first error. """
+        called = []
+
+        def failing():
+            raise OSError('Disk is full')
+
+        stages = [
+            ('first', lambda: 'Not allowed'),
+            ('second', lambda: called.append('second')),
+        ]
+        task = SaveTask('Saving', stages)
+        self.assertFalse(task.run())
+        self.assertEqual('Not allowed', task.error)
+        self.assertListEqual([], called)
+
+        task = SaveTask('Saving', [('write', failing)])
+        self.assertFalse(task.run())
+        self.assertEqual('Disk is full', task.error)
+
+    def test_cancel(self):
+        """ Test a canceled task does not run the next stages. """
+        called = []
+        task = SaveTask('Saving', [])
+        task.stages = [
+            ('first', task.cancel),
+            ('second', lambda: called.append('second')),
+        ]
+        self.assertFalse(task.run())
+        self.assertListEqual([], called)
+
+
+if __name__ == "__main__":
+    from qgis.testing import start_app
+    start_app()
@@ -0,0 +1,157 @@
+"""Test the compiled serialisers of the options."""
+
+import unittest
+
+from qgis.core import QgsProject
+
+from lizmap.definitions.definitions import LwcVersions
+from lizmap.lizmap_api.config import LizmapConfig
+from lizmap.serializers import OptionSerializers
+
+__copyright__ = 'Copyright 2023, 3Liz'
+__license__ = 'GPL version 3'
+__email__ = 'info@3liz.org'
+
+LAYER_DEFINITIONS = {
+    'title': {'wType': 'text', 'type': 'string', 'default': '', 'isMetadata': True, 'widget': True},
+    'popupMaxFeatures': {'wType': 'spinbox', 'type': 'integer', 'default': 10, 'widget': True},
+    'popup': {'wType': 'checkbox', 'type': 'boolean', 'default': False, 'widget': True},
+    'popup_allow_download': {
+        'wType': 'checkbox', 'type': 'boolean', 'default': True, 'use_proper_boolean': True, 'widget': True},
+    'noLegendImage': {
+        'wType': 'checkbox', 'type': 'boolean', 'default': False, 'max_version': LwcVersions.Lizmap_3_5},
+    'legend_image_option': {
+        'wType': 'list',
+        'type': 'string',
+        'default': 'hide_at_startup',
+        'list': [('hide_at_startup', ), ('expand_at_startup', ), ('disabled', )],
+        'min_version': LwcVersions.Lizmap_3_6,
+        'widget': True,
+    },
+    'popupTemplate': {'wType': 'text', 'type': 'string', 'default': ''},
+}
+
+
+class FakeCheckBox:
+
+    def __init__(self, checked: bool):
+        self.checked = checked
+
+    def isChecked(self) -> bool:
+        return self.checked
+
+
+class FakeLineEdit:
+
+    def __init__(self, text: str):
+        self.value = text
+
+    def text(self) -> str:
+        return self.value
+
+
+class TestOptionSerializers(unittest.TestCase):
+
+    def test_layer_writers(self):
+        """ Test options of a layer, according to the version. """
+        serializers = OptionSerializers({}, LAYER_DEFINITIONS)
+        node = {
+            'title': 'A layer',
+            'popupMaxFeatures': 'not an integer',
+            'popup': True,
+            'popup_allow_download': False,
+            'noLegendImage': False,
+            'legend_image_option': 'disabled',
+            'popupTemplate': '',
+        }
+
+        options = {key: write(node) for key, write in serializers.layer_writers(LwcVersions.Lizmap_3_6)}
+        self.assertDictEqual(
+            {
+                'title': 'A layer',
+                'popupMaxFeatures': 1,
+                'popup': 'True',
+                'popup_allow_download': False,
+                'legend_image_option': 'disabled',
+                'popupTemplate': '',
+            },
+            options,
+        )
+
+        options = {key: write(node) for key, write in serializers.layer_writers(LwcVersions.Lizmap_3_5)}
+        self.assertNotIn('legend_image_option', options)
+        self.assertEqual('True', options['noLegendImage'])
+
+        # Compiled only once per version
+        self.assertIs(
+            serializers.layer_writers(LwcVersions.Lizmap_3_6), serializers.layer_writers(LwcVersions.Lizmap_3_6))
+
+    def test_layer_readers(self):
+        """ Test options of a layer read from the CFG file. """
+        serializers = OptionSerializers({}, LAYER_DEFINITIONS)
+        config = {
+            'title': 'From CFG',
+            'popupMaxFeatures': '',
+            'popup': 'True',
+            'noLegendImage': 'True',
+            'legend_image_option': 'expand_at_startup',
+            'popupTemplate': '<p>Template</p>',
+        }
+
+        node = {}
+        for _, read in serializers.layer_readers():
+            read(node, config, False)
+        self.assertDictEqual(
+            {
+                'title': 'From CFG',
+                'popup': True,
+                'legend_image_option': 'disabled',
+                'popupTemplate': '<p>Template</p>',
+            },
+            node,
+        )
+
+        # The title of the layer is kept
+        node = {}
+        for _, read in serializers.layer_readers():
+            read(node, config, True)
+        self.assertNotIn('title', node)
+
+    def test_global_writers(self):
+        """ Test global options read from the widgets. """
+        definitions = {
+            'mapScales': {'wType': 'text', 'type': 'intlist', 'default': [10000, 25000]},
+            'hideHeader': {'wType': 'checkbox', 'type': 'boolean', 'default': False},
+            'hideProject': {'wType': 'checkbox', 'type': 'boolean', 'default': False, 'always_export': True},
+            'googleKey': {'wType': 'text', 'type': 'string', 'default': ''},
+        }
+        widgets = {
+            'mapScales': FakeLineEdit('1000, 5000, a'),
+            'hideHeader': FakeCheckBox(False),
+            'hideProject': FakeCheckBox(False),
+            'googleKey': FakeLineEdit(' \t'),
+        }
+        serializers = OptionSerializers(definitions, {})
+
+        options = {}
+        for key, read, export in serializers.global_writers(LwcVersions.Lizmap_3_6):
+            value = read(widgets[key])
+            if export(value):
+                options[key] = value
+
+        self.assertDictEqual({'mapScales': [1000, 5000], 'hideProject': 'False'}, options)
+
+    def test_global_writers_definitions(self):
+        """ Test global writers are compiled from the definitions used by the plugin, without the metadata. """
+        definitions = LizmapConfig(project=QgsProject()).globalOptionDefinitions
+        self.assertIn('metadata', definitions)
+        serializers = OptionSerializers(definitions, {})
+
+        for lwc_version in LwcVersions:
+            keys = [key for key, _, _ in serializers.global_writers(lwc_version)]
+            self.assertNotIn('metadata', keys)
+            self.assertIn('mapScales', keys)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+"""Test the cache of the metadata of the servers."""
+
+import os
+import tempfile
+import time
+import unittest
+
+from pathlib import Path
+
+from lizmap.server_cache import (
+    DEFAULT_MAX_AGE,
+    MAX_DAYS,
+    MetadataCache,
+    parse_cache_control,
+)
+
+__copyright__ = 'Copyright 2023, 3Liz'
+__license__ = 'GPL version 3'
+__email__ = 'info@3liz.org'
+
+METADATA = {'info': {'version': '3.6.4'}}
+URL = 'https://demo.lizmap.com/lizmap/'
+
+
+class TestServerCache(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = Path(self.directory.name)
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_parse_cache_control(self):
+        """ Test directives of the Cache-Control header. """
+        self.assertDictEqual(
+            {'private': None, 'max-age': '60', 'stale-while-revalidate': '30'},
+            parse_cache_control('private, Max-Age=60,stale-while-revalidate="30"'),
+        )
+        self.assertDictEqual({}, parse_cache_control(''))
+
+    def test_freshness(self):
+        """ Test the metadata is fresh, then stale but usable, then expired. """
+        cache = MetadataCache(self.path)
+        self.assertIsNone(cache.entry('demo', URL, 'auth'))
+
+        now = time.time()
+        headers = {'etag': '"abc"', 'cache-control': 'max-age=60, stale-while-revalidate=30'}
+        entry = cache.store('demo/server', URL, 'auth', METADATA, headers, now)
+        self.assertTrue(entry.is_fresh(now + 59))
+        self.assertFalse(entry.is_fresh(now + 61))
+        self.assertTrue(entry.is_usable(now + 61))
+        self.assertFalse(entry.is_usable(now + 91))
+        self.assertDictEqual({'If-None-Match': '"abc"'}, entry.request_headers())
+
+        # Without max-age
+        headers = {'last-modified': 'Wed, 21 Oct 2015 07:28:00 GMT'}
+        entry = cache.store('default', URL, 'auth', METADATA, headers, now)
+        self.assertTrue(entry.is_fresh(now + DEFAULT_MAX_AGE - 1))
+        self.assertTrue(entry.is_usable(now + DEFAULT_MAX_AGE + 1))
+        self.assertFalse(entry.is_usable(now + MAX_DAYS * 86400))
+        self.assertDictEqual({'If-Modified-Since': 'Wed, 21 Oct 2015 07:28:00 GMT'}, entry.request_headers())
+
+        # Always asking the server
+        headers = {'cache-control': 'no-store, no-cache, must-revalidate'}
+        entry = cache.store('no-cache', URL, 'auth', METADATA, headers, now)
+        self.assertFalse(entry.is_fresh(now))
+        self.assertTrue(entry.is_usable(now))
+
+    def test_revalidated(self):
+        """ Test the metadata read from the disk, then revalidated by the server. """
+        now = time.time()
+        headers = {'etag': '"abc"', 'cache-control': 'max-age=60'}
+        MetadataCache(self.path).store('demo', URL, 'auth', METADATA, headers, now)
+        self.assertTrue(self.path.joinpath('demo.json').exists())
+
+        cache = MetadataCache(self.path)
+        entry = cache.entry('demo', URL, 'auth')
+        self.assertDictEqual(METADATA, entry.content)
+        self.assertEqual('"abc"', entry.etag)
+        self.assertFalse(entry.is_fresh(now + 120))
+
+        # The validators are kept when the server doesn't send them again
+        entry = cache.revalidated('demo', URL, 'auth', {'cache-control': 'max-age=600'}, now + 120)
+        self.assertTrue(entry.is_fresh(now + 600))
+        self.assertEqual('"abc"', entry.etag)
+        self.assertIsNone(cache.revalidated('other', URL, 'auth', {}, now))
+
+    def test_other_server(self):
+        """ Test the metadata is not used for another URL or another login with the same server name. """
+        cache = MetadataCache(self.path)
+        cache.store('demo', URL, 'auth', METADATA, {'cache-control': 'max-age=60'})
+        self.assertIsNotNone(cache.entry('demo', URL, 'auth'))
+        self.assertIsNone(cache.entry('demo', 'https://other.lizmap.com/', 'auth'))
+        self.assertIsNone(cache.entry('demo', URL, 'another_auth'))
+        self.assertIsNone(MetadataCache(self.path).entry('demo', URL, ''))
+
+        cache.store('anonymous', URL, None, METADATA, {})
+        self.assertIsNotNone(cache.entry('anonymous', URL, ''))
+
+    def test_previous_cache(self):
+        """ Test metadata saved by a previous version, without HTTP metadata. """
+        self.path.joinpath('demo.json').write_text('{"info": {"version": "3.5.0"}}')
+        entry = MetadataCache(self.path).entry('demo', URL, 'auth')
+        self.assertFalse(entry.is_fresh())
+        self.assertTrue(entry.is_usable())
+        self.assertDictEqual({}, entry.request_headers())
+
+        self.path.joinpath('broken.json').write_text('{')
+        self.assertIsNone(MetadataCache(self.path).entry('broken', URL, 'auth'))
+
+    def test_clean(self):
+        """ Test files older than MAX_DAYS are removed. """
+        cache = MetadataCache(self.path)
+        cache.store('old', URL, 'auth', METADATA, {})
+        cache.store('new', URL, 'auth', METADATA, {})
+        old = time.time() - (MAX_DAYS + 1) * 86400
+        os.utime(cache.file('old'), (old, old))
+        os.utime(cache.http_file('old'), (old, old))
+
+        cache.clean()
+        self.assertListEqual(['new.http.json', 'new.json'], sorted(p.name for p in self.path.iterdir()))
+
+        cache.clean(True)
+        self.assertListEqual([], list(self.path.iterdir()))
+
+
+if __name__ == '__main__':
+    unittest.main()
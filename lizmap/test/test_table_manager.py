@@ -3,7 +3,8 @@
 import copy
 
 from qgis.core import QgsProject, QgsVectorLayer
-from qgis.PyQt.QtWidgets import QTableWidget
+from qgis.PyQt.QtCore import Qt
+from qgis.PyQt.QtWidgets import QTableView
 from qgis.testing import unittest
 
 from lizmap.definitions.atlas import AtlasDefinitions
@@ -22,6 +23,7 @@ from lizmap.forms.atlas_edition import AtlasEditionDialog
 from lizmap.qgis_plugin_tools.tools.resources import plugin_test_data_path
 from lizmap.table_manager.base import TableManager
 from lizmap.table_manager.layouts import TableManagerLayouts
+from lizmap.table_manager.model import TableManagerModel
 
 __copyright__ = 'Copyright 2020, 3Liz'
 __license__ = 'GPL version 3'
@@ -45,9 +47,22 @@ class TestTableManager(unittest.TestCase):
             pass
         QgsProject.instance().clear()
 
+    def test_model_remove_rows(self):
+        """ Test to remove many rows at once from the model. """
+        model = TableManagerModel(['layerId'], [('Layer', None)], lambda values: [{}])
+        for i in range(6):
+            model.insert_row(i, {'layerId': 'layer_{}'.format(i)})
+
+        model.remove_rows([2, 3])
+        self.assertListEqual(['layer_0', 'layer_1', 'layer_4', 'layer_5'], [row['layerId'] for row in model.rows])
+
+        model.remove_rows({0, 3})
+        self.assertListEqual(['layer_1', 'layer_4'], [row['layerId'] for row in model.rows])
+        self.assertEqual(2, model.rowCount())
+
     def test_form_filter(self):
         """Test table manager with filter by form."""
-        table = QTableWidget()
+        table = QTableView()
         definitions = FilterByFormDefinitions()
 
         table_manager = TableManager(
@@ -80,9 +95,9 @@ class TestTableManager(unittest.TestCase):
             }
         }
 
-        self.assertEqual(table_manager.table.rowCount(), 0)
+        self.assertEqual(table_manager.model.rowCount(), 0)
         table_manager.from_json(json)
-        self.assertEqual(table_manager.table.rowCount(), 2)
+        self.assertEqual(table_manager.model.rowCount(), 2)
         data = table_manager.to_json(version=LwcVersions.Lizmap_3_6)
 
         expected = {
@@ -135,7 +150,7 @@ class TestTableManager(unittest.TestCase):
     def test_form_filter_3_7(self):
         """ Test to write to 3.6 format. """
         table_manager = TableManager(
-            None, FilterByFormDefinitions(), None, QTableWidget(), None, None, None, None)
+            None, FilterByFormDefinitions(), None, QTableView(), None, None, None, None)
 
         json = {
             '0': {
@@ -153,9 +168,9 @@ class TestTableManager(unittest.TestCase):
             }
         }
 
-        self.assertEqual(table_manager.table.rowCount(), 0)
+        self.assertEqual(table_manager.model.rowCount(), 0)
         table_manager.from_json(json)
-        self.assertEqual(table_manager.table.rowCount(), 1)
+        self.assertEqual(table_manager.model.rowCount(), 1)
         data = table_manager.to_json(version=LwcVersions.Lizmap_3_6)
 
         expected = {
@@ -191,7 +206,7 @@ class TestTableManager(unittest.TestCase):
 
     def test_filter_by_login(self):
         """Test table manager with filter by login."""
-        table = QTableWidget()
+        table = QTableView()
         definitions = FilterByLoginDefinitions()
 
         table_manager = TableManager(
@@ -205,9 +220,9 @@ class TestTableManager(unittest.TestCase):
                 'order': 0
             }
         }
-        self.assertEqual(table_manager.table.rowCount(), 0)
+        self.assertEqual(table_manager.model.rowCount(), 0)
         table_manager.from_json(json)
-        self.assertEqual(table_manager.table.rowCount(), 1)
+        self.assertEqual(table_manager.model.rowCount(), 1)
         data = table_manager.to_json()
 
         expected = {
@@ -223,7 +238,7 @@ class TestTableManager(unittest.TestCase):
 
     def test_layout_definitions(self):
         """ Test layout definitions. """
-        table = QTableWidget()
+        table = QTableView()
         definitions = LayoutsDefinitions()
 
         QgsProject.instance().read(plugin_test_data_path('print.qgs'))
@@ -232,7 +247,7 @@ class TestTableManager(unittest.TestCase):
         table_manager = TableManagerLayouts(
             None, definitions, None, table, None, None, None)
 
-        self.assertEqual(table_manager.table.rowCount(), 0)
+        self.assertEqual(table_manager.model.rowCount(), 0)
         cfg = {
             "list": [
                 {
@@ -252,7 +267,7 @@ class TestTableManager(unittest.TestCase):
             ]
         }
         table_manager.load_qgis_layouts(cfg)
-        self.assertEqual(table_manager.table.rowCount(), 4)
+        self.assertEqual(table_manager.model.rowCount(), 4)
 
         data = table_manager.to_json()
         expected = {
@@ -312,10 +327,48 @@ class TestTableManager(unittest.TestCase):
         }
         self.assertDictEqual(data, expected)
 
+    def test_layout_renamed_removed(self):
+        """ Test layouts renamed and removed in the project. """
+        QgsProject.instance().read(plugin_test_data_path('print.qgs'))
+        manager = QgsProject.instance().layoutManager()
+
+        table_manager = TableManagerLayouts(
+            None, LayoutsDefinitions(), None, QTableView(), None, None, None)
+        table_manager.load_qgis_layouts({})
+        manager.layoutAdded.connect(table_manager.layout_added)
+        manager.layoutRenamed.connect(table_manager.layout_renamed)
+        manager.layoutRemoved.connect(table_manager.layout_removed)
+
+        def names():
+            return [table_manager.model.value(row, 'layout') for row in range(table_manager.model.rowCount())]
+
+        self.assertListEqual(['A4 Landscape', 'Cadastre', 'Local planning', 'Economy'], names())
+
+        # Many layouts renamed at once, including a swap of names
+        manager.layoutByName('Cadastre').setName('Temporary')
+        manager.layoutByName('Economy').setName('Cadastre')
+        manager.layoutByName('Temporary').setName('Economy')
+        manager.layoutByName('A4 Landscape').setName('A3 Landscape')
+        self.assertListEqual(['A3 Landscape', 'Economy', 'Local planning', 'Cadastre'], names())
+
+        # Rows moved by the user
+        table_manager.model.move_row(0, 3)
+        manager.layoutByName('Local planning').setName('Planning')
+        self.assertListEqual(['Economy', 'Planning', 'Cadastre', 'A3 Landscape'], names())
+
+        manager.removeLayout(manager.layoutByName('Economy'))
+        self.assertListEqual(['Planning', 'Cadastre', 'A3 Landscape'], names())
+
+        layout = manager.layoutByName('Planning').clone()
+        layout.setName('New layout')
+        manager.addLayout(layout)
+        layout.setName('Renamed layout')
+        self.assertListEqual(['Planning', 'Cadastre', 'A3 Landscape', 'Renamed layout'], names())
+
     def test_dataviz_definitions(self):
         """Test dataviz collections keys."""
         table_manager = TableManager(
-            None, DatavizDefinitions(), None, QTableWidget(), None, None, None, None)
+            None, DatavizDefinitions(), None, QTableView(), None, None, None, None)
         expected = [
             'type', 'title', 'title_popup', 'description', 'layerId', 'x_field', 'aggregation',
             'traces', 'html_template', 'layout', 'popup_display_child_plot', 'trigger_filter', 'stacked',
@@ -325,7 +378,7 @@ class TestTableManager(unittest.TestCase):
 
     def test_remove_extra_field_dataviz(self):
         """Test we can remove an empty field from a trace."""
-        table = QTableWidget()
+        table = QTableView()
         definitions = DatavizDefinitions()
 
         table_manager = TableManager(
@@ -378,7 +431,7 @@ class TestTableManager(unittest.TestCase):
 
     def test_dataviz_legacy_3_3_with_1_trace(self):
         """Test table manager with dataviz format 3.3 with only 1 trace"""
-        table = QTableWidget()
+        table = QTableView()
         definitions = DatavizDefinitions()
 
         table_manager = TableManager(
@@ -455,9 +508,9 @@ class TestTableManager(unittest.TestCase):
         }
         self.assertDictEqual(expected, data)
 
-        self.assertEqual(table_manager.table.rowCount(), 0)
+        self.assertEqual(table_manager.model.rowCount(), 0)
         table_manager.from_json(json)
-        self.assertEqual(table_manager.table.rowCount(), 1)
+        self.assertEqual(table_manager.model.rowCount(), 1)
 
         # To Lizmap 3.4
         data = table_manager.to_json(version=LwcVersions.Lizmap_3_4)
@@ -528,7 +581,7 @@ class TestTableManager(unittest.TestCase):
 
     def test_dataviz_legacy_3_3_with_2_traces(self):
         """Test table manager with dataviz format 3.3."""
-        table = QTableWidget()
+        table = QTableView()
         definitions = DatavizDefinitions()
 
         table_manager = TableManager(
@@ -606,9 +659,9 @@ class TestTableManager(unittest.TestCase):
         }
         self.assertDictEqual(expected, data)
 
-        self.assertEqual(table_manager.table.rowCount(), 0)
+        self.assertEqual(table_manager.model.rowCount(), 0)
         table_manager.from_json(json)
-        self.assertEqual(table_manager.table.rowCount(), 1)
+        self.assertEqual(table_manager.model.rowCount(), 1)
 
         # To Lizmap 3.4
         data = table_manager.to_json(version=LwcVersions.Lizmap_3_4)
@@ -681,7 +734,7 @@ class TestTableManager(unittest.TestCase):
         QgsProject.instance().addMapLayer(layer)
         self.assertTrue(layer.isValid())
 
-        table = QTableWidget()
+        table = QTableView()
         definitions = DatavizDefinitions()
 
         table_manager = TableManager(
@@ -707,9 +760,9 @@ class TestTableManager(unittest.TestCase):
             }
         }
 
-        self.assertEqual(table_manager.table.rowCount(), 0)
+        self.assertEqual(table_manager.model.rowCount(), 0)
         table_manager.from_json(json)
-        self.assertEqual(table_manager.table.rowCount(), 1)
+        self.assertEqual(table_manager.model.rowCount(), 1)
         data = table_manager.to_json()
 
         expected = {
@@ -747,7 +800,7 @@ class TestTableManager(unittest.TestCase):
     def test_dataviz(self):
         """Test we can read dataviz 3.4 format."""
         table_manager = TableManager(
-            None, DatavizDefinitions(), None, QTableWidget(), None, None, None, None)
+            None, DatavizDefinitions(), None, QTableView(), None, None, None, None)
 
         json = {
             '0': {
@@ -824,14 +877,14 @@ class TestTableManager(unittest.TestCase):
         }
         self.assertCountEqual(expected, json_legacy)
 
-        self.assertEqual(table_manager.table.rowCount(), 0)
+        self.assertEqual(table_manager.model.rowCount(), 0)
         table_manager.from_json(json)
-        # self.assertEqual(table_manager.table.rowCount(), 1)
+        # self.assertEqual(table_manager.model.rowCount(), 1)
 
     def test_filter_by_polygon(self):
         """ Test table manager with filter by polygon. """
         table_manager = TableManager(
-            None, FilterByPolygonDefinitions(), None, QTableWidget(), None, None, None, None)
+            None, FilterByPolygonDefinitions(), None, QTableView(), None, None, None, None)
 
         json = {
             'config': {
@@ -848,9 +901,9 @@ class TestTableManager(unittest.TestCase):
                 }
             ]
         }
-        self.assertEqual(table_manager.table.rowCount(), 0)
+        self.assertEqual(table_manager.model.rowCount(), 0)
         table_manager.from_json(json)
-        self.assertEqual(table_manager.table.rowCount(), 1)
+        self.assertEqual(table_manager.model.rowCount(), 1)
 
         output = table_manager.to_json()
         # Global widget are not defined in this test
@@ -860,7 +913,7 @@ class TestTableManager(unittest.TestCase):
 
     def test_tool_tip(self):
         """Test table manager with tooltip layer."""
-        table = QTableWidget()
+        table = QTableView()
         definitions = ToolTipDefinitions()
 
         table_manager = TableManager(
@@ -875,16 +928,16 @@ class TestTableManager(unittest.TestCase):
                 'order': 0
             }
         }
-        self.assertEqual(table_manager.table.rowCount(), 0)
+        self.assertEqual(table_manager.model.rowCount(), 0)
         table_manager.from_json(json)
-        self.assertEqual(table_manager.table.rowCount(), 1)
+        self.assertEqual(table_manager.model.rowCount(), 1)
         data = table_manager.to_json()
         json['lines'].pop('colorGeom')
         self.assertDictEqual(data, json)
 
     def test_attribute_table(self):
         """Test table manager with attribute table."""
-        table = QTableWidget()
+        table = QTableView()
         definitions = AttributeTableDefinitions()
 
         table_manager = TableManager(
@@ -901,9 +954,9 @@ class TestTableManager(unittest.TestCase):
                 'order': 0
             }
         }
-        self.assertEqual(table_manager.table.rowCount(), 0)
+        self.assertEqual(table_manager.model.rowCount(), 0)
         table_manager.from_json(json)
-        self.assertEqual(table_manager.table.rowCount(), 1)
+        self.assertEqual(table_manager.model.rowCount(), 1)
         data = table_manager.to_json()
 
         # Automatically added, so we add it manually for the comparaison
@@ -913,7 +966,7 @@ class TestTableManager(unittest.TestCase):
 
     def test_time_manager_table(self):
         """Test table manager with time manager."""
-        table = QTableWidget()
+        table = QTableView()
         definitions = TimeManagerDefinitions()
 
         table_manager = TableManager(
@@ -930,9 +983,9 @@ class TestTableManager(unittest.TestCase):
                 'order': 0
             }
         }
-        self.assertEqual(table_manager.table.rowCount(), 0)
+        self.assertEqual(table_manager.model.rowCount(), 0)
         table_manager.from_json(json)
-        self.assertEqual(table_manager.table.rowCount(), 1)
+        self.assertEqual(table_manager.model.rowCount(), 1)
         data = table_manager.to_json()
         expected = {
             'lines': {
@@ -954,9 +1007,9 @@ class TestTableManager(unittest.TestCase):
                 'order': 0
             }
         }
-        self.assertEqual(table_manager.table.rowCount(), 0)
+        self.assertEqual(table_manager.model.rowCount(), 0)
         table_manager.from_json(json)
-        self.assertEqual(table_manager.table.rowCount(), 1)
+        self.assertEqual(table_manager.model.rowCount(), 1)
         data = table_manager.to_json()
         self.assertDictEqual(data, expected)
 
@@ -972,15 +1025,15 @@ class TestTableManager(unittest.TestCase):
                 'order': 0
             }
         }
-        self.assertEqual(table_manager.table.rowCount(), 0)
+        self.assertEqual(table_manager.model.rowCount(), 0)
         table_manager.from_json(json)
-        self.assertEqual(table_manager.table.rowCount(), 1)
+        self.assertEqual(table_manager.model.rowCount(), 1)
         data = table_manager.to_json()
         self.assertDictEqual(data, json)
 
     def test_edition_layer(self):
         """Test table manager with edition layer."""
-        table = QTableWidget()
+        table = QTableView()
         definitions = EditionDefinitions()
 
         table_manager = TableManager(
@@ -1028,9 +1081,9 @@ class TestTableManager(unittest.TestCase):
         }
         self.assertDictEqual(expected, json_legacy)
 
-        self.assertEqual(table_manager.table.rowCount(), 0)
+        self.assertEqual(table_manager.model.rowCount(), 0)
         table_manager.from_json(copy.deepcopy(json))
-        self.assertEqual(table_manager.table.rowCount(), 1)
+        self.assertEqual(table_manager.model.rowCount(), 1)
         data = table_manager.to_json()
         json = {
             'lines': {
@@ -1063,7 +1116,7 @@ class TestTableManager(unittest.TestCase):
         QgsProject.instance().addMapLayer(layer_2)
         self.assertTrue(layer_2.isValid())
 
-        table = QTableWidget()
+        table = QTableView()
         definitions = LocateByLayerDefinitions()
 
         table_manager = TableManager(
@@ -1116,9 +1169,9 @@ class TestTableManager(unittest.TestCase):
         }
         self.assertDictEqual(data, expected)
 
-        self.assertEqual(table_manager.table.rowCount(), 0)
+        self.assertEqual(table_manager.model.rowCount(), 0)
         table_manager.from_json(json)
-        self.assertEqual(table_manager.table.rowCount(), 2)
+        self.assertEqual(table_manager.model.rowCount(), 2)
         data = table_manager.to_json()
 
         expected = {
@@ -1144,13 +1197,13 @@ class TestTableManager(unittest.TestCase):
 
     def test_fake_layer_id_table_manager(self):
         """Test we can skip a wrong layer id."""
-        table = QTableWidget()
+        table = QTableView()
         definitions = AtlasDefinitions()
 
         table_manager = TableManager(
             None, definitions, AtlasEditionDialog, table, None, None, None, None)
 
-        self.assertEqual(table.columnCount(), len(definitions.layer_config.keys()))
+        self.assertEqual(table.model().columnCount(), len(definitions.layer_config.keys()))
 
         # JSON from LWC 3.4 and above
         layer_1 = {
@@ -1170,9 +1223,9 @@ class TestTableManager(unittest.TestCase):
                 layer_1
             ]
         }
-        self.assertEqual(table_manager.table.rowCount(), 0)
+        self.assertEqual(table_manager.model.rowCount(), 0)
         table_manager.from_json(json)
-        self.assertEqual(table_manager.table.rowCount(), 0)
+        self.assertEqual(table_manager.model.rowCount(), 0)
 
     def test_table_manager(self):
         """Test about the table manager.
@@ -1182,14 +1235,14 @@ class TestTableManager(unittest.TestCase):
         are not tested
         """
         field = 'id'
-        table = QTableWidget()
+        table = QTableView()
         definitions = AtlasDefinitions()
         definitions._use_single_row = False
 
         table_manager = TableManager(
             None, definitions, AtlasEditionDialog, table, None, None, None, None)
 
-        self.assertEqual(table.columnCount(), len(definitions.layer_config.keys()))
+        self.assertEqual(table.model().columnCount(), len(definitions.layer_config.keys()))
 
         # JSON from LWC 3.4 and above
         layer_1 = {
@@ -1209,17 +1262,25 @@ class TestTableManager(unittest.TestCase):
                 layer_1
             ]
         }
-        self.assertEqual(table_manager.table.rowCount(), 0)
+        self.assertEqual(table_manager.model.rowCount(), 0)
         table_manager.from_json(json)
-        self.assertEqual(table_manager.table.rowCount(), 1)
+        self.assertEqual(table_manager.model.rowCount(), 1)
         data = table_manager.to_json()
         self.assertDictEqual(data, json)
 
+        # Cells are displayed from the values stored in the model
+        model = table_manager.model
+        self.assertEqual(self.layer.id(), model.data(model.index(0, 0), Qt.UserRole))
+        self.assertEqual('lines', model.data(model.index(0, 0), Qt.DisplayRole))
+        column = table_manager.keys.index('highlightGeometry')
+        self.assertTrue(model.data(model.index(0, column), Qt.UserRole))
+        self.assertEqual('✓', model.data(model.index(0, column), Qt.DisplayRole))
+
         # QGIS notify layer has been deleted
         table_manager.layers_has_been_deleted(['another_layer_ID_in_canvas'])
-        self.assertEqual(table_manager.table.rowCount(), 1)
+        self.assertEqual(table_manager.model.rowCount(), 1)
         table_manager.layers_has_been_deleted([self.layer.id()])
-        self.assertEqual(table_manager.table.rowCount(), 0)
+        self.assertEqual(table_manager.model.rowCount(), 0)
 
         data = table_manager.to_json()
         self.assertDictEqual(data, {'layers': []})
@@ -1235,7 +1296,7 @@ class TestTableManager(unittest.TestCase):
             ]
         }
         table_manager.from_json(json)
-        self.assertEqual(table_manager.table.rowCount(), 2)
+        self.assertEqual(table_manager.model.rowCount(), 2)
 
         # noinspection PyProtectedMember
         self.assertDictEqual(
@@ -1247,7 +1308,7 @@ class TestTableManager(unittest.TestCase):
         self.assertDictEqual(data, {'layers': [layer_1, layer_2]})
 
         # We select second row and we move up
-        table.setCurrentCell(1, 0)
+        table.setCurrentIndex(table.model().index(1, 0))
         table_manager.move_layer_up()
 
         # Export and check order
@@ -1255,7 +1316,7 @@ class TestTableManager(unittest.TestCase):
         self.assertDictEqual(data, {'layers': [layer_2, layer_1]})
 
         # We select first row and we move up
-        table.setCurrentCell(0, 0)
+        table.setCurrentIndex(table.model().index(0, 0))
         table_manager.move_layer_up()
         # Nothing happen, we are on top
         data = table_manager.to_json()
@@ -1266,13 +1327,13 @@ class TestTableManager(unittest.TestCase):
         self.assertDictEqual(data, {'layers': [layer_1, layer_2]})
 
         # We select first row and we remove it
-        table.setCurrentCell(0, 0)
+        table.setCurrentIndex(table.model().index(0, 0))
         table_manager.remove_selection()
         data = table_manager.to_json()
         self.assertDictEqual(data, {'layers': [layer_2]})
 
         table_manager.truncate()
-        self.assertEqual(table_manager.table.rowCount(), 0)
+        self.assertEqual(table_manager.model.rowCount(), 0)
 
         # We select first row and we edit it
         # table.selectRow(0)
@@ -1280,7 +1341,7 @@ class TestTableManager(unittest.TestCase):
 
     def test_atlas_missing_json_parameter(self):
         """Test if we can load CFG file with missing parameter."""
-        table = QTableWidget()
+        table = QTableView()
 
         definitions = AtlasDefinitions()
         definitions._use_single_row = False
@@ -1304,27 +1365,27 @@ class TestTableManager(unittest.TestCase):
             ]
         }
 
-        self.assertEqual(table_manager.table.rowCount(), 0)
+        self.assertEqual(table_manager.model.rowCount(), 0)
         table_manager.from_json(json)
-        self.assertEqual(table_manager.table.rowCount(), 1)
+        self.assertEqual(table_manager.model.rowCount(), 1)
         table_manager.truncate()
         new_json = copy.deepcopy(json)
         del new_json['layers'][0]['layer']
         table_manager.from_json(new_json)
         # Layer is mandatory
-        self.assertEqual(table_manager.table.rowCount(), 0)
+        self.assertEqual(table_manager.model.rowCount(), 0)
 
         new_json = copy.deepcopy(json)
         # Trigger filter will take the default value from definitions
         del new_json['layers'][0]['triggerFilter']
         table_manager.from_json(new_json)
-        self.assertEqual(table_manager.table.rowCount(), 1)
+        self.assertEqual(table_manager.model.rowCount(), 1)
         table_manager.truncate()
 
     def test_table_manager_3_3(self):
         """Test we can read/write to LWC 3.3 format."""
         field = 'id'
-        table = QTableWidget()
+        table = QTableView()
         definitions = AtlasDefinitions()
         definitions._use_single_row = False
 
@@ -1344,9 +1405,9 @@ class TestTableManager(unittest.TestCase):
         table_manager = TableManager(
             None, definitions, AtlasEditionDialog, table, None, None, None, None)
 
-        self.assertEqual(table_manager.table.rowCount(), 0)
+        self.assertEqual(table_manager.model.rowCount(), 0)
         table_manager.from_json(json)
-        self.assertEqual(table_manager.table.rowCount(), 1)
+        self.assertEqual(table_manager.model.rowCount(), 1)
 
         data = table_manager.to_json()
         expected = {
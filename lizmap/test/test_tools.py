@@ -1,12 +1,17 @@
 """Test tools."""
 
+import hashlib
+import json
+import os
 import unittest
 
 from qgis.core import QgsField, QgsVectorLayer
 from qgis.PyQt.QtCore import QVariant
 
 from lizmap.qgis_plugin_tools.tools.resources import plugin_test_data_path
+from lizmap.test.utils import temporary_file_path
 from lizmap.tools import (
+    cfg_file_content,
     convert_lizmap_popup,
     format_qgis_version,
     format_version_integer,
@@ -14,6 +19,7 @@ from lizmap.tools import (
     merge_strings,
     to_bool,
     unaccent,
+    write_file_if_changed,
 )
 
 __copyright__ = 'Copyright 2023, 3Liz'
@@ -65,6 +71,42 @@ class TestTools(unittest.TestCase):
         self.assertFalse(to_bool(False))
         self.assertFalse(to_bool(None, default_value=False))
 
+    def test_cfg_file_content(self):
+        """ Test the hash of the CFG file content. """
+        config = {'metadata': {'lizmap_plugin_version': 31300}, 'options': {}}
+        content = cfg_file_content(config)
+        metadata = json.loads(content)['metadata']
+
+        del config['metadata']['content_hash']
+        expected = json.dumps(config, sort_keys=False, indent=4) + '\n'
+        self.assertEqual(hashlib.sha256(expected.encode('utf8')).hexdigest(), metadata['content_hash'])
+
+        # Same content, same file
+        self.assertEqual(content, cfg_file_content(config))
+
+    def test_write_file_if_changed(self):
+        """ Test a file is written only if its content changed. """
+        path = temporary_file_path(extension='cfg')
+        os.remove(path)
+        self.assertTrue(write_file_if_changed(path, 'first'))
+        self.assertFalse(write_file_if_changed(path, 'first'))
+        self.assertTrue(write_file_if_changed(path, 'second'))
+        with open(path, encoding='utf8') as f:
+            self.assertEqual('second', f.read())
+        self.assertFalse(os.path.exists(path + '.tmp'))
+
+        # The file on disk has already the exact bytes, with line endings not converted
+        content = '{\n    "options": "é"\n}\n'
+        with open(path, 'wb') as f:
+            f.write(content.encode('utf8'))
+        os.utime(path, (0, 0))
+        self.assertFalse(write_file_if_changed(path, content))
+        self.assertEqual(0, os.stat(path).st_mtime)
+        self.assertTrue(write_file_if_changed(path, content + '\n'))
+        with open(path, 'rb') as f:
+            self.assertEqual((content + '\n').encode('utf8'), f.read())
+        os.remove(path)
+
     def test_unaccent(self):
         """ Test to unaccent a string. """
         self.assertEqual("a lAyer", unaccent("à lÂyér"))
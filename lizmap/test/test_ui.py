@@ -114,11 +114,12 @@ class TestUiLizmapDialog(unittest.TestCase):
         lizmap = self._setup_empty_project()
 
         # Click the layer
-        item = lizmap.dlg.layer_tree.topLevelItem(0)
-        self.assertEqual(item.text(0), 'lines')
-        self.assertTrue(item.text(1).startswith('lines_'))
-        self.assertEqual(item.text(2), 'layer')
-        lizmap.dlg.layer_tree.setCurrentItem(lizmap.dlg.layer_tree.topLevelItem(0))
+        model = lizmap.dlg.layer_tree.model()
+        index = model.index(0, 0)
+        self.assertEqual(model.data(index), 'lines')
+        self.assertTrue(model.node(index).id.startswith('lines_'))
+        self.assertEqual(model.node(index).type, 'layer')
+        lizmap.dlg.layer_tree.setCurrentIndex(index)
 
         # Fill the ACL field
         acl_layer = "a_group_id"
@@ -139,6 +140,35 @@ class TestUiLizmapDialog(unittest.TestCase):
         self.assertIsNone(output['layers']['lines'].get('externalWmsToggle'))
         self.assertIsNone(output['layers']['lines'].get('metatileSize'))
 
+    def test_layer_config_cache(self):
+        """ Test the options of a layer are serialised again only when they change. """
+        lizmap = self._setup_empty_project()
+        layer = QgsProject.instance().mapLayersByName('lines')[0]
+        node = lizmap.layerList[layer.id()]
+        self.assertIsNone(node.config)
+
+        output = lizmap.project_config_file(LwcVersions.latest(), check_server=False)
+        self.assertIsNotNone(node.config)
+        self.assertEqual('', output['layers']['lines']['abstract'])
+
+        # Reused for the same version
+        cached = node.config
+        lizmap.project_config_file(LwcVersions.latest(), check_server=False)
+        self.assertIs(cached, node.config)
+
+        # An edited option
+        node['abstract'] = 'Edited'
+        self.assertIsNone(node.config)
+        output = lizmap.project_config_file(LwcVersions.latest(), check_server=False)
+        self.assertEqual('Edited', output['layers']['lines']['abstract'])
+
+        # A change in the QGIS layer
+        style_manager = layer.styleManager()
+        style_manager.addStyle('second', style_manager.style(style_manager.currentStyle()))
+        self.assertIsNone(node.config)
+        output = lizmap.project_config_file(LwcVersions.latest(), check_server=False)
+        self.assertEqual(2, len(output['layers']['lines']['styles']))
+
     def test_general_scales_properties(self):
         """ Test some UI settings about general properties. """
         lizmap = self._setup_empty_project()
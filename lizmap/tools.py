@@ -2,9 +2,12 @@ __copyright__ = 'Copyright 2023, 3Liz'
 __license__ = 'GPL version 3'
 __email__ = 'info@3liz.org'
 
+import hashlib
+import json
 import os
 import random
 import re
+import shutil
 import string
 import subprocess
 import unicodedata
@@ -12,7 +15,7 @@ import urllib.parse
 
 from os.path import abspath, join
 from pathlib import Path
-from typing import List, Tuple, Union
+from typing import Dict, List, Tuple, Union
 
 from qgis.core import Qgis, QgsApplication, QgsProviderRegistry, QgsVectorLayer
 from qgis.PyQt.QtCore import QDir
@@ -122,6 +125,39 @@ def lizmap_user_folder() -> Path:
     return lizmap_path
 
 
+def cfg_file_content(config: Dict) -> str:
+    """ The content of the CFG file, with the hash of the content in the metadata.
+
+    The hash is the SHA-256 of the file written without the "content_hash" key.
+    """
+    config['metadata'].pop('content_hash', None)
+    content = json.dumps(config, sort_keys=False, indent=4) + '\n'
+    config['metadata']['content_hash'] = hashlib.sha256(content.encode('utf8')).hexdigest()
+    return json.dumps(config, sort_keys=False, indent=4) + '\n'
+
+
+def write_file_if_changed(path: str, content: str) -> bool:
+    """ Write a text file atomically, only if the content is different from the existing file.
+
+    Returns True if the file has been written.
+    """
+    # Bytes are compared and written, without any conversion of line endings on Windows
+    data = content.encode('utf8')
+    new_hash = hashlib.sha256(data).hexdigest()
+    if os.path.exists(path):
+        with open(path, 'rb') as existing:
+            if hashlib.sha256(existing.read()).hexdigest() == new_hash:
+                return False
+
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as fp:
+        fp.write(data)
+    if os.path.exists(path):
+        shutil.copymode(path, tmp)
+    os.replace(tmp, path)
+    return True
+
+
 def current_git_hash() -> str:
     """ Retrieve the current git hash number of the git repo (first 6 digit). """
     repo_dir = os.path.dirname(os.path.abspath(__file__))
@@ -30,6 +30,8 @@ setup(
     entry_points={
         'console_scripts': [
             'lizmapcfg = lizmap_api.commands:create_config',
+            'lizmapcfg-batch = lizmap_api.commands:create_config_batch',
+            'lizmapcfg-daemon = lizmap_api.daemon:main',
         ]
     },
     classifiers=[